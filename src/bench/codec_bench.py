@@ -0,0 +1,123 @@
+import argparse
+import json
+import random
+import time
+from collections.abc import Callable
+from dataclasses import asdict
+
+from src.common.book_type import BookCollection, Volume
+from src.util.codec import (
+    dumps_json,
+    from_record,
+    get_codec,
+    loads_json,
+    msgpack,
+    orjson,
+    to_record,
+)
+
+WORDS = (
+    "abyss archon ballad blossom celestia dawn dragon ember fatui flame frost "
+    "glory harbinger inazuma khaenriah knight liyue lumine moon mondstadt night"
+).split()
+
+
+def sample_collections(count: int, seed: int = 0) -> list[BookCollection]:
+    """Book collections shaped like the archive's, with made up text
+
+    :param count: _description_
+    :param seed: _description_
+    :return: _description_
+    """
+    rng = random.Random(seed)
+
+    def text(words: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+
+    return [
+        BookCollection(
+            title=text(3),
+            location=text(6),
+            volumes=[Volume(text(8), text(400)) for _ in range(rng.randint(1, 6))],
+        )
+        for _ in range(count)
+    ]
+
+
+def _best_of(rounds: int, fn: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmarks(count: int, rounds: int) -> list[tuple[str, float, float]]:
+    """Time the codec against what it replaces, on the same records
+
+    :param count: book collections encoded and decoded per round
+    :param rounds: _description_
+    :return: (name, baseline seconds, codec seconds), best rounds
+    """
+    books = sample_collections(count)
+    records = [to_record(book) for book in books]
+    stdlib = [json.dumps(record).encode("utf-8") for record in records]
+    compact = [dumps_json(record) for record in records]
+
+    pairs = {
+        "to_record vs asdict": (
+            lambda: [asdict(book) for book in books],
+            lambda: [to_record(book) for book in books],
+        ),
+        "from_record vs constructors": (
+            lambda: [
+                BookCollection(
+                    record["title"],
+                    record["location"],
+                    [Volume(**volume) for volume in record["volumes"]],
+                )
+                for record in records
+            ],
+            lambda: [from_record(BookCollection, record) for record in records],
+        ),
+        "dumps_json vs json.dumps": (
+            lambda: [json.dumps(record).encode("utf-8") for record in records],
+            lambda: [dumps_json(record) for record in records],
+        ),
+        "loads_json vs json.loads": (
+            lambda: [json.loads(data) for data in stdlib],
+            lambda: [loads_json(data) for data in compact],
+        ),
+    }
+    if msgpack is not None:
+        codec = get_codec("msgpack")
+        packed = [codec.dumps(record) for record in records]
+        pairs["msgpack loads vs json.loads"] = (
+            lambda: [json.loads(data) for data in stdlib],
+            lambda: [codec.loads(data) for data in packed],
+        )
+    return [
+        (name, _best_of(rounds, baseline), _best_of(rounds, fn))
+        for name, (baseline, fn) in pairs.items()
+    ]
+
+
+def report(results: list[tuple[str, float, float]]) -> None:
+    print(f"{'benchmark':<32}{'baseline ms':>13}{'codec ms':>10}{'speedup':>9}")
+    for name, baseline, seconds in results:
+        print(
+            f"{name:<32}{baseline * 1000:>13.1f}{seconds * 1000:>10.1f}"
+            f"{baseline / seconds:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Archive record codec against dataclasses.asdict and stdlib json"
+    )
+    parser.add_argument("--count", type=int, default=2000, help="book collections")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    print(f"orjson {'on' if orjson is not None else 'off'}, {args.count} records")
+    report(run_benchmarks(args.count, args.rounds))
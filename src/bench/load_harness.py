@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.bench.mock_wiki import MockWiki, MockWikiConfig, route_to
+from src.common.archives import DATA_DIR_ENV
+from src.util.logger import get_logger
+from src.util.metrics import percentile
+
+logger = get_logger("LoadHarness")
+
+REPO_DIR = Path(__file__).parent.parent.parent.resolve()
+
+
+def run_pipeline(
+    target: str, concurrency: int, parse_workers: int | None, rate: float
+) -> dict:
+    """Scrape index pages, links and every item page from `target`, the way
+    `main.py` does\n
+    Meant to run in a process whose data directory is a throwaway one (see
+    `DATA_DIR_ENV`), pages, links and archives are written there
+
+    :param target: mock wiki url
+    :param concurrency: fetch threads, and requests in flight against the wiki
+    :param parse_workers: _description_
+    :param rate: requests per second the fetch policy starts at and stays under
+    :return: pages, seconds, fetch latency percentiles and counters
+    """
+    # imported here so the data directory is the one of this process
+    from src.common.archives import HTML_DIR, JSON_DIR, LINKS_DIR
+    from src.scraper.artifact_scraper import ArtifactScraper
+    from src.scraper.book_scraper import BookScraper
+    from src.scraper.fetcher import Fetcher
+    from src.scraper.link_scraper import LinkScraper
+    from src.scraper.policy import FetchPolicy, PolicyConfig
+    from src.scraper.weapon_scraper import WeaponScraper
+    from src.util.http_cache import HttpCache
+    from src.util.metrics import get_metrics
+
+    for directory in (HTML_DIR, LINKS_DIR, JSON_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+    policy = FetchPolicy(
+        PolicyConfig(initial_rate=rate, max_rate=rate, burst=max(rate / 10, 1))
+    )
+    fetcher = Fetcher(
+        max_workers=concurrency,
+        per_host_limit=concurrency,
+        cache=HttpCache(),
+        policy=policy,
+    )
+    route_to(fetcher, target)
+
+    start = time.perf_counter()
+    links = LinkScraper(load_from_file=False, fetcher=fetcher)
+    links.load_indexes()
+    links.scrape_artifact_links()
+    links.scrape_weapon_links()
+    links.scrape_book_links()
+    for scraper in (ArtifactScraper, WeaponScraper, BookScraper):
+        scraper(fetcher, parse_workers).run()
+    seconds = time.perf_counter() - start
+
+    metrics = get_metrics()
+    latencies = metrics.samples("fetch")
+    counters: dict[str, float] = {}
+    for category in metrics.summary().values():
+        for name, value in category["counters"].items():
+            counters[name] = counters.get(name, 0) + value
+    return {
+        "pages": len(latencies),
+        "seconds": seconds,
+        "pages_per_sec": len(latencies) / seconds if seconds else 0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0,
+        "retries": counters.get("retries", 0),
+        "failures": counters.get("failures", 0),
+        "cache_hits": counters.get("cache_hits", 0),
+    }
+
+
+def _run_child(
+    target: str,
+    data_dir: str,
+    concurrency: int,
+    parse_workers: int | None,
+    rate: float,
+    verbose: bool,
+) -> dict:
+    command = [
+        sys.executable,
+        "-m",
+        "src.bench.load_harness",
+        "--child",
+        target,
+        "--concurrency",
+        str(concurrency),
+        "--rate",
+        str(rate),
+    ]
+    if parse_workers is not None:
+        command += ["--parse-workers", str(parse_workers)]
+    result = subprocess.run(
+        command,
+        cwd=REPO_DIR,
+        env={**os.environ, DATA_DIR_ENV: data_dir},
+        stdout=subprocess.PIPE,
+        stderr=None if verbose else subprocess.DEVNULL,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_load(
+    config: MockWikiConfig,
+    concurrencies: list[int],
+    passes: int = 1,
+    parse_workers: int | None = None,
+    rate: float = 1000,
+    verbose: bool = False,
+) -> list[dict]:
+    """Run the whole pipeline against a mock wiki, once per concurrency\n
+    Every concurrency starts from an empty data directory, later passes reuse
+    it, so they revalidate cached pages with conditional requests
+
+    :param config: faults and latency of the mock wiki
+    :param concurrencies: fetch threads of every run
+    :param passes: runs per concurrency
+    :param parse_workers: _description_
+    :param rate: see `run_pipeline`
+    :param verbose: show the logs of the runs
+    :return: one row per run
+    """
+    rows = []
+    with MockWiki(config) as wiki:
+        for concurrency in concurrencies:
+            with tempfile.TemporaryDirectory() as data_dir:
+                for run in range(passes):
+                    wiki.reset_stats()
+                    row = _run_child(
+                        wiki.url, data_dir, concurrency, parse_workers, rate, verbose
+                    )
+                    row.update(concurrency=concurrency, run=run + 1, server=wiki.stats)
+                    rows.append(row)
+                    logger.info(
+                        f"concurrency {concurrency} run {run + 1}: "
+                        f"{row['pages_per_sec']:.1f} pages/s"
+                    )
+    return rows
+
+
+def report(rows: list[dict]) -> None:
+    print(
+        f"{'conc':>5}{'run':>4}{'pages':>7}{'s':>8}{'pages/s':>9}"
+        f"{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}{'max ms':>8}"
+        f"{'retry':>7}{'fail':>6}{'429':>6}{'5xx':>6}{'304':>6}"
+    )
+    for row in rows:
+        server = row["server"]
+        print(
+            f"{row['concurrency']:>5}{row['run']:>4}{row['pages']:>7}"
+            f"{row['seconds']:>8.2f}{row['pages_per_sec']:>9.1f}"
+            f"{row['p50'] * 1000:>8.1f}{row['p95'] * 1000:>8.1f}"
+            f"{row['p99'] * 1000:>8.1f}{row['max'] * 1000:>8.1f}"
+            f"{row['retries']:>7.0f}{row['failures']:>6.0f}"
+            f"{server['throttled']:>6}{server['errors']:>6}{server['not_modified']:>6}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="End-to-end scrape throughput against a local mock wiki"
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--passes", type=int, default=1, help="runs per concurrency")
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument(
+        "--rate", type=float, default=1000, help="fetch policy requests/s ceiling"
+    )
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="seconds")
+    parser.add_argument("--bandwidth", type=float, default=0, help="bytes/s")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests/s")
+    parser.add_argument("--no-etag", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--json", type=Path, default=None, help="also save the rows")
+    parser.add_argument("--child", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        row = run_pipeline(
+            args.child, args.concurrency[0], args.parse_workers, args.rate
+        )
+        print(json.dumps(row))
+        return 0
+
+    config = MockWikiConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        rate_limit=args.rate_limit,
+        etag=not args.no_etag,
+        seed=args.seed,
+    )
+    rows = run_load(
+        config,
+        args.concurrency,
+        args.passes,
+        args.parse_workers,
+        args.rate,
+        args.verbose,
+    )
+    report(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=4, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
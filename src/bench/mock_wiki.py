@@ -0,0 +1,588 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from src.bench.parse_bench import skin_page
+from src.common.archives import HTML_DIR, LINKS_DIR
+from src.common.book_type import BookCategory, Category
+from src.common.links import BASE_LINK, EN, Locale, links2html_mapping
+from src.scraper.fetcher import Fetcher
+from src.util.archive import iter_archive
+from src.util.logger import get_logger
+from src.util.url import extract_slug, link_title
+
+logger = get_logger("MockWiki")
+
+WORDS = (
+    "abyss archon ballad blossom celestia dawn dragon ember fatui flame frost "
+    "glory harbinger inazuma khaenriah knight liyue lumine moon mondstadt night "
+    "ocean pyro rain sea snezhnaya song star storm sumeru sword tide vision wind"
+).split()
+
+
+@dataclass
+class MockWikiConfig:
+    # seconds before every response, plus up to `jitter` more
+    latency: float = 0.0
+    jitter: float = 0.0
+    # bytes per second of every response body, 0 is unlimited
+    bandwidth: float = 0
+    # fraction of requests answered 500/502/503, and 429
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    # requests per second accepted, more are answered 429, 0 is unlimited
+    rate_limit: float = 0
+    retry_after: float = 1
+    # answer If-None-Match with 304
+    etag: bool = True
+    seed: int = 0
+    # pages given a revision per prop=revisions answer, the rest is continued
+    revisions_per_query: int = 50
+
+
+def _text(rng: random.Random, lines: int) -> str:
+    return "\n".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24))).capitalize()
+        + "."
+        for _ in range(lines)
+    )
+
+
+def _paragraphs(text: str) -> str:
+    return "".join(f"<p>{escape(line)}</p>" for line in text.split("\n"))
+
+
+def _heading(level: int, title: str, id_: str | None = None) -> str:
+    id_ = id_ or title.replace(" ", "_")
+    return (
+        f'<h{level}><span class="mw-headline" id="{escape(id_)}">{escape(title)}</span>'
+        f'<span class="mw-editsection">[edit]</span></h{level}>'
+    )
+
+
+def _infobox(location: str) -> str:
+    return (
+        '<aside class="portable-infobox"><div class="pi-item pi-data pi-item-spacing '
+        'pi-border-color" data-source="region_location"><div class="pi-data-value">'
+        f"{escape(location)}</div></div></aside>"
+    )
+
+
+def _article(parts: list[str]) -> str:
+    body = '<div class="mw-content-ltr mw-parser-output">' + "".join(parts) + "</div>"
+    return skin_page(body)
+
+
+def artifact_page(name: str, pieces: dict[str, str] | None = None) -> str:
+    """Artifact set page, with the archived lore when there is one
+
+    :param name: set name
+    :param pieces: {piece: lore}, made up when None
+    :return: _description_
+    """
+    rng = random.Random(name)
+    if not pieces:
+        pieces = {f"{name} {slot}": _text(rng, 4) for slot in ("Flower", "Plume")}
+    parts = ["<p>Set</p>", _heading(2, "Lore")]
+    for piece, lore in pieces.items():
+        parts.append(_heading(3, piece))
+        parts.append('<div class="description-wrapper">stats</div>')
+        parts.append(_paragraphs(lore))
+    parts.append(_heading(2, "Gallery"))
+    return _article(parts)
+
+
+def weapon_page(name: str) -> str:
+    rng = random.Random(name)
+    return _article(
+        ["<p>Weapon</p>", _heading(2, "Lore"), _paragraphs(_text(rng, 6))]
+        + [_heading(2, "Gallery")]
+    )
+
+
+def collection_page(name: str) -> str:
+    rng = random.Random(name)
+    parts = [_infobox(rng.choice(["Mondstadt", "Liyue", "Inazuma"]))]
+    for volume in range(1, rng.randint(2, 5)):
+        parts.append(_heading(2, f"Vol. {volume}"))
+        parts.append(
+            '<div class="description-wrapper"><div class="description-content">'
+            f"{escape(_text(rng, 1))}</div></div>"
+        )
+        parts.append(_paragraphs(_text(rng, rng.randint(8, 30))))
+    parts.append(_heading(2, "Trivia"))
+    return _article(parts)
+
+
+def quest_page(name: str) -> str:
+    rng = random.Random(name)
+    return _article(
+        [
+            _infobox(rng.choice(["Mondstadt", "Liyue", "Inazuma"])),
+            _heading(2, "Text"),
+            _paragraphs(_text(rng, rng.randint(4, 20))),
+            _heading(2, "Trivia"),
+        ]
+    )
+
+
+# links between pages of the default edition
+_WIKI_HREF = re.compile(r'href="/wiki/([^"#?]+)"')
+
+
+def localized_title(title: str, code: str) -> str:
+    """Title of a page on a mock language edition
+
+    :param title: title on the default edition
+    :param code: e.g. "fr"
+    :return: e.g. "Amber (fr)"
+    """
+    return f"{title} ({code})"
+
+
+def _path(url: str) -> str:
+    # pages are keyed by their unquoted path, the same page may be linked either way
+    return unquote(urlsplit(url).path)
+
+
+def build_site() -> dict[str, str]:
+    """Pages served by the mock wiki: the saved index pages of `html/`, and a
+    synthetic page for every link of `links/*.json`
+
+    :return: {url: html}
+    """
+    pages = {}
+    for name, link in links2html_mapping.items():
+        with open(HTML_DIR / f"{name}.html", "r", encoding="utf-8") as f:
+            pages[link] = f.read()
+
+    artifacts = dict(iter_archive("artifact"))
+    with open(LINKS_DIR / f"{Category.ARTIFACT.value}.json", "r") as f:
+        for link in json.load(f):
+            name = extract_slug(link)
+            pages[link] = artifact_page(name, artifacts.get(name))
+    with open(LINKS_DIR / f"{Category.WEAPON.value}.json", "r") as f:
+        for link in json.load(f):
+            pages[link] = weapon_page(extract_slug(link))
+    with open(LINKS_DIR / f"{Category.BOOK.value}.json", "r") as f:
+        for kind, links in json.load(f).items():
+            build = quest_page if kind == BookCategory.quest.value else collection_page
+            for link in links:
+                pages[link] = build(extract_slug(link))
+    return pages
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.server.wiki.handle(self)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class MockWiki:
+    """Local stand-in for the wiki, serving pages at the paths of their real urls\n
+    Latency, bandwidth, rate limiting and 429/5xx answers are configurable, and
+    random faults are seeded so a run can be repeated. `api.php` answers
+    `list=recentchanges` with the pages edited through `edit_page`,
+    `prop=langlinks` between the language editions added with `add_locale`,
+    `prop=revisions` (following the redirects of `add_redirect`) and
+    `action=parse` with the article body of any revision
+    """
+
+    def __init__(
+        self,
+        config: MockWikiConfig | None = None,
+        pages: dict[str, str] | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        """
+        :param config: _description_
+        :param pages: {url or path: html}, defaults to `build_site()`
+        :param host: _description_
+        :param port: 0 picks a free port
+        """
+        self.config = config if config is not None else MockWikiConfig()
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._pages: dict[str, tuple[bytes, str]] = {}
+        # path -> latest revision id, and revision id -> content
+        self._latest: dict[str, int] = {}
+        self._revisions: dict[int, bytes] = {}
+        # title -> title it redirects to
+        self.redirects: dict[str, str] = {}
+        for path, html in (pages if pages is not None else build_site()).items():
+            self.set_page(path, html)
+        self._window = (0, 0)  # (second, requests in it)
+        # what list=recentchanges answers with, oldest first
+        self.changes: list[dict] = []
+        # title -> {language code: title on that edition}
+        self.langlinks: dict[str, dict[str, str]] = {}
+        self.stats: dict[str, int] = {}
+        self.reset_stats()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.wiki = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_page(self, path_or_url: str, html: str) -> None:
+        """Add or edit a page, its ETag changes with its content
+
+        :param path_or_url: e.g. "/wiki/Initiate" or the page's wiki url
+        :param html: _description_
+        """
+        body = html.encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        path = _path(path_or_url)
+        with self._lock:
+            self._pages[path] = (body, etag)
+            revid = len(self._revisions) + 1
+            self._revisions[revid] = body
+            self._latest[path] = revid
+
+    def add_redirect(self, title: str, target: str) -> None:
+        """Make a title redirect to another one, for `prop=revisions`
+
+        :param title: e.g. "Old Name"
+        :param target: title of an existing page
+        """
+        self.redirects[title] = target
+
+    def edit_page(self, path_or_url: str, html: str) -> dict:
+        """Edit a page and list the edit in the recent changes
+
+        :param path_or_url: _description_
+        :param html: new content
+        :return: the recent change
+        """
+        self.set_page(path_or_url, html)
+        with self._lock:
+            rcid = len(self.changes) + 1
+            change = {
+                "type": "edit",
+                "ns": 0,
+                "title": link_title(path_or_url),
+                "rcid": rcid,
+                "revid": self._latest[_path(path_or_url)],
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+            self.changes.append(change)
+        return change
+
+    def add_locale(self, code: str) -> Locale:
+        """Serve a copy of every page of the default edition as another language
+        edition, under `/<code>/wiki/` and with titles ending in ` (<code>)`
+
+        :param code: e.g. "fr"
+        :return: the edition, to scrape it like a real one
+        """
+
+        def localize(title: str) -> str:
+            return f"/{code}/wiki/" + quote(
+                localized_title(title, code).replace(" ", "_")
+            )
+
+        def href(match: re.Match) -> str:
+            return f'href="{localize(unquote(match[1]).replace("_", " "))}"'
+
+        with self._lock:
+            pages = [
+                (path, body)
+                for path, (body, _) in self._pages.items()
+                if path.startswith("/wiki/")
+            ]
+        for path, body in pages:
+            # paths are unquoted already, and may hold a "?"
+            title = path.removeprefix("/wiki/").replace("_", " ")
+            self.set_page(localize(title), _WIKI_HREF.sub(href, body.decode("utf-8")))
+            self.langlinks.setdefault(title, {})[code] = localized_title(title, code)
+        return Locale(
+            code=code,
+            root=f"{BASE_LINK}/{code}",
+            artifact=localized_title(EN.artifact, code),
+            weapon=localized_title(EN.weapon, code),
+            book=localized_title(EN.book, code),
+        )
+
+    def _langlinks(self, params: dict[str, str]) -> dict:
+        lang = params.get("lllang", "")
+        pages = []
+        for title in params.get("titles", "").split("|"):
+            page: dict = {"title": title}
+            other = self.langlinks.get(title, {}).get(lang)
+            if other is not None:
+                page["langlinks"] = [{"lang": lang, "title": other}]
+            pages.append(page)
+        return {"batchcomplete": True, "query": {"pages": pages}}
+
+    def _query_revisions(self, params: dict[str, str], wiki: str) -> dict:
+        # titles are normalized and redirects followed like the real api, pages
+        # past `revisions_per_query` get their revision in a continued query
+        normalized, redirects, pages = [], [], {}
+        for title in params.get("titles", "").split("|"):
+            name = title.replace("_", " ")
+            if name != title:
+                normalized.append({"from": title, "to": name})
+            if "redirects" in params and name in self.redirects:
+                redirects.append({"from": name, "to": self.redirects[name]})
+                name = self.redirects[name]
+            with self._lock:
+                revid = self._latest.get(wiki + name.replace(" ", "_"))
+            page: dict = {"title": name}
+            if revid is None:
+                page["missing"] = True
+            else:
+                page["revid"] = revid
+            pages[name] = page
+
+        start = int(params.get("rvcontinue", 0))
+        end = start + self.config.revisions_per_query
+        found = [page for page in pages.values() if "revid" in page]
+        for i, page in enumerate(found):
+            revid = page.pop("revid")
+            if start <= i < end:
+                page["revisions"] = [{"revid": revid}]
+        query: dict = {"pages": list(pages.values())}
+        if normalized:
+            query["normalized"] = normalized
+        if redirects:
+            query["redirects"] = redirects
+        data: dict = {"query": query}
+        if end < len(found):
+            data["continue"] = {"rvcontinue": str(end), "continue": "||"}
+        else:
+            data["batchcomplete"] = True
+        return data
+
+    def _parse(self, params: dict[str, str]) -> dict:
+        with self._lock:
+            body = self._revisions.get(int(params.get("oldid", 0)))
+        if body is None:
+            return {"error": {"code": "nosuchrevid", "info": "no such revision"}}
+        soup = BeautifulSoup(body, "html.parser")
+        article = soup.select_one(".mw-parser-output") or soup
+        return {"parse": {"revid": int(params["oldid"]), "text": str(article)}}
+
+    def _recent_changes(self, params: dict[str, str]) -> dict:
+        # rcdir=newer only, continued with "<timestamp>|<rcid>"
+        start = (params.get("rcstart", ""), 0)
+        if "rccontinue" in params:
+            timestamp, rcid = params["rccontinue"].split("|")
+            start = (timestamp, int(rcid))
+        limit = int(params.get("rclimit", 10))
+        with self._lock:
+            changes = [
+                change
+                for change in self.changes
+                if (change["timestamp"], change["rcid"]) >= start
+            ]
+        data: dict = {
+            "batchcomplete": True,
+            "query": {"recentchanges": changes[:limit]},
+        }
+        if len(changes) > limit:
+            following = changes[limit]
+            data["continue"] = {
+                "rccontinue": f"{following['timestamp']}|{following['rcid']}",
+                "continue": "-||",
+            }
+        return data
+
+    def _api(self, request: BaseHTTPRequestHandler) -> None:
+        query = parse_qs(urlsplit(request.path).query)
+        params = {name: values[-1] for name, values in query.items()}
+        # pages of this edition, e.g. /fr/wiki/ for /fr/api.php
+        wiki = _path(request.path).removesuffix("api.php") + "wiki/"
+        action, prop = params.get("action"), params.get("prop")
+        if action == "query" and params.get("list") == "recentchanges":
+            data = self._recent_changes(params)
+        elif action == "query" and prop == "langlinks":
+            data = self._langlinks(params)
+        elif action == "query" and prop == "revisions":
+            data = self._query_revisions(params, wiki)
+        elif action == "parse":
+            data = self._parse(params)
+        else:
+            data = {"error": {"code": "badvalue", "info": "not supported by the mock"}}
+        body = json.dumps(data).encode("utf-8")
+        self._count("ok")
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json; charset=utf-8")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = dict.fromkeys(
+                ["requests", "ok", "not_modified", "throttled", "errors", "not_found"],
+                0,
+            )
+            self.stats["bytes"] = 0
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += value
+
+    def _roll(self) -> tuple[int | None, float]:
+        # status to answer instead of the page if any, and the delay before it
+        config = self.config
+        with self._lock:
+            second = int(time.monotonic())
+            start, count = self._window
+            self._window = (second, count + 1 if start == second else 1)
+            delay = config.latency + self._rng.random() * config.jitter
+            if config.rate_limit and self._window[1] > config.rate_limit:
+                return 429, delay
+            roll = self._rng.random()
+            if roll < config.throttle_rate:
+                return 429, delay
+            if roll < config.throttle_rate + config.error_rate:
+                return self._rng.choice([500, 502, 503]), delay
+        return None, delay
+
+    def handle(self, request: BaseHTTPRequestHandler) -> None:
+        self._count("requests")
+        config = self.config
+        status, delay = self._roll()
+        time.sleep(delay)
+        if status is not None:
+            self._count("throttled" if status == 429 else "errors")
+            request.send_response(status)
+            if status in (429, 503):
+                request.send_header("Retry-After", f"{config.retry_after:g}")
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        # api.php of any edition
+        if _path(request.path).endswith("/api.php"):
+            self._api(request)
+            return
+        with self._lock:
+            page = self._pages.get(_path(request.path))
+        if page is None:
+            self._count("not_found")
+            request.send_response(404)
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        body, etag = page
+        if config.etag and request.headers.get("If-None-Match") == etag:
+            self._count("not_modified")
+            request.send_response(304)
+            request.send_header("ETag", etag)
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        self._count("ok")
+        request.send_response(200)
+        request.send_header("Content-Type", "text/html; charset=utf-8")
+        request.send_header("Content-Length", str(len(body)))
+        if config.etag:
+            request.send_header("ETag", etag)
+        request.end_headers()
+        self._send_body(request, body)
+
+    def _send_body(self, request: BaseHTTPRequestHandler, body: bytes) -> None:
+        if not self.config.bandwidth:
+            request.wfile.write(body)
+        else:
+            chunk = 16 * 1024
+            for start in range(0, len(body), chunk):
+                request.wfile.write(body[start : start + chunk])
+                time.sleep(min(chunk, len(body) - start) / self.config.bandwidth)
+        self._count("bytes", len(body))
+
+    def start(self) -> "MockWiki":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Serving {len(self._pages)} pages at {self.url}")
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockWiki":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class RewriteAdapter(HTTPAdapter):
+    """Sends requests for one base url to another, e.g. the wiki to a `MockWiki`"""
+
+    def __init__(self, base: str, target: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.base = base.rstrip("/")
+        self.target = target.rstrip("/")
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        request.url = self.target + request.url[len(self.base) :]
+        return super().send(request, **kwargs)
+
+
+def route_to(fetcher: Fetcher, target: str, base: str = BASE_LINK) -> None:
+    """Point a fetcher's requests for the wiki at a local server, urls (and so
+    cache keys, manifests and metrics) are unchanged
+
+    :param fetcher: _description_
+    :param target: e.g. `MockWiki.url`
+    :param base: _description_
+    """
+    adapter = RewriteAdapter(
+        base, target, pool_connections=4, pool_maxsize=fetcher.max_workers
+    )
+    fetcher.session.mount(base, adapter)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in wiki")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=float, default=0, help="bytes/s")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests/s")
+    parser.add_argument("--no-etag", action="store_true")
+    args = parser.parse_args()
+
+    config = MockWikiConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        bandwidth=args.bandwidth,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        rate_limit=args.rate_limit,
+        etag=not args.no_etag,
+    )
+    wiki = MockWiki(config, port=args.port).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        wiki.stop()
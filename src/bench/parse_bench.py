@@ -0,0 +1,285 @@
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from html import escape
+from pathlib import Path
+
+from src.common.archives import HTML_DIR, LINKS_DIR
+from src.common.book_type import BookCategory, Category
+from src.scraper.artifact_scraper import extract_artifact
+from src.scraper.book_scraper import extract_collection, extract_quest
+from src.scraper.link_scraper import LinkScraper
+from src.scraper.sections import make_soup
+from src.scraper.weapon_scraper import extract_weapon
+from src.util.archive import iter_archive
+from src.util.html_pack import get_html_pack
+from src.util.http_cache import HttpCache
+from src.util.logger import get_logger
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+logger = get_logger("ParseBench")
+
+
+@dataclass
+class BenchResult:
+    name: str
+    pages: int
+    seconds: float  # best round
+    peak_kib: float = 0
+    stages: dict[str, float] = field(default_factory=dict)  # seconds, best round
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.seconds if self.seconds else 0
+
+
+def _best_of(rounds: int, fn: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_kib(fn: Callable[[], object]) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench(
+    name: str,
+    pages: int,
+    fn: Callable[[], object],
+    rounds: int,
+    stages: dict[str, Callable[[], object]] | None = None,
+) -> BenchResult:
+    """Time `fn` over `pages` pages, best of `rounds`
+
+    :param name: _description_
+    :param pages: pages processed by one call of `fn`
+    :param fn: work to time
+    :param rounds: _description_
+    :param stages: parts of `fn` timed on their own
+    :return: _description_
+    """
+    result = BenchResult(name=name, pages=pages, seconds=_best_of(rounds, fn))
+    result.peak_kib = _peak_kib(fn)
+    for stage, stage_fn in (stages or {}).items():
+        result.stages[stage] = _best_of(rounds, stage_fn)
+    return result
+
+
+def skin_page(body: str) -> str:
+    """Wrap an article body in the skin of a checked-in page, for realistic sizes"""
+    with open(HTML_DIR / "artifact.html", "r", encoding="utf-8") as f:
+        page = f.read()
+    start = page.index('<div class="mw-content-ltr mw-parser-output"')
+    end = page.index("</main>", start)
+    return page[:start] + body + page[end:]
+
+
+def synthetic_artifact_pages() -> list[tuple[str, str]]:
+    """Artifact pages rebuilt from `archive/json/artifact.json`, used when no
+    item page has been cached yet
+
+    :return: (link, html) pairs
+    """
+    archive = dict(iter_archive("artifact"))
+    pages = []
+    for name, pieces in archive.items():
+        body = ['<div class="mw-content-ltr mw-parser-output">', "<p>Set</p>"]
+        body.append('<h2><span class="mw-headline" id="Lore">Lore</span></h2>')
+        for piece, lore in pieces.items():
+            body.append(f'<h3><span class="mw-headline">{escape(piece)}</span></h3>')
+            body.append('<div class="description-wrapper">stats</div>')
+            body.extend(f"<p>{escape(line)}</p>" for line in lore.split("\n"))
+        body.append('<h2><span class="mw-headline" id="Gallery">Gallery</span></h2>')
+        body.append("</div>")
+        link = f"https://genshin-impact.fandom.com/wiki/{name.replace(' ', '_')}"
+        pages.append((link, skin_page("".join(body))))
+    return pages
+
+
+def cached_pages(links: list[str]) -> list[tuple[str, str]]:
+    """Item pages already saved in the html pack or the HTTP cache
+
+    :param links: _description_
+    :return: (link, html) pairs
+    """
+    pack = get_html_pack()
+    cache = HttpCache(max_age=None, max_bytes=None)
+    pages = [(link, pack.get(link) or cache.get(link)) for link in links]
+    return [(link, html) for link, html in pages if html is not None]
+
+
+def _load_links(category: Category) -> list | dict:
+    with open(LINKS_DIR / f"{category.value}.json", "r") as f:
+        return json.load(f)
+
+
+def run_benchmarks(rounds: int = 3) -> list[BenchResult]:
+    results = []
+    with tempfile.TemporaryDirectory() as links_dir:
+        scraper = LinkScraper(load_from_file=True, links_dir=links_dir)
+        for category, method in [
+            (Category.ARTIFACT, scraper.scrape_artifact_links),
+            (Category.WEAPON, scraper.scrape_weapon_links),
+            (Category.BOOK, scraper.scrape_book_links),
+        ]:
+            html = scraper.load_index(category.value)
+
+            # parse every round, not just the first
+            def run(method=method):
+                scraper.soups.clear()
+                method()
+
+            results.append(
+                bench(
+                    f"links.{category.value}",
+                    1,
+                    run,
+                    rounds,
+                    stages={
+                        "parse": lambda html=html: make_soup(html, body_only=False)
+                    },
+                )
+            )
+
+        with scraper.index_soup(Category.WEAPON.value) as soup:
+            table = soup.select(".article-table")[0]
+            rows = len(table.select("tr")) - 1
+            results.append(
+                bench(
+                    "select_nth_cells_from_table",
+                    rows,
+                    lambda: scraper.select_nth_cells_from_table(table=table, index=1),
+                    rounds,
+                )
+            )
+        scraper.soups.clear()
+
+    book_links = _load_links(Category.BOOK)
+    extractors = [
+        (
+            "artifact",
+            extract_artifact,
+            cached_pages(_load_links(Category.ARTIFACT)) or synthetic_artifact_pages(),
+        ),
+        ("weapon", extract_weapon, cached_pages(_load_links(Category.WEAPON))),
+        (
+            "book_collection",
+            extract_collection,
+            cached_pages(book_links.get(BookCategory.collection.value, [])),
+        ),
+        (
+            "book_quest",
+            extract_quest,
+            cached_pages(book_links.get(BookCategory.quest.value, [])),
+        ),
+    ]
+    for name, extract, pages in extractors:
+        if not pages:
+            logger.info(f"No saved {name} pages, skipping extract.{name}")
+            continue
+
+        def run(extract=extract, pages=pages):
+            for link, html in pages:
+                extract(link, html)
+
+        def parse(pages=pages):
+            for _, html in pages:
+                make_soup(html)
+
+        results.append(
+            bench(f"extract.{name}", len(pages), run, rounds, stages={"parse": parse})
+        )
+    return results
+
+
+def report(results: list[BenchResult]) -> None:
+    print(f"{'benchmark':<30}{'pages':>7}{'pages/s':>10}{'ms':>10}{'peak KiB':>11}")
+    for result in results:
+        stages = ", ".join(
+            f"{stage} {seconds * 1000:.1f} ms"
+            for stage, seconds in result.stages.items()
+        )
+        print(
+            f"{result.name:<30}{result.pages:>7}{result.pages_per_sec:>10.1f}"
+            f"{result.seconds * 1000:>10.1f}{result.peak_kib:>11.0f}  {stages}"
+        )
+
+
+def check_regressions(
+    results: list[BenchResult], baseline: dict[str, dict], threshold: float
+) -> list[str]:
+    """Benchmarks whose throughput dropped more than `threshold` below the baseline
+
+    :param results: _description_
+    :param baseline: saved results, by name
+    :param threshold: allowed relative drop, e.g. 0.2
+    :return: description of every regression
+    """
+    regressions = []
+    for result in results:
+        saved = baseline.get(result.name)
+        if not saved:
+            continue
+        floor = saved["pages_per_sec"] * (1 - threshold)
+        if result.pages_per_sec < floor:
+            regressions.append(
+                f"{result.name}: {result.pages_per_sec:.1f} pages/s, "
+                f"baseline {saved['pages_per_sec']:.1f}"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline parse benchmarks")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="fail when throughput drops by more than this fraction",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.rounds)
+    report(results)
+
+    if args.save_baseline:
+        baseline = {
+            result.name: {**asdict(result), "pages_per_sec": result.pages_per_sec}
+            for result in results
+        }
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+        logger.info(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        logger.warning(f"No baseline at {args.baseline}, run with --save-baseline")
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = check_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        logger.error(f"Regression {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
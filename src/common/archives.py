@@ -1,10 +1,85 @@
+import os
+from dataclasses import dataclass
 from pathlib import Path
 
+# overrides where pages, links and the archive live, e.g. for a throwaway run
+DATA_DIR_ENV = "GIARCHIVE_DATA_DIR"
+
 # src
-PARENT_DIR = Path(__file__).parent.parent.resolve()
+PARENT_DIR = Path(
+    os.environ.get(DATA_DIR_ENV) or Path(__file__).parent.parent
+).resolve()
 
 HTML_DIR = PARENT_DIR / "html"
 LINKS_DIR = PARENT_DIR / "links"
 ARCHIVE_DIR = PARENT_DIR / "archive"
 TEXT_DIR = ARCHIVE_DIR / "txt"
 JSON_DIR = ARCHIVE_DIR / "json"
+CACHE_DIR = HTML_DIR / "cache"
+MANIFEST_DIR = ARCHIVE_DIR / "manifest"
+EPUB_DIR = ARCHIVE_DIR / "epub"
+DATABASE_PATH = ARCHIVE_DIR / "archive.db"
+BLOB_PATH = MANIFEST_DIR / "blobs.jsonl"
+HTML_PACK_PATH = HTML_DIR / "pages.pack"
+QUEUE_PATH = ARCHIVE_DIR / "queue.db"
+# pages packed by each queue worker, merged into the html pack on collect
+WORKER_PACK_DIR = HTML_DIR / "workers"
+# compact copy of the whole archive, the suffix is the format
+SNAPSHOT_PATH = ARCHIVE_DIR / "archive.jsonl"
+QUARANTINE_DIR = ARCHIVE_DIR / "quarantine"
+# where watch mode left off in the recent changes
+WATCH_STATE_PATH = ARCHIVE_DIR / "watch_state.json"
+# other language editions of the wiki, see `src.common.links.Locale`
+DEFAULT_LOCALE = "en"
+LOCALES_PATH = PARENT_DIR / "locales.json"
+LOCALE_DIR = PARENT_DIR / "locales"
+# archives of every locale, aligned by item
+ALIGNED_DIR = ARCHIVE_DIR / "aligned"
+
+
+@dataclass(frozen=True)
+class DataPaths:
+    """Where the pages, links and archive of one language edition live\n
+    The default edition keeps the top level directories, the others have the
+    same layout under `locales/<code>/`
+    """
+
+    root: Path
+
+    @property
+    def html_dir(self) -> Path:
+        return self.root / "html"
+
+    @property
+    def links_dir(self) -> Path:
+        return self.root / "links"
+
+    @property
+    def archive_dir(self) -> Path:
+        return self.root / "archive"
+
+    @property
+    def json_dir(self) -> Path:
+        return self.archive_dir / "json"
+
+    @property
+    def manifest_dir(self) -> Path:
+        return self.archive_dir / "manifest"
+
+    @property
+    def quarantine_dir(self) -> Path:
+        return self.archive_dir / "quarantine"
+
+    def makedirs(self) -> None:
+        for directory in (self.html_dir, self.links_dir, self.json_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+
+def data_paths(locale: str | None = None) -> DataPaths:
+    """
+    :param locale: locale code, None for the default edition
+    :return: data directories of the edition
+    """
+    if locale is None or locale == DEFAULT_LOCALE:
+        return DataPaths(PARENT_DIR)
+    return DataPaths(LOCALE_DIR / locale)
@@ -9,7 +9,7 @@ class Category(Enum):
     WEAPON = "weapon"
 
 
-@dataclass
+@dataclass(slots=True)
 class Volume:
     """Representing a volume in a book collection"""
 
@@ -17,7 +17,7 @@ class Volume:
     text: str
 
 
-@dataclass
+@dataclass(slots=True)
 class BookCollection:
     """Representing a book collection archive"""
 
@@ -26,7 +26,7 @@ class BookCollection:
     volumes: list[Volume]
 
 
-@dataclass
+@dataclass(slots=True)
 class QuestBook:
     """Representing a book of other type, listed under quest items"""
 
@@ -35,6 +35,12 @@ class QuestBook:
     text: str
 
 
+# an artifact set's lore, {piece name: lore}
+ArtifactLore = dict[str, str]
+# a weapon's lore
+WeaponLore = str
+
+
 class BookCategory(StrEnum):
     """Enum types for books: book collection, quest/other"""
 
@@ -42,8 +48,10 @@ class BookCategory(StrEnum):
     quest = "quest"
 
 
-@dataclass
+@dataclass(slots=True)
 class BookArchive:
+    """Every book, the layout of `archive/json/book.json`"""
+
     book_collections: list[BookCollection] = field(default_factory=list)
     quest_books: list[QuestBook] = field(default_factory=list)
 
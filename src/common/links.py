@@ -1,5 +1,14 @@
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+from src.common.archives import DEFAULT_LOCALE, LOCALES_PATH
+
 BASE_LINK = "https://genshin-impact.fandom.com"
 
+API_LINK = "https://genshin-impact.fandom.com/api.php"
+
 ARTIFACT = "https://genshin-impact.fandom.com/wiki/Artifact/Sets"
 
 WEAPON = "https://genshin-impact.fandom.com/wiki/Weapon/List"
@@ -16,3 +25,108 @@ links2html_mapping = {  # TODO replace with enum
 # for book scraping (section header)
 BOOK_COL_ID = "List_of_Book_Collections"
 OTHER_BOOK_ID = "Other_Books"
+
+
+@dataclass(frozen=True)
+class Locale:
+    """One language edition of the wiki: where it lives, the titles of its index
+    pages and the sections the scrapers look for on its pages
+    """
+
+    code: str
+    # wiki url without a trailing slash, e.g. https://genshin-impact.fandom.com/fr
+    root: str
+    # index page titles
+    artifact: str
+    weapon: str
+    book: str
+    # headline ids and titles of the two book tables
+    book_col_id: str = BOOK_COL_ID
+    book_col_title: str = "List of Book Collections"
+    other_book_id: str = OTHER_BOOK_ID
+    other_book_title: str = "Other Books"
+    # headline ids of the text of artifacts and weapons, and of quest books
+    lore_id: str = "Lore"
+    text_id: str = "Text"
+    # book collection headings holding volumes, and those split into one per h3
+    volume_keywords: tuple[str, ...] = ("version", "vol")
+    version_keywords: tuple[str, ...] = ("version",)
+    # requests per second ceiling of this edition, defaults to the fetch policy's
+    max_rate: float | None = None
+
+    @property
+    def host(self) -> str:
+        """Scheme and host, links on the edition's pages are relative to it"""
+        parts = urlsplit(self.root)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    @property
+    def api_link(self) -> str:
+        return f"{self.root}/api.php"
+
+    def page_link(self, title: str) -> str:
+        """
+        :param title: e.g. "Weapon/List"
+        :return: url of the page on this edition
+        """
+        return f"{self.root}/wiki/{quote(title.replace(' ', '_'))}"
+
+    @property
+    def index_links(self) -> dict[str, str]:
+        """Like `links2html_mapping`, for this edition
+
+        :return: {category: index page url}
+        """
+        return {
+            "artifact": self.page_link(self.artifact),
+            "weapon": self.page_link(self.weapon),
+            "book": self.page_link(self.book),
+        }
+
+
+EN = Locale(
+    code=DEFAULT_LOCALE,
+    root=BASE_LINK,
+    artifact="Artifact/Sets",
+    weapon="Weapon/List",
+    book="Book",
+)
+
+# other editions are described in `locales.json`, their page titles and section
+# ids have to be checked against the edition before scraping it
+LOCALES: dict[str, Locale] = {EN.code: EN}
+
+
+def load_locales(path: str | Path = LOCALES_PATH) -> dict[str, Locale]:
+    """Add the editions described in a json file to `LOCALES`\n
+    The file maps a code to the fields of its `Locale`, e.g.
+    `{"fr": {"root": "https://genshin-impact.fandom.com/fr", "artifact": ...}}`
+
+    :param path: _description_
+    :return: `LOCALES`
+    """
+    path = Path(path)
+    if not path.exists():
+        return LOCALES
+    with open(path, "r", encoding="utf-8") as f:
+        described = json.load(f)
+    for code, fields in described.items():
+        fields = {
+            name: tuple(value) if isinstance(value, list) else value
+            for name, value in fields.items()
+        }
+        LOCALES[code] = Locale(code=code, **fields)
+    return LOCALES
+
+
+def get_locale(code: str = DEFAULT_LOCALE) -> Locale:
+    """
+    :param code: e.g. "en"
+    :raises ValueError: for editions neither built in nor in `locales.json`
+    :return: _description_
+    """
+    if code not in LOCALES:
+        load_locales()
+    if code not in LOCALES:
+        raise ValueError(f"Unknown locale {code!r}, describe it in {LOCALES_PATH}")
+    return LOCALES[code]
@@ -0,0 +1,315 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import zipfile
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+from src.common.archives import EPUB_DIR
+from src.common.book_type import Category
+from src.util.archive import iter_archive
+from src.util.file import safe_file_name
+from src.util.logger import get_logger
+from src.util.parallel import imap_ordered
+
+logger = get_logger("EpubExporter")
+
+# bump when the rendered output changes, so existing books are rebuilt
+FORMAT_VERSION = "1"
+
+# fixed timestamps keep the output byte-for-byte reproducible
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+MODIFIED = "2000-01-01T00:00:00Z"
+
+# archive part, as (part, key, record)
+Chapter = tuple[str, str, object]
+
+PART_TITLES = {
+    "artifact": "Artifacts",
+    "weapon": "Weapons",
+    "book_collection": "Book Collections",
+    "book_quest": "Other Books",
+}
+
+CATEGORY_PARTS = {
+    Category.ARTIFACT: ["artifact"],
+    Category.WEAPON: ["weapon"],
+    Category.BOOK: ["book_collection", "book_quest"],
+}
+
+SPLITS = ["library", "category", "collection"]
+
+CONTAINER = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+<rootfiles>
+<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+</rootfiles>
+</container>
+"""
+
+STYLE = """body { font-family: serif; line-height: 1.5; }
+h1, h2 { font-family: sans-serif; }
+p.location, p.description { font-style: italic; }
+"""
+
+XHTML = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" \
+lang="{language}" xml:lang="{language}">
+<head><title>{title}</title><link rel="stylesheet" href="style.css"/></head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+
+def _paragraphs(text: str, css_class: str | None = None) -> list[str]:
+    attr = f" class={quoteattr(css_class)}" if css_class else ""
+    return [f"<p{attr}>{escape(line)}</p>" for line in text.split("\n") if line.strip()]
+
+
+def render_chapter(chapter: Chapter) -> tuple[str, bytes]:
+    """Render an archive record as a XHTML chapter
+
+    :param chapter: (part, key, record)
+    :return: chapter title, XHTML
+    """
+    part, key, record = chapter
+    title = record["title"] if part.startswith("book") else key
+    body = [f"<h1>{escape(title)}</h1>"]
+    if part == "artifact":
+        for piece, lore in record.items():
+            body.append(f"<h2>{escape(piece)}</h2>")
+            body.extend(_paragraphs(lore))
+    elif part == "weapon":
+        body.extend(_paragraphs(record))
+    elif part == "book_collection":
+        body.extend(_paragraphs(record["location"], "location"))
+        for i, volume in enumerate(record["volumes"], start=1):
+            body.append(f"<h2>Vol. {i}</h2>")
+            body.extend(_paragraphs(volume["description"], "description"))
+            body.extend(_paragraphs(volume["text"]))
+    elif part == "book_quest":
+        body.extend(_paragraphs(record["location"], "location"))
+        body.extend(_paragraphs(record["text"]))
+
+    xhtml = XHTML.format(language="en", title=escape(title), body="\n".join(body))
+    return title, xhtml.encode("utf-8")
+
+
+def fingerprint(chapters: Iterable[Chapter]) -> tuple[str, int]:
+    """Digest of everything that ends up in a book
+
+    :param chapters: chapters of the book
+    :return: sha256 hex digest, number of chapters
+    """
+    digest = hashlib.sha256(f"epub-{FORMAT_VERSION}".encode("utf-8"))
+    count = 0
+    for chapter in chapters:
+        digest.update(json.dumps(chapter, sort_keys=True).encode("utf-8"))
+        digest.update(b"\n")
+        count += 1
+    return digest.hexdigest(), count
+
+
+def existing_fingerprint(path: Path) -> str | None:
+    """Fingerprint recorded in the identifier of an already built book
+
+    :param path: epub file
+    :return: _description_
+    """
+    try:
+        with zipfile.ZipFile(path) as zf:
+            opf = zf.read("OEBPS/content.opf").decode("utf-8")
+    except (FileNotFoundError, KeyError, zipfile.BadZipFile):
+        return None
+    match = re.search(r"urn:sha256:([0-9a-f]{64})", opf)
+    return match.group(1) if match else None
+
+
+class EpubWriter:
+    """Writes an EPUB 3 container one chapter at a time\n
+    Chapters go straight into the zip, only their titles are kept for
+    the navigation document and package file written on `close`
+    """
+
+    def __init__(
+        self, path: str | Path, title: str, digest: str, language: str = "en"
+    ) -> None:
+        self.path = Path(path)
+        self.title = title
+        self.digest = digest
+        self.language = language
+        self.chapters: list[tuple[str, str]] = []
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.path.with_suffix(".epub.tmp")
+        self._zip = zipfile.ZipFile(self._tmp, "w")
+        # mimetype must come first and uncompressed
+        self._write("mimetype", b"application/epub+zip", zipfile.ZIP_STORED)
+        self._write("META-INF/container.xml", CONTAINER.encode("utf-8"))
+        self._write("OEBPS/style.css", STYLE.encode("utf-8"))
+
+    def _write(
+        self, name: str, data: bytes, compress_type: int = zipfile.ZIP_DEFLATED
+    ) -> None:
+        info = zipfile.ZipInfo(name, date_time=ZIP_DATE)
+        info.compress_type = compress_type
+        info.create_system = 3
+        info.external_attr = 0o644 << 16
+        self._zip.writestr(info, data, compresslevel=9)
+
+    def add_chapter(self, title: str, xhtml: bytes) -> None:
+        href = f"c{len(self.chapters) + 1:04d}.xhtml"
+        self._write(f"OEBPS/{href}", xhtml)
+        self.chapters.append((href, title))
+
+    def _nav(self) -> bytes:
+        items = "\n".join(
+            f'<li><a href="{href}">{escape(title)}</a></li>'
+            for href, title in self.chapters
+        )
+        body = f'<nav epub:type="toc" id="toc"><h1>{escape(self.title)}</h1>\n<ol>\n{items}\n</ol></nav>'
+        xhtml = XHTML.format(
+            language=self.language, title=escape(self.title), body=body
+        )
+        return xhtml.encode("utf-8")
+
+    def _package(self) -> bytes:
+        manifest = [
+            '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+            '<item id="css" href="style.css" media-type="text/css"/>',
+        ]
+        spine = []
+        for i, (href, _) in enumerate(self.chapters, start=1):
+            manifest.append(
+                f'<item id="c{i}" href="{href}" media-type="application/xhtml+xml"/>'
+            )
+            spine.append(f'<itemref idref="c{i}"/>')
+        newline = "\n"
+        opf = f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="uid" xml:lang="{self.language}">
+<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:identifier id="uid">urn:sha256:{self.digest}</dc:identifier>
+<dc:title>{escape(self.title)}</dc:title>
+<dc:language>{self.language}</dc:language>
+<meta property="dcterms:modified">{MODIFIED}</meta>
+</metadata>
+<manifest>
+{newline.join(manifest)}
+</manifest>
+<spine>
+{newline.join(spine)}
+</spine>
+</package>
+"""
+        return opf.encode("utf-8")
+
+    def close(self) -> None:
+        self._write("OEBPS/nav.xhtml", self._nav())
+        self._write("OEBPS/content.opf", self._package())
+        self._zip.close()
+        os.replace(self._tmp, self.path)
+
+
+def build_book(
+    path: Path,
+    title: str,
+    chapters: Callable[[], Iterator[Chapter]],
+    pool: Executor,
+    window: int,
+) -> bool:
+    """Build one book unless an identical one is already there
+
+    :param path: epub file
+    :param title: book title
+    :param chapters: returns a fresh chapter stream, read once to fingerprint and
+        once to render
+    :param pool: pool chapters are rendered on
+    :param window: chapters rendered ahead of the zip writer
+    :return: whether the book was (re)built
+    """
+    digest, count = fingerprint(chapters())
+    if count == 0:
+        logger.warning(f"Nothing to put in {path.name}, archive is empty")
+        return False
+    if existing_fingerprint(path) == digest:
+        logger.debug(f"{path.name} is up to date")
+        return False
+
+    writer = EpubWriter(path, title, digest)
+    for chapter_title, xhtml in imap_ordered(pool, render_chapter, chapters(), window):
+        writer.add_chapter(chapter_title, xhtml)
+    writer.close()
+    logger.info(f"Built {path.name} with {len(writer.chapters)} chapters")
+    return True
+
+
+def _stream(parts: list[str]) -> Iterator[Chapter]:
+    for part in parts:
+        for key, record in iter_archive(part):
+            yield part, key, record
+
+
+def export_epub(
+    split: str = "category",
+    output_dir: str | Path = EPUB_DIR,
+    workers: int | None = None,
+) -> list[Path]:
+    """Export the artifact, book and weapon archives to EPUB\n
+    Books whose content didn't change are left alone, and books the split no
+    longer produces, e.g. removed collections, are removed
+
+    :param split: "library" for one book, "category" for one book per category,
+        "collection" for one book per book collection (others per category)
+    :param output_dir: _description_
+    :param workers: processes rendering chapters, defaults to one per core
+    :return: books that were (re)built
+    """
+    if split not in SPLITS:
+        raise ValueError(f"split must be one of {SPLITS}")
+
+    output_dir = Path(output_dir)
+    workers = workers or os.cpu_count() or 1
+    built = []
+    expected: set[Path] = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = 4 * workers
+
+        def build(name: str, title: str, chapters: Callable[[], Iterator[Chapter]]):
+            path = output_dir / f"{safe_file_name(name)}.epub"
+            expected.add(path)
+            if build_book(path, title, chapters, pool, window):
+                built.append(path)
+
+        if split == "library":
+            all_parts = [part for parts in CATEGORY_PARTS.values() for part in parts]
+            build("library", "GIArchive", lambda: _stream(all_parts))
+        else:
+            for category, parts in CATEGORY_PARTS.items():
+                if split == "collection" and category == Category.BOOK:
+                    parts = [part for part in parts if part != "book_collection"]
+                    for key, record in iter_archive("book_collection"):
+                        chapter = ("book_collection", key, record)
+                        build(key, key, lambda chapter=chapter: iter([chapter]))
+                titles = ", ".join(PART_TITLES[part] for part in parts)
+                build(category.value, titles, lambda parts=parts: _stream(parts))
+    for stale in output_dir.glob("*.epub"):
+        if stale not in expected:
+            stale.unlink()
+            logger.info(f"Removed {stale.name}, no longer part of the export")
+    return built
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the archive to EPUB")
+    parser.add_argument("--split", choices=SPLITS, default="category")
+    parser.add_argument("--output", type=Path, default=EPUB_DIR)
+    parser.add_argument("--jobs", type=int, default=None)
+    args = parser.parse_args()
+    export_epub(split=args.split, output_dir=args.output, workers=args.jobs)
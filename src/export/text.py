@@ -0,0 +1,93 @@
+import argparse
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from src.common.archives import TEXT_DIR
+from src.util.archive import ARCHIVE_PARTS, iter_archive
+from src.util.file import safe_file_name, write_if_changed
+from src.util.logger import get_logger
+from src.util.parallel import imap_ordered
+
+logger = get_logger("TextExporter")
+
+# archive part, as (part, key, record)
+Chapter = tuple[str, str, object]
+
+
+def render_text(chapter: Chapter) -> str:
+    """Render an archive record as plain text
+
+    :param chapter: (part, key, record)
+    :return: _description_
+    """
+    part, key, record = chapter
+    if part == "artifact":
+        blocks = [key] + [f"{piece}\n\n{lore}" for piece, lore in record.items()]
+    elif part == "weapon":
+        blocks = [key, record]
+    elif part == "book_collection":
+        blocks = [record["title"], record["location"]]
+        for i, volume in enumerate(record["volumes"], start=1):
+            volume_block = f"Vol. {i}"
+            if volume["description"]:
+                volume_block += f"\n{volume['description']}"
+            blocks.append(f"{volume_block}\n\n{volume['text']}")
+    else:
+        blocks = [record["title"], record["location"], record["text"]]
+    return "\n\n".join(block for block in blocks if block) + "\n"
+
+
+def _export(job: tuple[Path, Chapter]) -> bool:
+    path, chapter = job
+    return write_if_changed(path, render_text(chapter).encode("utf-8"))
+
+
+def _jobs(output_dir: Path, part: str, written: set[Path]):
+    for key, record in iter_archive(part):
+        path = output_dir / part / f"{safe_file_name(key)}.txt"
+        if path in written:
+            # keys differing only in characters file names can't hold
+            digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+            path = path.with_name(f"{path.stem}-{digest}.txt")
+            logger.warning(
+                f"{part}/{key} has the same file name as another item, "
+                f"written to {path.name}"
+            )
+        written.add(path)
+        yield path, (part, key, record)
+
+
+def export_text(output_dir: str | Path = TEXT_DIR, workers: int | None = None) -> int:
+    """Export every artifact, weapon and book to `archive/txt/<part>/<item>.txt`\n
+    Files whose content didn't change are left alone, and files of items no
+    longer in the archive are removed
+
+    :param output_dir: _description_
+    :param workers: threads writing files, defaults to one per core
+    :return: number of files written or removed
+    """
+    output_dir = Path(output_dir)
+    workers = workers or os.cpu_count() or 1
+    changed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for part in ARCHIVE_PARTS:
+            (output_dir / part).mkdir(parents=True, exist_ok=True)
+            written: set[Path] = set()
+            jobs = _jobs(output_dir, part, written)
+            changed += sum(imap_ordered(pool, _export, jobs, 4 * workers))
+            for stale in (output_dir / part).glob("*.txt"):
+                if stale not in written:
+                    stale.unlink()
+                    changed += 1
+    logger.info(f"{changed} text files written or removed")
+    return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the archive to plain text")
+    parser.add_argument("--output", type=Path, default=TEXT_DIR)
+    parser.add_argument("--jobs", type=int, default=None)
+    args = parser.parse_args()
+    export_text(output_dir=args.output, workers=args.jobs)
@@ -1,18 +1,360 @@
-from src.scraper.artifact_scraper import ArtifactScraper
+import argparse
+import os
+import sys
+import threading
+from collections.abc import Callable
+
+from src.common.archives import (
+    ALIGNED_DIR,
+    ARCHIVE_DIR,
+    DATABASE_PATH,
+    DEFAULT_LOCALE,
+    SNAPSHOT_PATH,
+    data_paths,
+)
+from src.common.book_type import Category
+from src.common.links import EN, Locale, get_locale
+from src.export.epub import export_epub
+from src.export.text import export_text
+from src.scraper.fetcher import get_fetcher, set_fetcher
 from src.scraper.link_scraper import LinkScraper
+from src.scraper.locales import (
+    ALIGNED_LINKS,
+    align_links,
+    limit_locales,
+    write_aligned,
+)
+from src.scraper.mediawiki import MediaWikiFetcher
+from src.scraper.pipeline import make_parse_pool
+from src.scraper.registry import ITEM_SCRAPERS
+from src.util.archive import ARCHIVE_PARTS, compact_blobs, write_snapshot
+from src.util.codec import CODECS, get_codec
+from src.util.dag import FAILED, Task, run_dag
+from src.util.database import ArchiveDatabase
+from src.util.html_pack import get_html_pack
+from src.util.http_cache import HttpCache
+from src.util.metrics import get_metrics
+
+METRICS_PATH = ARCHIVE_DIR / "metrics.json"
+RUN_STATE_PATH = ARCHIVE_DIR / "run_state.json"
+
+CATEGORIES = [category.value for category in Category]
+
+# how pages are fetched: skinned article pages, or article bodies through api.php
+BACKENDS = ["html", "api"]
+
+
+class Runner:
+    """Builds the scrape as a DAG: index pages -> link lists -> item pages -> exports\n
+    Every language edition gets its own tasks, run concurrently through the shared
+    fetcher, each edition rate limited on its own. With more than one edition,
+    their archives are aligned by item once every edition is scraped
+    """
+
+    def __init__(
+        self,
+        refresh_index: bool = False,
+        parse_workers: int | None = None,
+        offline: bool = False,
+        retry_failed: bool = False,
+        snapshot_format: str = "json",
+        locales: list[Locale] | None = None,
+    ) -> None:
+        """
+        :param locales: editions to scrape, the first one is the reference of
+            the aligned archive, defaults to the English one
+        """
+        self.refresh_index = refresh_index
+        cores = os.cpu_count() or 1
+        self.parse_workers = (
+            cores if parse_workers is None else min(parse_workers, cores)
+        )
+        # one parse pool for every scrape task, they run concurrently
+        self.parse_pool = (
+            make_parse_pool(self.parse_workers) if self.parse_workers else None
+        )
+        self.offline = offline
+        self.retry_failed = retry_failed
+        self.snapshot_format = snapshot_format
+        self.locales = locales or [EN]
+        limit_locales(get_fetcher().policy, self.locales)
+        self._link_scrapers: dict[str, LinkScraper] = {}
+        self._lock = threading.Lock()
+
+    def link_scraper(self, locale: Locale = EN) -> LinkScraper:
+        # shared by the link tasks of an edition, its index pages are loaded on
+        # first use
+        with self._lock:
+            if locale.code not in self._link_scrapers:
+                scraper = LinkScraper(
+                    load_from_file=not self.refresh_index, locale=locale
+                )
+                scraper.paths.makedirs()
+                self._link_scrapers[locale.code] = scraper
+            return self._link_scrapers[locale.code]
+
+    def _timed(self, category: str, fn: Callable[[], object]) -> Callable[[], None]:
+        def run() -> None:
+            with get_metrics().run(category):
+                fn()
+
+        return run
+
+    def _scrape_links(self, category: Category, locale: Locale) -> None:
+        scraper = self.link_scraper(locale)
+        {
+            Category.ARTIFACT: scraper.scrape_artifact_links,
+            Category.WEAPON: scraper.scrape_weapon_links,
+            Category.BOOK: scraper.scrape_book_links,
+        }[category]()
+
+    def _scrape_items(self, category: Category, locale: Locale) -> None:
+        scraper = ITEM_SCRAPERS[category](
+            parse_workers=self.parse_workers,
+            offline=self.offline,
+            retry_failed=self.retry_failed,
+            locale=locale,
+            parse_pool=self.parse_pool,
+        )
+        scraper.paths.makedirs()
+        scraper.run()
+
+    def close(self) -> None:
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
+
+    def _export_database(self) -> None:
+        database = ArchiveDatabase()
+        if database.import_archive():
+            database.optimize()
+        database.close()
+
+    def _export_snapshot(self) -> None:
+        write_snapshot(get_codec(self.snapshot_format))
+
+    def _locale_tasks(self, locale: Locale, categories: list[Category]) -> list[Task]:
+        paths = data_paths(locale.code)
+        index = task_name("index", locale)
+        tasks = [
+            Task(
+                name=index,
+                run=self._timed(
+                    LinkScraper.category,
+                    lambda: self.link_scraper(locale).load_indexes(),
+                ),
+                outputs=tuple(
+                    paths.html_dir / f"{name}.html" for name in locale.index_links
+                ),
+            )
+        ]
+        for category in categories:
+            name = category.value
+            links = task_name(f"links.{name}", locale)
+            tasks.append(
+                Task(
+                    name=links,
+                    run=self._timed(
+                        LinkScraper.category,
+                        lambda category=category: self._scrape_links(category, locale),
+                    ),
+                    deps=(index,),
+                    outputs=(paths.links_dir / f"{name}.json",),
+                )
+            )
+            tasks.append(
+                Task(
+                    name=task_name(f"scrape.{name}", locale),
+                    run=self._timed(
+                        name,
+                        lambda category=category: self._scrape_items(category, locale),
+                    ),
+                    deps=(links,),
+                    outputs=(paths.json_dir / f"{name}.json",),
+                    # item pages change without their link list changing, the
+                    # manifest skips the unchanged ones
+                    remote=True,
+                )
+            )
+        return tasks
+
+    def tasks(self, only: list[str] | None = None, export: bool = True) -> list[Task]:
+        """
+        :param only: categories to scrape, defaults to all of them
+        :param export: add the export tasks, which need every category
+        :return: _description_
+        """
+        categories = [Category(name) for name in only] if only else list(Category)
+        tasks = []
+        for locale in self.locales:
+            tasks.extend(self._locale_tasks(locale, categories))
+
+        if export and not only:
+            if EN in self.locales:
+                tasks.extend(self._export_tasks())
+            if len(self.locales) > 1:
+                tasks.extend(self._aligned_tasks())
+        # once nothing else writes the blob store or the html pack
+        tasks.append(
+            Task(
+                name="compact",
+                run=self._compact,
+                deps=tuple(task.name for task in tasks),
+            )
+        )
+        return tasks
+
+    def _compact(self) -> None:
+        compact_blobs()
+        get_html_pack().compact()
+
+    def _export_tasks(self) -> list[Task]:
+        # exports of the English edition
+        scraped = tuple(f"scrape.{category.value}" for category in Category)
+        suffix = CODECS[self.snapshot_format].suffix
+        return [
+            Task(name="export.epub", run=export_epub, deps=scraped),
+            Task(name="export.text", run=export_text, deps=scraped),
+            Task(
+                name="export.database",
+                run=self._export_database,
+                deps=scraped,
+                outputs=(DATABASE_PATH,),
+            ),
+            Task(
+                name="export.snapshot",
+                run=self._export_snapshot,
+                deps=scraped,
+                outputs=(SNAPSHOT_PATH.with_suffix(suffix),),
+            ),
+        ]
+
+    def _aligned_tasks(self) -> list[Task]:
+        source, *others = self.locales
+        tasks = []
+        for locale in others:
+            tasks.append(
+                Task(
+                    name=task_name("align", locale),
+                    run=lambda locale=locale: align_links(source, locale),
+                    deps=tuple(
+                        task_name(f"links.{category.value}", each)
+                        for each in (source, locale)
+                        for category in Category
+                    ),
+                    outputs=(data_paths(locale.code).links_dir / ALIGNED_LINKS,),
+                )
+            )
+        scraped = tuple(
+            task_name(f"scrape.{category.value}", locale)
+            for locale in self.locales
+            for category in Category
+        )
+        aligned = tuple(task_name("align", locale) for locale in others)
+        tasks.append(
+            Task(
+                name="export.aligned",
+                run=lambda: write_aligned(self.locales),
+                deps=scraped + aligned,
+                outputs=tuple(ALIGNED_DIR / f"{name}.json" for name in ARCHIVE_PARTS),
+            )
+        )
+        return tasks
+
+
+def task_name(name: str, locale: Locale) -> str:
+    """
+    :param name: e.g. "scrape.weapon"
+    :param locale: _description_
+    :return: the name itself for the English edition, else e.g. "scrape.weapon@fr"
+    """
+    return name if locale.code == DEFAULT_LOCALE else f"{name}@{locale.code}"
 
 
-def scrape_artifact():
-    artifact_scraper = ArtifactScraper()
-    artifact_scraper.run()
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Scrape and export the archive")
+    parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count() or 1, help="tasks run at once"
+    )
+    parser.add_argument(
+        "--only",
+        choices=CATEGORIES,
+        action="append",
+        help="only scrape this category, can be repeated (skips exports)",
+    )
+    parser.add_argument(
+        "--since-last-run",
+        action="store_true",
+        help="skip tasks whose upstream outputs haven't changed since they last ran, "
+        "item pages are still checked for edits",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only show the plan")
+    parser.add_argument(
+        "--refresh-index", action="store_true", help="fetch the index pages again"
+    )
+    parser.add_argument(
+        "--offline", action="store_true", help="re-extract from packed pages"
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="only scrape the items quarantined by earlier runs, from their saved html",
+    )
+    parser.add_argument("--no-export", action="store_true")
+    parser.add_argument(
+        "--snapshot-format",
+        choices=list(CODECS),
+        default="json",
+        help="format of the compact archive snapshot, msgpack needs msgpack",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=None,
+        help="parse processes shared by every scraper, at most one per core",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="html",
+        help="fetch skinned pages, or article bodies through the MediaWiki api",
+    )
+    parser.add_argument(
+        "--locale",
+        action="append",
+        help="language edition to scrape, can be repeated, the first one is the "
+        "reference of the aligned archive (default: en)",
+    )
+    args = parser.parse_args()
 
+    try:
+        locales = [get_locale(code) for code in args.locale or [DEFAULT_LOCALE]]
+    except ValueError as e:
+        parser.error(str(e))
 
-def scrape_links():
-    scraper = LinkScraper(load_from_file=True)
-    scraper.scrape_weapon_links()
-    scraper.scrape_artifact_links()
-    scraper.scrape_book_links()
+    if args.backend == "api":
+        set_fetcher(MediaWikiFetcher(cache=HttpCache()))
+    runner = Runner(
+        refresh_index=args.refresh_index,
+        parse_workers=args.parse_workers,
+        offline=args.offline,
+        retry_failed=args.retry_failed,
+        snapshot_format=args.snapshot_format,
+        locales=list(dict.fromkeys(locales)),
+    )
+    try:
+        status = run_dag(
+            runner.tasks(only=args.only, export=not args.no_export),
+            RUN_STATE_PATH,
+            jobs=args.jobs,
+            since_last_run=args.since_last_run,
+            dry_run=args.dry_run,
+        )
+    finally:
+        runner.close()
+    if not args.dry_run:
+        get_metrics().write_report(METRICS_PATH)
+    return 1 if FAILED in status.values() else 0
 
 
 if __name__ == "__main__":
-    scrape_links()
+    sys.exit(main())
@@ -1,15 +1,37 @@
 import json
-from urllib.parse import unquote, urlparse
+from collections.abc import Iterable
+from concurrent.futures import Executor
+from functools import partial
 
-from bs4 import BeautifulSoup, PageElement
-from src.common.archives import JSON_DIR, LINKS_DIR
 from src.common.book_type import Category
+from src.common.links import EN, Locale
 from src.scraper.base import Scraper
-from src.util.file import dump_to_json
+from src.scraper.fetcher import Fetcher
+from src.scraper.rules import compiled_rules
+from src.util.database import ArchiveDatabase
+from src.util.file import dump_stream_to_json
 from src.util.logger import get_logger
+from src.util.manifest import Manifest
 from src.util.url import extract_slug
 
 
+def extract_artifact(
+    link: str, page_html: str, locale: Locale = EN
+) -> tuple[str, dict[str, str]]:
+    """Extract the lore of every piece of an artifact set page
+
+    :param link: artifact set link
+    :param page_html: html of the page
+    :param locale: edition the page is from
+    :raises ValueError: when the page has no Lore section
+    :return: artifact name, {piece name: lore}
+    """
+    # get artifact name from the URL
+    artifact_name = extract_slug(link)
+    page = compiled_rules(locale)[Category.ARTIFACT].apply(link, page_html)
+    return artifact_name, {item.title: item.text for item in page.items}
+
+
 class ArtifactScraper(Scraper):
     """Scrapes artifact lore from links in `links/artifact.json`\n
     Saves scraped artifact lore to `archive/json/artifact.json`
@@ -17,76 +39,54 @@ class ArtifactScraper(Scraper):
     :param Scraper: _description_
     """
 
-    def __init__(self):
+    category = Category.ARTIFACT.value
+
+    def __init__(
+        self,
+        fetcher: Fetcher | None = None,
+        parse_workers: int | None = None,
+        database: ArchiveDatabase | None = None,
+        offline: bool = False,
+        retry_failed: bool = False,
+        only: Iterable[str] | None = None,
+        locale: Locale | None = None,
+        parse_pool: Executor | None = None,
+    ):
+        super().__init__(
+            fetcher,
+            parse_workers,
+            database,
+            offline,
+            retry_failed,
+            only,
+            locale,
+            parse_pool,
+        )
         self.logger = get_logger("ArtifactScraper")
 
     def run(self):
-        """Scrape!
-
-        :raises ValueError: _description_
-        """
-        with open(LINKS_DIR / f"{Category.ARTIFACT.value}.json", "r") as f:
+        """Scrape! Pages without a Lore section are quarantined"""
+        with open(self.paths.links_dir / f"{Category.ARTIFACT.value}.json", "r") as f:
             links = json.load(f)
 
         self.logger.info(f"Checking {len(links)} artifact links")
-        all_results = {}
-        for link in links:
-            self.logger.debug(f"Checking {link}")
-
-            page_html = self.get_page(link)
-            soup = BeautifulSoup(page_html, "html.parser")
-
-            # get artifact name from the URL
-            artifact_name = extract_slug(link)
-
-            # 1. Find the <h2> with id="Lore"
-            lore_heading = soup.find("span", id="Lore")
-            if not lore_heading:
-                raise ValueError("Lore section not found. Page may have changed")
-
-            # 2. Find the parent <h2> to locate the section start
-            lore_h2 = lore_heading.find_parent("h2")
-
-            # 4. Parse every element before next h2, get h3 + following text
-            # h2: lore heading
-            # h3: piece name heading
-            # div: description <div class="description-wrapper">
-            # div: lore/content
-            result = {}
-            for elem in lore_h2.find_next_siblings():
-                if elem.name == "h2":  # stop at next h2
-                    break
-                if elem.name != "h3":
-                    continue
-
-                # get headline text (h3), artifact name
-                title_span = elem.find("span", class_="mw-headline")
-                if not title_span:
-                    continue
-                piece = title_span.get_text(strip=True)
-
-                # get all text immediately after this <h3>, ignoring description-wrapper div
-                texts = []
-                for sibling in elem.find_next_siblings():
-                    # stop at next headline
-                    if sibling.name == "h3" or sibling.name == "h2":
-                        break
-
-                    # skip description div
-                    if sibling.name == "div" and "description-wrapper" in sibling.get(
-                        "class", []
-                    ):
-                        continue
-
-                    if sibling.name == "p":
-                        texts.append(sibling.get_text(strip=True))
-                    elif sibling.get_text(strip=True):
-                        texts.append(sibling.get_text(" ", strip=True))
-
-                result[piece] = "\n".join(texts)
-
-            all_results[artifact_name] = result
-
-        output_path = JSON_DIR / f"{Category.ARTIFACT.value}.json"
-        self.logger.info(f"Extracted info from {len(all_results)} links")
-        dump_to_json(all_results, output_path)
+        manifest = Manifest(Category.ARTIFACT.value, self.paths.manifest_dir)
+        try:
+            dropped = manifest.retain(links)
+            if dropped:
+                self.logger.info(f"Dropped {len(dropped)} unlisted artifact links")
+
+            extract = partial(extract_artifact, locale=self.locale)
+            changed = self.scrape_changed(links, manifest, extract)
+
+            manifest.save()
+            output_path = self.paths.json_dir / f"{Category.ARTIFACT.value}.json"
+            self.logger.info(
+                f"Extracted info from {changed} changed links, "
+                f"{len(manifest)} in archive"
+            )
+            with self.metrics.timer("write", self.category):
+                # long text is left as blob references, like in the manifest
+                dump_stream_to_json(manifest.iter_results(rehydrate=False), output_path)
+        finally:
+            manifest.close()
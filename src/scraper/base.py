@@ -1,22 +1,231 @@
 from abc import ABC
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor
 from pathlib import Path
 
-import requests
+from src.common.archives import data_paths
+from src.common.links import EN, Locale
+from src.scraper.fetcher import Fetcher, FetchErrorHandler, get_fetcher
+from src.scraper.pipeline import Extractor, ExtractErrorHandler, ParsePipeline, R
+from src.util.codec import to_record
+from src.util.database import ArchiveDatabase
+from src.util.html_pack import get_html_pack
+from src.util.manifest import Manifest, content_hash
+from src.util.metrics import OTHER, get_metrics
+from src.util.quarantine import EXTRACT, FETCH, Quarantine
 
 
 class Scraper(ABC):
+    # metrics of this scraper are reported under this category
+    category: str = OTHER
+
+    def __init__(
+        self,
+        fetcher: Fetcher | None = None,
+        parse_workers: int | None = None,
+        database: ArchiveDatabase | None = None,
+        offline: bool = False,
+        retry_failed: bool = False,
+        only: Iterable[str] | None = None,
+        locale: Locale | None = None,
+        parse_pool: Executor | None = None,
+    ) -> None:
+        self.fetcher = fetcher if fetcher is not None else get_fetcher()
+        self.parse_workers = parse_workers
+        # process pool shared with other scrapers, see `make_parse_pool`
+        self.parse_pool = parse_pool
+        # optional SQLite copy of the archive, kept up to date as pages are scraped
+        self.database = database
+        # re-extract from the html pack instead of fetching
+        self.offline = offline
+        # only scrape the links quarantined by earlier runs
+        self.retry_failed = retry_failed
+        # only scrape these links, e.g. the pages edited since the last run
+        self.only = set(only) if only is not None else None
+        # language edition scraped, its links and archive live in `paths`
+        self.locale = locale if locale is not None else EN
+        self.paths = data_paths(self.locale.code)
+        self.pack = get_html_pack()
+        self.metrics = get_metrics()
 
     def get_page(self, url: str) -> str:
-        """Use request to get a url's page and returns the HTML
+        """Use the shared session to get a url's page and returns the HTML\n
+        Transient failures are retried by the fetcher's `FetchPolicy`
 
         :param url: _description_
         :return: html as a string
         """
-        resp = requests.get(url)
-        # TODO, add retry
-        resp.raise_for_status()
+        return self.fetcher.fetch(url)
+
+    def get_pages(
+        self, urls: Iterable[str], on_error: FetchErrorHandler | None = None
+    ) -> Iterator[tuple[str, str]]:
+        """Get many pages concurrently through the shared connection pool\n
+        Every fetched page is packed, offline scrapers read the pack instead
+
+        :param urls: urls to fetch
+        :param on_error: see `Fetcher.fetch_many`
+        :return: (url, html) pairs, in completion order
+        """
+        urls = list(urls)
+        if self.offline:
+            yield from self.get_packed_pages(urls)
+            return
+
+        self.metrics.assign(urls, self.category)
+        for url, html in self.fetcher.fetch_many(urls, on_error):
+            self.pack.put(url, html)
+            yield url, html
+
+    def get_packed_pages(self, urls: Iterable[str]) -> Iterator[tuple[str, str]]:
+        """Latest packed html of every url, pages never fetched are skipped
+
+        :param urls: _description_
+        :return: (url, html) pairs
+        """
+        for url in urls:
+            html = self.pack.get(url)
+            if html is None:
+                self.logger.warning(f"{url} is not packed, skipping it")
+                continue
+            yield url, html
+
+    def get_changed_pages(
+        self,
+        urls: Iterable[str],
+        manifest: Manifest,
+        versions: dict[str, str],
+        on_error: FetchErrorHandler | None = None,
+    ) -> Iterator[tuple[str, str]]:
+        """Get many pages, skipping those the manifest already has results for
+
+        :param urls: urls to fetch
+        :param manifest: category manifest
+        :param versions: filled with the version of every yielded page
+        :param on_error: see `Fetcher.fetch_many`
+        :return: (url, html) pairs of new or changed pages
+        """
+        for url, html in self.get_pages(urls, on_error):
+            version = content_hash(html)
+            if manifest.is_current(url, version):
+                continue
+            versions[url] = version
+            yield url, html
+
+    def get_quarantined_pages(
+        self,
+        links: list[str],
+        quarantine: Quarantine,
+        versions: dict[str, str],
+        on_error: FetchErrorHandler | None = None,
+    ) -> Iterator[tuple[str, str]]:
+        """Pages of quarantined links, from the html saved with the failure or the
+        pack when possible, the others are fetched again
+
+        :param links: quarantined links to retry
+        :param quarantine: _description_
+        :param versions: filled with the version of every yielded page
+        :param on_error: see `Fetcher.fetch_many`
+        :return: (url, html) pairs
+        """
+        missing = []
+        for link in links:
+            html = quarantine.html(link)
+            if html is None:
+                html = self.pack.get(link)
+            if html is None:
+                missing.append(link)
+                continue
+            versions[link] = content_hash(html)
+            yield link, html
+        for link, html in self.get_pages(missing, on_error):
+            versions[link] = content_hash(html)
+            yield link, html
+
+    def extract_pages(
+        self,
+        pages: Iterable[tuple[str, str]],
+        extract: Extractor,
+        on_error: ExtractErrorHandler | None = None,
+    ) -> Iterator[tuple[str, R]]:
+        """Run an extractor over fetched pages on the parse process pool
+
+        :param pages: (url, html) pairs
+        :param extract: module level `extract(url, html)` function
+        :param on_error: see `ParsePipeline.run`
+        :return: (url, result) pairs, in completion order
+        """
+        pipeline = ParsePipeline(workers=self.parse_workers, pool=self.parse_pool)
+        return pipeline.run(pages, extract, self.category, on_error)
+
+    def scrape_changed(
+        self, links: list[str], manifest: Manifest, extract: Extractor
+    ) -> int:
+        """Fetch links, extract new or changed pages and record them in the manifest
+        (and the database, if any)\n
+        A page that can't be fetched or extracted doesn't stop the others, it is
+        quarantined with its error and html, and scraped again by the next run,
+        or by a `retry_failed` run from the saved html
+
+        :param links: _description_
+        :param manifest: category manifest
+        :param extract: module level `extract(link, html)` returning (key, result)
+        :return: number of new or changed pages
+        """
+        quarantine = Quarantine(manifest.name, self.paths.quarantine_dir)
+        quarantine.retain(links)
+
+        def fetch_failed(link: str, error: Exception) -> None:
+            self.logger.warning(f"Failed to fetch {link}: {error!r}, quarantined")
+            quarantine.add(link, error, stage=FETCH)
+            self.metrics.count("failures", 1, self.category)
+
+        def extract_failed(link: str, html: str, error: Exception) -> None:
+            self.logger.warning(f"Failed to extract {link}: {error!r}, quarantined")
+            quarantine.add(link, error, html, stage=EXTRACT)
+            self.metrics.count("failures", 1, self.category)
+
+        versions: dict[str, str] = {}
+        if self.only is not None:
+            links = [link for link in links if link in self.only]
+        if self.retry_failed:
+            links = [link for link in links if link in quarantine]
+            self.logger.info(f"Retrying {len(links)} quarantined {manifest.name} links")
+            pages = self.get_quarantined_pages(
+                links, quarantine, versions, fetch_failed
+            )
+        else:
+            pages = self.get_changed_pages(links, manifest, versions, fetch_failed)
+
+        for link, (key, result) in self.extract_pages(pages, extract, extract_failed):
+            result = to_record(result)
+            with self.metrics.timer("write", self.category):
+                changed = manifest.update(link, versions[link], key, result)
+                if changed and self.database is not None:
+                    self.database.upsert(manifest.name, key, result)
+            if changed:
+                self.metrics.count("changed_results", 1, self.category)
+            quarantine.remove(link)
+        if self.database is not None:
+            self._sync_database(manifest)
+        quarantine.save()
+        if len(quarantine):
+            self.logger.warning(
+                f"{len(quarantine)} {manifest.name} links quarantined in "
+                f"{quarantine.path}"
+            )
+        return len(versions)
 
-        return resp.text
+    def _sync_database(self, manifest: Manifest) -> None:
+        # unchanged pages are not upserted, fill in what a new database is missing
+        stored = self.database.keys(manifest.name)
+        keys = []
+        for link, entry in manifest.entries.items():
+            key = entry["key"]
+            if key not in stored:
+                self.database.upsert(manifest.name, key, manifest.result(link))
+            keys.append(key)
+        self.database.retain(manifest.name, keys)
 
     def dump_page_to_file(self, url: str, file: str | Path) -> str:
         """Get a page's html and dump it to a file
@@ -24,16 +233,22 @@ class Scraper(ABC):
         :param url: _description_
         """
         html = self.get_page(url)
+        self.pack.put(url, html)
         with open(file, "w", encoding="utf-8") as f:
             f.write(html)
         return html
 
-    def load_html_from_file(self, file: str | Path) -> str:
-        """Loads html/content from a file
+    def load_html_from_file(self, file: str | Path, url: str | None = None) -> str:
+        """Loads html/content from the html pack, or from a file if it isn't packed
 
         :param file: _description_
+        :param url: key of the page in the pack
         :return: string
         """
+        if url is not None:
+            html = self.pack.get(url)
+            if html is not None:
+                return html
         with open(file, "r", encoding="utf-8") as f:
             content = f.read()
 
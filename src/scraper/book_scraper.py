@@ -1,189 +1,153 @@
-import json
-from urllib.parse import unquote, urlparse
+from collections.abc import Iterable
+from concurrent.futures import Executor
+from functools import partial
 
-from bs4 import BeautifulSoup, PageElement
-from src.common.archives import JSON_DIR, LINKS_DIR
-from src.common.book_type import BookArchive, BookCategory
+from src.common.book_type import BookCategory
 from src.common.book_type import BookCollection, Category, QuestBook, Volume
+from src.common.links import EN, Locale
 from src.scraper.base import Scraper
-from src.util.file import dump_to_json
+from src.scraper.fetcher import Fetcher
+from src.scraper.link_scraper import load_book_links
+from src.scraper.rules import compiled_rules
+from src.util.database import ArchiveDatabase
+from src.util.file import dump_stream_to_json
 from src.util.logger import get_logger
+from src.util.manifest import Manifest
 from src.util.url import extract_slug
 
 
+def extract_collection(
+    link: str, html: str, locale: Locale = EN
+) -> tuple[str, BookCollection]:
+    """Extract every volume of a book collection page
+
+    :param link: book collection link
+    :param html: html of the page
+    :param locale: edition the page is from
+    :return: title, collection
+    """
+    page = compiled_rules(locale)[BookCategory.collection].apply(link, html)
+    title: str = extract_slug(link)
+    # TODO, load volume count from table?
+    volumes = [
+        Volume(description=item.description, text=item.text) for item in page.items
+    ]
+    location = page.infobox["region_location"]
+    return title, BookCollection(title=title, location=location, volumes=volumes)
+
+
+def extract_quest(link: str, html: str, locale: Locale = EN) -> tuple[str, QuestBook]:
+    """Extract the text of a quest book page
+
+    :param link: quest book link
+    :param html: html of the page
+    :param locale: edition the page is from
+    :raises ValueError: when the page has no Text section
+    :return: title, quest book
+    """
+    page = compiled_rules(locale)[BookCategory.quest].apply(link, html)
+    title = extract_slug(link)
+    location = page.infobox["region_location"]
+    return title, QuestBook(title=title, location=location, text=page.items[0].text)
+
+
 class BookScraper(Scraper):
     """Scrapes book links from `links/book.json `"""
 
-    def __init__(self):
+    category = Category.BOOK.value
+
+    def __init__(
+        self,
+        fetcher: Fetcher | None = None,
+        parse_workers: int | None = None,
+        database: ArchiveDatabase | None = None,
+        offline: bool = False,
+        retry_failed: bool = False,
+        only: Iterable[str] | None = None,
+        locale: Locale | None = None,
+        parse_pool: Executor | None = None,
+    ):
+        super().__init__(
+            fetcher,
+            parse_workers,
+            database,
+            offline,
+            retry_failed,
+            only,
+            locale,
+            parse_pool,
+        )
         self.logger = get_logger("BookScraper")
 
-    def _scrape_location(self, soup: BeautifulSoup) -> str:
-        """Scrape location info from a books wiki page
+    def _scrape_collection(self, links: list[str], manifest: Manifest) -> int:
+        """Scraping logic for books under the List of Book Collections table
 
-        :param soup: _description_
-        :return: _description_
+        :param links: _description_
+        :param manifest: results of unchanged pages are kept from here
+        :return: number of new or changed pages
         """
-        loc_container = soup.find(
-            "div",
-            class_="pi-item pi-data pi-item-spacing pi-border-color",
-            attrs={"data-source": "region_location"},
-        )
+        extract = partial(extract_collection, locale=self.locale)
+        return self.scrape_changed(links, manifest, extract)
 
-        if loc_container:
-            location = loc_container.find("div", class_="pi-data-value").get_text(
-                " ", strip=True
-            )
-        else:
-            location = ""
-        return location
-
-    def _scrape_collection(self, links: list[str]):
-        result = {}
-        for link in links:
-            html = self.get_page(link)
-            soup = BeautifulSoup(html, "html.parser")
-
-            title: str = extract_slug(link)
-
-            volumes: list[Volume] = []
-            # TODO, load volume count from table?
-            for h2 in soup.find_all("h2"):
-                # Get headline text (ignore edit links)
-                headline_span = h2.find("span", class_="mw-headline")
-                if not headline_span:
-                    continue
-                h2_text = headline_span.get_text(strip=True)
-
-                if "version" in h2_text.lower():
-                    # get all h3 after this before next h2
-                    # iterate through h3
-                    h3_list = []
-
-                    # walk siblings after this h2
-                    texts = []
-                    description = ""
-                    first_h3 = True
-                    for sib in h2.find_next_siblings():
-                        # stop when next <h2> appears
-                        if sib.name == "h2":
-                            break
-
-                        # collect immediate <h3> section headers
-                        if sib.name == "h3":
-                            if first_h3:
-                                first_h3 = False
-                            else:
-                                h3_list.append(sib)
-                                volume = Volume(
-                                    description=description, text="\n".join(texts)
-                                )
-                                volumes.append(volume)
-                                texts = []
-                                description = ""
-
-                        if sib.name == "div" and "description-wrapper" in sib.get(
-                            "class", []
-                        ):
-                            desc_el = sib.find("div", class_="description-content")
-                            if desc_el:
-                                description = desc_el.get_text(strip=True)
-                            else:
-                                self.logger.warning(
-                                    f"no description found for {link} {h2_text}"
-                                )
-
-                        if sib.name == "p":
-                            texts.append(sib.get_text(separator="\n", strip=True))
-
-                elif "vol" in h2_text.lower():
-                    texts = []
-                    description = ""
-                    for sib in h2.find_next_siblings():
-                        if sib.name == "h2":  # stop when it's not <p>/<div>
-                            break
-                        if sib.name == "div" and "description-wrapper" in sib.get(
-                            "class", []
-                        ):
-                            desc_el = sib.find("div", class_="description-content")
-                            if desc_el:
-                                description = desc_el.get_text(strip=True)
-                            else:
-                                self.logger.warning(
-                                    f"no description found for {link} {h2_text}"
-                                )
-
-                        if sib.name == "p":
-                            texts.append(sib.get_text(separator="\n", strip=True))
-
-                    volume = Volume(description=description, text="\n".join(texts))
-                    volumes.append(volume)
-                else:
-                    continue
-
-            book = BookCollection(
-                title=title, location=self._scrape_location(soup), volumes=volumes
-            )
-            result[title] = book
-        return result
-
-    def _scrape_quest(self, links: list[str]) -> dict[str, str]:
+    def _scrape_quest(self, links: list[str], manifest: Manifest) -> int:
         """Scraping logic for books under Other Books table (quest books)
 
         :param links: _description_
-        :raises ValueError: _description_
-        :return: _description_
+        :param manifest: results of unchanged pages are kept from here
+        :return: number of new or changed pages
         """
-        result = {}
-        for link in links:
-            html = self.get_page(link)
-            soup = BeautifulSoup(html, "html.parser")
-
-            title = extract_slug(link)
-            # Find the <span> with id="Text"
-            text_heading = soup.find("span", id="Text")
-            if not text_heading:
-                raise ValueError("Text section not found. Page may have changed")
-
-            # 2. Find the parent <h2> to locate the section start
-            text_h2 = text_heading.find_parent("h2")
-
-            # 3. Collect everything until the next <h2> (artifact piece)
-            texts = []
-            for sib in text_h2.find_next_siblings():
-                if sib.name == "h2":  # stop when it's not <p>
-                    break
-                if sib.name == "p":
-                    texts.append(sib.get_text(separator="\n", strip=True))
-
-            book = QuestBook(
-                title=title, location=self._scrape_location(soup), text="\n".join(texts)
-            )
-            result[title] = book
-        return result
+        extract = partial(extract_quest, locale=self.locale)
+        return self.scrape_changed(links, manifest, extract)
 
     def run(self):
         """Scrape!"""
-        with open(LINKS_DIR / f"{Category.BOOK.value}.json", "r") as f:
-            all_links = json.load(f)
-
+        all_links = load_book_links(self.paths.links_dir)
         book_categories = [item.name for item in BookCategory]
 
-        # TODO, make all links a dataclass?
-        if set(book_categories) != set(all_links):
-            self.logger.warning("Book links fields don't match!")
-
-        book_archive = BookArchive()
-        for category in book_categories:
-            links = all_links[category]
-            self.logger.info(f"Checking {len(links)} book links")
-            res = {}
-            if category == BookCategory.collection.value:
-                res = self._scrape_collection(links)
-                book_archive.book_collections = res
-            elif category == BookCategory.quest.value:
-                res = self._scrape_quest(links)
-                book_archive.quest_books = res
-
-        output_path = JSON_DIR / f"{Category.BOOK.value}.json"
-        self.logger.info(f"Extracted info from {book_archive.count()} links")
-        dump_to_json(book_archive, output_path)
+        manifests: dict[str, Manifest] = {}
+        changed = 0
+        try:
+            for category in book_categories:
+                links = all_links[category]
+                self.logger.info(f"Checking {len(links)} book links")
+                manifest = Manifest(
+                    f"{Category.BOOK.value}_{category}", self.paths.manifest_dir
+                )
+                manifests[category] = manifest
+                dropped = manifest.retain(links)
+                if dropped:
+                    self.logger.info(
+                        f"Dropped {len(dropped)} unlisted {category} links"
+                    )
+
+                if category == BookCategory.collection.value:
+                    changed += self._scrape_collection(links, manifest)
+                elif category == BookCategory.quest.value:
+                    changed += self._scrape_quest(links, manifest)
+                manifest.save()
+
+            output_path = self.paths.json_dir / f"{Category.BOOK.value}.json"
+            total = sum(len(manifest) for manifest in manifests.values())
+            self.logger.info(
+                f"Extracted info from {changed} changed links, {total} in archive"
+            )
+            # same layout as BookArchive, long text left as blob references
+            with self.metrics.timer("write", self.category):
+                dump_stream_to_json(
+                    [
+                        (
+                            "book_collections",
+                            manifests[BookCategory.collection.value].iter_results(
+                                False
+                            ),
+                        ),
+                        (
+                            "quest_books",
+                            manifests[BookCategory.quest.value].iter_results(False),
+                        ),
+                    ],
+                    output_path,
+                )
+        finally:
+            for manifest in manifests.values():
+                manifest.close()
@@ -0,0 +1,228 @@
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from itertools import islice
+
+import requests
+from requests.adapters import HTTPAdapter
+from src.scraper.policy import (
+    FAILURE_STATUSES,
+    RETRY_STATUSES,
+    THROTTLE_STATUSES,
+    FetchPolicy,
+    retry_after_seconds,
+)
+from src.util.http_cache import HttpCache
+from src.util.logger import get_logger
+from src.util.metrics import get_metrics
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_HOST_LIMIT = 4
+DEFAULT_TIMEOUT = 30
+
+# called with the url and the error of a fetch that failed for good
+FetchErrorHandler = Callable[[str, Exception], None]
+
+
+class Fetcher:
+    """Concurrent page fetcher backed by one keep-alive connection pool\n
+    Pages are fetched on a thread pool, at most `per_host_limit` requests
+    are in flight against the same host at any time\n
+    Responses go through an optional `HttpCache`, cached pages are revalidated
+    with a conditional GET\n
+    Requests are paced per host (or per scope, e.g. per language edition) by a
+    `FetchPolicy`, which adapts the rate to throttling and latency, retries
+    transient failures and pauses failing hosts
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+        timeout: float = DEFAULT_TIMEOUT,
+        cache: HttpCache | None = None,
+        policy: FetchPolicy | None = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.cache = cache
+        self.policy = policy if policy is not None else FetchPolicy()
+        self.logger = get_logger("Fetcher")
+        self.metrics = get_metrics()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._host_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        """Returns the semaphore guarding a url's host, or its policy scope
+
+        :param url: url about to be requested
+        :return: semaphore shared by every url of that host
+        """
+        host = self.policy.scope(url)
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def get(self, url: str, wait_open: bool = True, **kwargs) -> requests.Response:
+        """GET through the fetch policy, retrying connection errors, timeouts and
+        5xx/429 responses with jittered exponential backoff
+
+        :param url: _description_
+        :param wait_open: wait for a paused host to resume, else fail at once
+        :param kwargs: passed to `Session.get`, e.g. headers or params
+        :raises requests.RequestException: once retries are exhausted
+        :raises CircuitOpenError: when the host is paused and `wait_open` is False
+        :return: the last response, check its status
+        """
+        host = self.policy.host(self.policy.scope(url))
+        max_attempts = self.policy.config.max_attempts
+        for attempt in range(1, max_attempts + 1):
+            host.acquire(wait_open)
+            start = time.perf_counter()
+            try:
+                with self._host_slot(url):
+                    resp = self.session.get(url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                host.failure()
+                if attempt == max_attempts:
+                    raise
+                reason, delay = repr(e), self.policy.backoff(attempt)
+            else:
+                if resp.status_code not in RETRY_STATUSES:
+                    host.success(time.perf_counter() - start)
+                    return resp
+                retry_after = retry_after_seconds(resp.headers.get("Retry-After"))
+                if resp.status_code in THROTTLE_STATUSES:
+                    host.throttled(retry_after)
+                if resp.status_code in FAILURE_STATUSES:
+                    host.failure()
+                if attempt == max_attempts:
+                    return resp
+                reason = f"status {resp.status_code}"
+                delay = max(self.policy.backoff(attempt), retry_after or 0)
+
+            self.logger.info(f"{url}: {reason}, retry {attempt} in {delay:.1f}s")
+            self.metrics.count("retries", 1, self.metrics.category_of(url))
+            time.sleep(delay)
+
+    def fetch(self, url: str, wait_open: bool = True) -> str:
+        """GET a single url through the shared session
+
+        :param url: url to fetch
+        :param wait_open: see `get`
+        :return: html as a string
+        """
+        start = time.perf_counter()
+        entry = self.cache.lookup(url) if self.cache else None
+        if entry and self.cache.is_fresh(entry):
+            html = self.cache.read(entry)
+            self.metrics.record_fetch(url, time.perf_counter() - start, 0, True)
+            return html
+
+        headers = entry.conditional_headers() if entry else {}
+        resp = self.get(url, wait_open, headers=headers)
+
+        if resp.status_code == 304 and entry:
+            self.logger.debug(f"Not modified: {url}")
+            self.cache.touch(entry)
+            html = self.cache.read(entry)
+            self.metrics.record_fetch(url, time.perf_counter() - start, 0, True)
+            return html
+
+        resp.raise_for_status()
+        if self.cache:
+            self.cache.store(url, resp.text, resp.headers)
+        seconds = time.perf_counter() - start
+        self.metrics.record_fetch(url, seconds, len(resp.content), False)
+        return resp.text
+
+    def _run_jobs(
+        self,
+        jobs: Iterable[tuple[str, Callable[[], str]]],
+        on_error: FetchErrorHandler | None = None,
+    ) -> Iterator[tuple[str, str]]:
+        """Run fetch jobs on the thread pool\n
+        At most `2 * max_workers` pages are running or waiting to be consumed,
+        so a slow consumer doesn't pile every page up in memory
+
+        :param jobs: (url, job returning the url's html) pairs
+        :param on_error: called as `on_error(url, error)` for a failed job, which
+            is then skipped, by default the first failure is raised
+        :return: (url, html) pairs, in completion order
+        """
+        jobs = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {
+                pool.submit(job): url for url, job in islice(jobs, 2 * self.max_workers)
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = pending.pop(future)
+                    for next_url, next_job in islice(jobs, 1):
+                        pending[pool.submit(next_job)] = next_url
+                    try:
+                        html = future.result()
+                    except Exception as e:
+                        if on_error is None:
+                            raise
+                        on_error(url, e)
+                        continue
+                    yield url, html
+
+    def fetch_many(
+        self, urls: Iterable[str], on_error: FetchErrorHandler | None = None
+    ) -> Iterator[tuple[str, str]]:
+        """Fetch many urls concurrently
+
+        :param urls: urls to fetch, duplicates are fetched once
+        :param on_error: called as `on_error(url, error)` for urls that failed
+            after retries, by default the first failure is raised. With a
+            handler, urls of a paused host fail at once with `CircuitOpenError`
+            rather than waiting out its cooldown
+        :return: (url, html) pairs, in completion order
+        """
+        urls = list(dict.fromkeys(urls))
+        self.logger.debug(f"Fetching {len(urls)} pages")
+        fetch = partial(self.fetch, wait_open=on_error is None)
+        return self._run_jobs(((url, partial(fetch, url)) for url in urls), on_error)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_fetcher: Fetcher | None = None
+_default_lock = threading.Lock()
+
+
+def get_fetcher() -> Fetcher:
+    """Returns the process-wide fetcher, so all scrapers share one connection pool
+
+    :return: the shared `Fetcher`
+    """
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = Fetcher(cache=HttpCache())
+        return _default_fetcher
+
+
+def set_fetcher(fetcher: Fetcher) -> None:
+    """Replace the process-wide fetcher, e.g. with a `MediaWikiFetcher`, before
+    any scraper asks for it
+
+    :param fetcher: _description_
+    """
+    global _default_fetcher
+    with _default_lock:
+        _default_fetcher = fetcher
@@ -1,37 +1,187 @@
 import json
 import urllib.parse
 import pathlib
+from contextlib import AbstractContextManager
+
 from bs4 import BeautifulSoup, Tag
 from src.common.book_type import BookCategory, Category
-from src.common.archives import HTML_DIR, LINKS_DIR
+from src.common.archives import LINKS_DIR
 from src.scraper.base import Scraper
+from src.scraper.fetcher import Fetcher
+from src.scraper.sections import make_soup
+from src.scraper.soup_cache import SoupCache, get_soup_cache
 from src.util.logger import get_logger
-from src.common.links import BASE_LINK, BOOK_COL_ID, OTHER_BOOK_ID, links2html_mapping
+from src.util.quarantine import EXTRACT, Quarantine
+from src.common.links import Locale
 
 CURRENT_DIR = pathlib.Path(__file__).parent.resolve()
 PARENT_DIR = pathlib.Path(__file__).parent.parent.resolve()
 
 
+def load_links(
+    category: Category, links_dir: str | pathlib.Path = LINKS_DIR
+) -> list[str]:
+    """Every current link of a category, book links of every kind together
+
+    :param category: _description_
+    :param links_dir: `links/` of the edition
+    :return: _description_
+    """
+    path = pathlib.Path(links_dir) / f"{category.value}.json"
+    if not path.exists():
+        return []
+    with open(path, "r") as f:
+        links = json.load(f)
+    if isinstance(links, dict):
+        links = [link for kind in links.values() for link in kind]
+    return links
+
+
+def load_book_links(links_dir: str | pathlib.Path = LINKS_DIR) -> dict[str, list[str]]:
+    """Book links by kind, from `links/book.json`
+
+    :param links_dir: `links/` of the edition
+    :raises ValueError: when the kinds aren't those of `BookCategory`, an empty
+        list would drop every recorded book of the missing kind
+    :return: {kind: links}
+    """
+    with open(pathlib.Path(links_dir) / f"{Category.BOOK.value}.json", "r") as f:
+        links = json.load(f)
+    expected = {kind.value for kind in BookCategory}
+    if set(links) != expected:
+        raise ValueError(
+            f"Book links fields don't match! {sorted(links)} "
+            f"instead of {sorted(expected)}, scrape the book links again"
+        )
+    return links
+
+
 class LinkScraper(Scraper):
     """Scrapes item link from the main links in links.py for artifact, book, and weapons\n
     Saves the HTML if sent a page request, else loads from archive files\n
     Saves scraped item links to `links/`
     """
 
-    def __init__(self, load_from_file: bool = True) -> None:
+    category = "index"
+
+    def __init__(
+        self,
+        load_from_file: bool = True,
+        fetcher: Fetcher | None = None,
+        links_dir: str | pathlib.Path | None = None,
+        soups: SoupCache | None = None,
+        locale: Locale | None = None,
+    ) -> None:
+        """Index pages are only loaded (or fetched) once a `scrape_*_links` needs them
+
+        :param load_from_file: else index pages are fetched again, once
+        :param fetcher: _description_
+        :param links_dir: defaults to the `links/` of the edition
+        :param soups: parsed index pages, defaults to the shared cache
+        :param locale: edition to scrape, defaults to the English one
+        """
+        super().__init__(fetcher, locale=locale)
         self.load_from_file = load_from_file
+        self.links_dir = pathlib.Path(
+            links_dir if links_dir is not None else self.paths.links_dir
+        )
+        self.index_links = self.locale.index_links
         self.logger = get_logger()
+        self.soups = soups if soups is not None else get_soup_cache()
+        # index pages fetched by this scraper, read back from the pack after that
+        self.fetched: set[str] = set()
+
+    def _index_file(self, name: str) -> pathlib.Path:
+        return self.paths.html_dir / f"{name}.html"
 
-        self.name2html: dict[str, str] = {}
-        # load from url and save to file
-        if not self.load_from_file:
-            for name, link in links2html_mapping.items():
-                html = self.dump_page_to_file(link, HTML_DIR / f"{name}.html")
-                self.name2html[name] = html
-        else:  # TODO, check if file exists/empty, if it is, go visit page
-            for name in links2html_mapping:
-                html = self.load_html_from_file(HTML_DIR / f"{name}.html")
-                self.name2html[name] = html
+    def _soup_key(self, name: str) -> str:
+        # editions share the soup cache
+        return f"index:{self.locale.code}:{name}"
+
+    def _saved(self, name: str) -> bool:
+        file = self._index_file(name)
+        return self.index_links[name] in self.pack or (
+            file.exists() and file.stat().st_size > 0
+        )
+
+    def load_index(self, name: str) -> str:
+        """Html of an index page, from the pack or `html/`, fetched if need be
+
+        :param name: e.g. "artifact"
+        :return: _description_
+        """
+        link = self.index_links[name]
+        file = self._index_file(name)
+        if name in self.fetched or (self.load_from_file and self._saved(name)):
+            return self.load_html_from_file(file, link)
+        if self.load_from_file:
+            self.logger.info(f"{file.name} missing or empty, visiting {link}")
+        html = self.dump_page_to_file(link, file)
+        self.fetched.add(name)
+        self.soups.discard(self._soup_key(name))
+        return html
+
+    def load_indexes(self) -> None:
+        """Make every index page available locally, fetching the ones that need
+        it concurrently, without parsing them
+        """
+        link2name = {
+            link: name
+            for name, link in self.index_links.items()
+            if name not in self.fetched
+            and not (self.load_from_file and self._saved(name))
+        }
+        for link, html in self.get_pages(link2name):
+            name = link2name[link]
+            with open(self._index_file(name), "w", encoding="utf-8") as f:
+                f.write(html)
+            self.fetched.add(name)
+            self.soups.discard(self._soup_key(name))
+
+    def index_soup(self, name: str) -> AbstractContextManager[BeautifulSoup]:
+        """Parsed index page, through the soup cache
+
+        :param name: e.g. "artifact"
+        :return: context manager giving the soup, don't keep its tags past it
+        """
+        return self.soups.borrow(
+            self._soup_key(name),
+            lambda: self.load_index(name),
+            lambda html: make_soup(html, body_only=False),
+        )
+
+    def _check_heading(self, table: Tag, span_id: str, expected: str) -> None:
+        """Make sure a table is the one under the expected section
+
+        :param table: _description_
+        :param span_id: id of the section heading's span
+        :param expected: heading text, compared case insensitively
+        :raises ValueError: when the heading is missing or different
+        """
+        heading = table.find_previous("span", id=span_id)
+        header_text = heading.get_text(strip=True).lower() if heading else None
+        if header_text != expected.lower():
+            raise ValueError(
+                f"Expected the table under {expected!r}, found {header_text!r}. "
+                "Page may have changed"
+            )
+
+    def _quarantine_index(
+        self, quarantine: Quarantine, name: str, error: Exception
+    ) -> None:
+        """Keep the index page that broke link scraping, for a look at it later
+
+        :param quarantine: _description_
+        :param name: e.g. "book"
+        :param error: _description_
+        """
+        link = self.index_links[name]
+        quarantine.add(link, error, self.load_index(name), stage=EXTRACT)
+        quarantine.save()
+        self.logger.error(
+            f"Couldn't scrape {name} links: {error}, page saved to "
+            f"{quarantine.html_dir}"
+        )
 
     def select_nth_cells_from_table(self, table: Tag, index: int) -> list[str]:
         """Extract links from nth cell given a table
@@ -45,7 +195,7 @@ class LinkScraper(Scraper):
         for row in rows:
             cells = row.select("td")
             link = cells[index].find("a")["href"]
-            links.append(urllib.parse.urljoin(BASE_LINK, link))
+            links.append(urllib.parse.urljoin(self.locale.host, link))
         return links
 
     def scrape_artifact_links(self) -> list[str]:
@@ -54,23 +204,24 @@ class LinkScraper(Scraper):
         :param html: _description_
         """
         self.logger.info("Scraping artifact links")
-        html = self.name2html[Category.ARTIFACT.value]
-        soup = BeautifulSoup(html, "html.parser")
+        with self.index_soup(Category.ARTIFACT.value) as soup:
 
-        # Findthe table with css selector "wikitable"
-        tables = soup.select(".wikitable")
+            # Findthe table with css selector "wikitable"
+            tables = soup.select(".wikitable")
 
-        # expect one table
-        if len(tables) != 1:
-            self.logger.warning("The page may have changed.")
+            # expect one table
+            if len(tables) != 1:
+                self.logger.warning("The page may have changed.")
 
-        links = []
-        table = tables[0]
-        links = self.select_nth_cells_from_table(table=table, index=0)
+            links = []
+            table = tables[0]
+            links = self.select_nth_cells_from_table(table=table, index=0)
 
-        self.logger.info(f"{len(links)} artifact links scraped.")
+            self.logger.info(f"{len(links)} artifact links scraped.")
+        # every link is out of the page, no need to keep its tree around
+        self.soups.discard(self._soup_key(Category.ARTIFACT.value))
 
-        with open(LINKS_DIR / f"{Category.ARTIFACT.value}.json", "w") as f:
+        with open(self.links_dir / f"{Category.ARTIFACT.value}.json", "w") as f:
             json.dump(links, f, indent=4, sort_keys=True)
 
         return links
@@ -81,23 +232,22 @@ class LinkScraper(Scraper):
         :return: a list of links
         """
         self.logger.info("Scraping weapon links")
-        html = self.name2html[Category.WEAPON.value]
+        with self.index_soup(Category.WEAPON.value) as soup:
+            tables = soup.select(".article-table")
 
-        soup = BeautifulSoup(html, "html.parser")
-        tables = soup.select(".article-table")
+            # expect at least one table
+            if len(tables) < 1:
+                self.logger.warning("The page may have changed.")
 
-        # expect at least one table
-        if len(tables) < 1:
-            self.logger.warning("The page may have changed.")
-
-        links = []
-        table = tables[0]
-        # TODO  verify with heading?
-        links = self.select_nth_cells_from_table(table=table, index=1)
+            links = []
+            table = tables[0]
+            # TODO  verify with heading?
+            links = self.select_nth_cells_from_table(table=table, index=1)
 
-        self.logger.info(f"{len(links)} weapon links scraped.")
+            self.logger.info(f"{len(links)} weapon links scraped.")
+        self.soups.discard(self._soup_key(Category.WEAPON.value))
 
-        with open(LINKS_DIR / f"{Category.WEAPON.value}.json", "w") as f:
+        with open(self.links_dir / f"{Category.WEAPON.value}.json", "w") as f:
             json.dump(links, f, indent=4, sort_keys=True)
 
         return links
@@ -105,58 +255,76 @@ class LinkScraper(Scraper):
     def scrape_book_links(self) -> list[str]:
         """Scrape individual weapon links from html
 
+        :raises ValueError: when the page changed, it is quarantined
         :return: a list of links
         """
         self.logger.info("Scraping book links")
-        html = self.name2html[Category.BOOK.value]
+        quarantine = Quarantine(self.category, self.paths.quarantine_dir)
+        try:
+            links = self._scrape_book_tables()
+        except ValueError as e:
+            self._quarantine_index(quarantine, Category.BOOK.value, e)
+            raise
+        finally:
+            self.soups.discard(self._soup_key(Category.BOOK.value))
+        if quarantine.remove(self.index_links[Category.BOOK.value]):
+            quarantine.save()
+
+        with open(self.links_dir / f"{Category.BOOK.value}.json", "w") as f:
+            json.dump(links, f, indent=4, sort_keys=True)
 
-        soup = BeautifulSoup(html, "html.parser")
+        return links
 
-        # There are two tables. List of books + Other books
-        tables = soup.select(".article-table")
+    def _scrape_book_tables(self) -> dict[str, list[str]]:
+        """
+        :raises ValueError: when the tables aren't where they used to be
+        :return: links of every book category
+        """
+        with self.index_soup(Category.BOOK.value) as soup:
 
-        # expect 2 tables
-        if len(tables) <= 2:
-            self.logger.warning("The page may have changed.")
+            # There are two tables. List of books + Other books
+            tables = soup.select(".article-table")
 
-        links = {}
+            # expect 2 tables
+            if len(tables) < 2:
+                raise ValueError(
+                    f"Expected 2 book tables, found {len(tables)}. "
+                    "Page may have changed"
+                )
 
-        # first table
-        main_table = tables[0]
+            links = {}
 
-        # TODO make it a constant
+            # first table
+            main_table = tables[0]
 
-        heading = main_table.find_previous("span", id=BOOK_COL_ID)
-        header_text = heading.get_text(strip=True).lower()
-        assert header_text == "List of Book Collections".lower()
+            # TODO make it a constant
 
-        # TODO enum or soemthing
-        links[BookCategory.collection.value] = self.select_nth_cells_from_table(
-            table=main_table, index=1
-        )
+            self._check_heading(
+                main_table, self.locale.book_col_id, self.locale.book_col_title
+            )
 
-        self.logger.info(
-            f"{len(links[BookCategory.quest.value])} main book links scraped."
-        )
+            # TODO enum or soemthing
+            links[BookCategory.collection.value] = self.select_nth_cells_from_table(
+                table=main_table, index=1
+            )
 
-        # 2nd table
-        quest_table = tables[1]
+            self.logger.info(
+                f"{len(links[BookCategory.collection.value])} main book links scraped."
+            )
 
-        heading = quest_table.find_previous("span", id=OTHER_BOOK_ID)
-        header_text = heading.get_text(strip=True).lower()
-        assert (
-            header_text == "Other Books".lower()
-        ), f"{header_text} didn't match other books"
+            # 2nd table
+            quest_table = tables[1]
 
-        links[BookCategory.quest.value] = self.select_nth_cells_from_table(
-            table=quest_table, index=1
-        )
+            self._check_heading(
+                quest_table, self.locale.other_book_id, self.locale.other_book_title
+            )
 
-        self.logger.info(
-            f"{len(links[BookCategory.quest.value])} quest book links scraped."
-        )
+            links[BookCategory.quest.value] = self.select_nth_cells_from_table(
+                table=quest_table, index=1
+            )
 
-        with open(LINKS_DIR / f"{Category.BOOK.value}.json", "w") as f:
-            json.dump(links, f, indent=4, sort_keys=True)
+            self.logger.info(
+                f"{len(links[BookCategory.quest.value])} quest book links scraped."
+            )
 
         return links
@@ -0,0 +1,148 @@
+import json
+from collections.abc import Iterable, Iterator
+from dataclasses import replace
+from pathlib import Path
+
+from src.common.archives import ALIGNED_DIR, data_paths
+from src.common.book_type import Category
+from src.common.links import Locale
+from src.scraper.fetcher import Fetcher, get_fetcher
+from src.scraper.link_scraper import load_links
+from src.scraper.mediawiki import langlinks
+from src.scraper.policy import FetchPolicy
+from src.util.archive import ARCHIVE_PARTS
+from src.util.file import dump_stream_to_json, dump_to_json
+from src.util.logger import get_logger
+from src.util.manifest import Manifest
+from src.util.url import link_title
+
+# item links of an edition by the link of the same item on the reference edition
+ALIGNED_LINKS = "aligned.json"
+
+logger = get_logger("Locales")
+
+
+def limit_locales(policy: FetchPolicy, locales: Iterable[Locale]) -> None:
+    """Rate limit every edition on its own, within the limit of the host they
+    usually share, so a host slowing down one edition slows down all of them
+
+    :param policy: policy of the shared fetcher
+    :param locales: _description_
+    """
+    for locale in locales:
+        config = policy.config
+        if locale.max_rate is not None:
+            config = replace(
+                config,
+                max_rate=locale.max_rate,
+                initial_rate=min(config.initial_rate, locale.max_rate),
+            )
+        policy.add_scope(locale.root, config)
+
+
+def align_links(
+    source: Locale, target: Locale, fetcher: Fetcher | None = None
+) -> dict[str, str]:
+    """Match the items of two editions through the interlanguage links of the
+    `source` pages, only items listed by both editions are matched\n
+    Saved to `links/aligned.json` of the `target` edition
+
+    :param source: reference edition, usually the English one
+    :param target: _description_
+    :param fetcher: defaults to the shared one
+    :return: {source link: target link}
+    """
+    fetcher = fetcher if fetcher is not None else get_fetcher()
+    source_dir = data_paths(source.code).links_dir
+    target_dir = data_paths(target.code).links_dir
+    aligned: dict[str, str] = {}
+    for category in Category:
+        listed = {link_title(link): link for link in load_links(category, target_dir)}
+        titles = {link_title(link): link for link in load_links(category, source_dir)}
+        translated = langlinks(fetcher, source.api_link, list(titles), target.code)
+        matched = {
+            titles[title]: listed[other]
+            for title, other in translated.items()
+            if other in listed
+        }
+        logger.info(
+            f"{len(matched)} of {len(titles)} {category.value} links aligned "
+            f"between {source.code} and {target.code}"
+        )
+        aligned.update(matched)
+    dump_to_json(aligned, target_dir / ALIGNED_LINKS)
+    return aligned
+
+
+def load_aligned(locale: Locale) -> dict[str, str]:
+    """
+    :param locale: _description_
+    :return: what `align_links` last saved for the edition, empty if it never ran
+    """
+    path = data_paths(locale.code).links_dir / ALIGNED_LINKS
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_aligned(
+    name: str, locales: list[Locale]
+) -> Iterator[tuple[str, dict[str, object]]]:
+    """Records of an archive part in every edition, one item at a time
+
+    :param name: one of `ARCHIVE_PARTS`, e.g. "weapon"
+    :param locales: editions, the first one is the reference
+    :return: (key on the reference edition, {locale code: record}) pairs sorted
+        by key, editions without the item are left out of its records
+    """
+    source = locales[0]
+    roots = {locale.code: data_paths(locale.code).manifest_dir for locale in locales}
+    # editions that never scraped the part are left out
+    locales = [
+        locale for locale in locales if (roots[locale.code] / f"{name}.jsonl").exists()
+    ]
+    if not locales or locales[0] is not source:
+        return
+    source, *others = locales
+    manifests = {
+        locale.code: Manifest(name, roots[locale.code], readonly=True)
+        for locale in locales
+    }
+    try:
+        aligned = {locale.code: load_aligned(locale) for locale in others}
+        reference = manifests[source.code]
+        entries = sorted(reference.entries.items(), key=lambda item: item[1]["key"])
+        for link, entry in entries:
+            records = {source.code: reference.result(link)}
+            for locale in others:
+                manifest = manifests[locale.code]
+                other = aligned[locale.code].get(link)
+                if other is not None and other in manifest.entries:
+                    records[locale.code] = manifest.result(other)
+            yield entry["key"], records
+    finally:
+        for manifest in manifests.values():
+            manifest.close()
+
+
+def write_aligned(
+    locales: list[Locale], output_dir: str | Path = ALIGNED_DIR
+) -> list[Path]:
+    """Write every archive part with the records of every edition side by side,
+    `archive/aligned/<part>.json`
+
+    :param locales: editions, the first one is the reference
+    :param output_dir: _description_
+    :return: written files
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name in ARCHIVE_PARTS:
+        path = output_dir / f"{name}.json"
+        dump_stream_to_json(iter_aligned(name, locales), path)
+        paths.append(path)
+    codes = ", ".join(locale.code for locale in locales)
+    logger.info(f"Aligned archive of {codes} written to {output_dir}")
+    return paths
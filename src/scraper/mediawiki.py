@@ -0,0 +1,270 @@
+import time
+from collections.abc import Callable, Iterable, Iterator
+from functools import partial
+
+from src.common.links import API_LINK
+from src.scraper.fetcher import Fetcher, FetchErrorHandler
+from src.util.url import link_title
+
+# api.php accepts up to 50 titles per query for regular clients
+TITLES_PER_QUERY = 50
+
+
+def call_api(
+    fetcher: Fetcher, api_url: str, params: dict[str, str], wait_open: bool = True
+) -> dict:
+    """GET api.php with json output, through a fetcher's session and fetch policy
+
+    :param fetcher: _description_
+    :param api_url: _description_
+    :param params: api parameters
+    :param wait_open: see `Fetcher.get`
+    :raises ValueError: when the api answers with an error
+    :return: decoded response
+    """
+    params = {"format": "json", "formatversion": "2", **params}
+    resp = fetcher.get(api_url, wait_open, params=params)
+    resp.raise_for_status()
+    data = resp.json()
+    if "error" in data:
+        raise ValueError(f"api.php error: {data['error'].get('info', data)}")
+    return data
+
+
+def langlinks(
+    fetcher: Fetcher,
+    api_url: str,
+    titles: list[str],
+    lang: str,
+    batch_size: int = TITLES_PER_QUERY,
+) -> dict[str, str]:
+    """Titles of the same pages on another language edition, from their
+    interlanguage links, `batch_size` titles per request
+
+    :param fetcher: _description_
+    :param api_url: api.php of the edition the titles are from
+    :param titles: page titles, as returned by `link_title`
+    :param lang: language code of the other edition, e.g. "fr"
+    :return: {title: title on the other edition}, pages without one are left out
+    """
+    translated: dict[str, str] = {}
+    for start in range(0, len(titles), batch_size):
+        batch = titles[start : start + batch_size]
+        params = {
+            "action": "query",
+            "prop": "langlinks",
+            "lllang": lang,
+            "lllimit": "max",
+            "titles": "|".join(batch),
+        }
+        while True:
+            data = call_api(fetcher, api_url, params)
+            query = data.get("query", {})
+            # title the wiki answers with -> requested title
+            requested = {title: title for title in batch}
+            for mapping in query.get("normalized", []):
+                requested[mapping["to"]] = mapping["from"]
+            for page in query.get("pages", []):
+                for link in page.get("langlinks", []):
+                    title = requested.get(page["title"], page["title"])
+                    translated[title] = link["title"]
+            if "continue" not in data:
+                break
+            params = {**params, **data["continue"]}
+    return translated
+
+
+class MediaWikiFetcher(Fetcher):
+    """Fetches article content through the MediaWiki api.php instead of skinned pages\n
+    Latest revision ids are resolved for up to `batch_size` titles per `action=query`
+    request, then each revision is rendered with `action=parse`. The parsed html is
+    the bare `mw-parser-output` article body, so the existing extractors consume it
+    unchanged. A revision never changes, so a cached revision is served without
+    touching the network\n
+    Titles missing from the wiki fail on their own, like a page answering 404
+    """
+
+    def __init__(
+        self,
+        api_url: str | None = None,
+        batch_size: int = TITLES_PER_QUERY,
+        **kwargs,
+    ) -> None:
+        """
+        :param api_url: defaults to the api.php of the wiki each url belongs to,
+            e.g. of its language edition
+        :param batch_size: titles per `action=query` request
+        """
+        super().__init__(**kwargs)
+        self.api_url = api_url
+        self.batch_size = batch_size
+
+    def api_url_of(self, url: str) -> str:
+        """
+        :param url: article url
+        :return: api.php answering for the article
+        """
+        if self.api_url is not None:
+            return self.api_url
+        return wiki_api_link(url)
+
+    def latest_revisions(
+        self, titles: list[str], api_url: str | None = None
+    ) -> dict[str, int]:
+        """Resolve the latest revision id of many titles, `batch_size` titles per
+        request, redirects are followed
+
+        :param titles: page titles, as returned by `link_title`
+        :param api_url: defaults to `api_url`, or the English wiki's
+        :return: {title: revision id}, keyed by the titles passed in, titles
+            missing from the wiki are left out
+        """
+        api_url = api_url or self.api_url or API_LINK
+        revisions: dict[str, int] = {}
+        for start in range(0, len(titles), self.batch_size):
+            batch = titles[start : start + self.batch_size]
+            revisions.update(self._batch_revisions(api_url, batch))
+        return revisions
+
+    def _batch_revisions(
+        self, api_url: str, batch: list[str], wait_open: bool = True
+    ) -> dict[str, int]:
+        params = {
+            "action": "query",
+            "prop": "revisions",
+            "rvprop": "ids",
+            "redirects": "1",
+            "titles": "|".join(batch),
+        }
+        revisions: dict[str, int] = {}
+        # requested title -> title the wiki answers with
+        aliases = {title: title for title in batch}
+        while True:
+            data = call_api(self, api_url, params, wait_open)
+            query = data.get("query", {})
+            for mapping in query.get("normalized", []) + query.get("redirects", []):
+                for title, target in aliases.items():
+                    if target == mapping["from"]:
+                        aliases[title] = mapping["to"]
+
+            pages = {page["title"]: page for page in query.get("pages", [])}
+            for title, target in aliases.items():
+                page = pages.get(target)
+                if page is None or page.get("missing") or page.get("invalid"):
+                    continue
+                if page.get("revisions"):
+                    revisions[title] = page["revisions"][0]["revid"]
+
+            if "continue" not in data:
+                break
+            params = {**params, **data["continue"]}
+        return revisions
+
+    def _parse_key(self, api_url: str, revid: int) -> str:
+        return f"{api_url}?action=parse&oldid={revid}"
+
+    def parse_revision(self, revid: int, api_url: str | None = None) -> str:
+        """Rendered article body of a revision
+
+        :param revid: revision id
+        :param api_url: defaults to `api_url`, or the English wiki's
+        :return: html as a string
+        """
+        return self._parse_revision(api_url or self.api_url or API_LINK, revid)[0]
+
+    def _parse_revision(
+        self, api_url: str, revid: int, wait_open: bool = True
+    ) -> tuple[str, bool]:
+        key = self._parse_key(api_url, revid)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached, True
+
+        data = call_api(
+            self,
+            api_url,
+            {
+                "action": "parse",
+                "oldid": str(revid),
+                "prop": "text",
+                "disableeditsection": "1",
+                "disablelimitreport": "1",
+            },
+            wait_open,
+        )
+        html = data["parse"]["text"]
+        if self.cache:
+            self.cache.store(key, html)
+        return html, False
+
+    def _fetch_page(self, url: str, revid: int | None, wait_open: bool = True) -> str:
+        if revid is None:
+            raise ValueError(f"No revision of {url} on the wiki")
+        start = time.perf_counter()
+        html, cache_hit = self._parse_revision(self.api_url_of(url), revid, wait_open)
+        nbytes = 0 if cache_hit else len(html.encode("utf-8"))
+        self.metrics.record_fetch(url, time.perf_counter() - start, nbytes, cache_hit)
+        return html
+
+    def fetch(self, url: str, wait_open: bool = True) -> str:
+        """Article body of a wiki url through api.php
+
+        :param url: article url
+        :param wait_open: see `Fetcher.get`
+        :raises ValueError: when the page doesn't exist on the wiki
+        :return: html as a string
+        """
+        title = link_title(url)
+        revisions = self._batch_revisions(self.api_url_of(url), [title], wait_open)
+        return self._fetch_page(url, revisions.get(title), wait_open)
+
+    def fetch_many(
+        self, urls: Iterable[str], on_error: FetchErrorHandler | None = None
+    ) -> Iterator[tuple[str, str]]:
+        """Article bodies of many wiki urls, revisions resolved in batches\n
+        A missing page, or a batch whose revisions couldn't be resolved, fails
+        its urls only
+
+        :param urls: article urls, duplicates are fetched once
+        :param on_error: see `Fetcher.fetch_many`
+        :return: (url, html) pairs, in completion order
+        """
+        urls = list(dict.fromkeys(urls))
+        wait_open = on_error is None
+        by_api: dict[str, list[str]] = {}
+        for url in urls:
+            by_api.setdefault(self.api_url_of(url), []).append(url)
+
+        jobs: dict[str, Callable[[], str]] = {}
+        for api_url, api_urls in by_api.items():
+            for start in range(0, len(api_urls), self.batch_size):
+                batch = api_urls[start : start + self.batch_size]
+                titles = [link_title(url) for url in batch]
+                try:
+                    revisions = self._batch_revisions(api_url, titles, wait_open)
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    for url in batch:
+                        jobs[url] = partial(_raise, e)
+                    continue
+                for url, title in zip(batch, titles):
+                    jobs[url] = partial(
+                        self._fetch_page, url, revisions.get(title), wait_open
+                    )
+        self.logger.debug(f"Resolved revisions for {len(urls)} pages")
+
+        return self._run_jobs(((url, jobs[url]) for url in urls), on_error)
+
+
+def wiki_api_link(url: str) -> str:
+    """
+    :param url: article url, e.g. https://genshin-impact.fandom.com/fr/wiki/Amber
+    :return: api.php of its wiki, e.g. https://genshin-impact.fandom.com/fr/api.php
+    """
+    return url.split("/wiki/", 1)[0] + "/api.php"
+
+
+def _raise(error: Exception) -> str:
+    raise error
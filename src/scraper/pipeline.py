@@ -0,0 +1,232 @@
+import multiprocessing
+import os
+import queue
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    BrokenExecutor,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from contextlib import nullcontext
+from functools import partial
+from typing import TypeVar
+
+from src.util.logger import get_logger
+from src.util.metrics import OTHER, get_metrics, timed_call
+
+R = TypeVar("R")
+
+# raw html extractor, must be a module level function so it can be sent to a worker
+Extractor = Callable[[str, str], R]
+# called with the link, html and error of a page the extractor failed on
+ExtractErrorHandler = Callable[[str, str, Exception], None]
+
+_DONE = object()
+# seconds between two looks at the stop event, while the queue is full
+_PUT_TIMEOUT = 0.1
+
+
+class _FetchError:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def _close(pages: Iterable) -> None:
+    # stops a generator such as `Fetcher.fetch_many`, and its fetches with it
+    close = getattr(pages, "close", None)
+    if close is not None:
+        close()
+
+
+def make_parse_pool(workers: int | None = None) -> ProcessPoolExecutor:
+    """Process pool to parse pages on, at most one process per core\n
+    Its processes are started by a fork server (spawned where there is none),
+    forking a process already running fetch threads can deadlock the child
+
+    :param workers: defaults to one per core
+    :return: _description_
+    """
+    cores = os.cpu_count() or 1
+    workers = cores if workers is None else max(min(workers, cores), 1)
+    method = (
+        "forkserver"
+        if "forkserver" in multiprocessing.get_all_start_methods()
+        else "spawn"
+    )
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context(method)
+    )
+
+
+class ParsePipeline:
+    """Runs extraction in a process pool while pages are still being fetched\n
+    The fetch stage runs on its own thread and hands raw html to the parse stage
+    through a bounded queue, only (link, html) goes to the workers and only the
+    extracted result comes back\n
+    Pipelines running at the same time should share one pool, see `make_parse_pool`
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        queue_size: int = 32,
+        pool: Executor | None = None,
+    ) -> None:
+        """
+        :param workers: parse processes, defaults to one per core, 0 parses inline
+        :param queue_size: fetched pages waiting to be parsed
+        :param pool: shared pool to parse on, with `workers` processes, it is left
+            running. By default the pipeline starts its own for every run
+        """
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.queue_size = queue_size
+        self.pool = pool
+        self.logger = get_logger("ParsePipeline")
+        self.metrics = get_metrics()
+
+    def _put(self, fetched: queue.Queue, item, stop: threading.Event) -> bool:
+        while not stop.is_set():
+            try:
+                fetched.put(item, timeout=_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(
+        self,
+        pages: Iterable[tuple[str, str]],
+        fetched: queue.Queue,
+        stop: threading.Event,
+    ) -> None:
+        # the pages are iterated, and so closed, on this thread only
+        pages = iter(pages)
+        try:
+            for page in pages:
+                if not self._put(fetched, page, stop):
+                    break
+        except BaseException as e:
+            self._put(fetched, _FetchError(e), stop)
+        finally:
+            _close(pages)
+            self._put(fetched, _DONE, stop)
+
+    def _record(self, category: str, timings: tuple[object, dict[str, float]]):
+        result, stages = timings
+        parse = stages.get("parse", 0)
+        self.metrics.observe("parse", parse, category)
+        self.metrics.observe("extract", stages["total"] - parse, category)
+        return result
+
+    def _result(
+        self,
+        link: str,
+        html: str,
+        call: Callable[[], tuple[object, dict[str, float]]],
+        category: str,
+        on_error: ExtractErrorHandler | None,
+    ) -> tuple[bool, object]:
+        try:
+            return True, self._record(category, call())
+        except BrokenExecutor:
+            # a dead worker process, not a problem with the page
+            raise
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(link, html, e)
+            return False, None
+
+    def run(
+        self,
+        pages: Iterable[tuple[str, str]],
+        extract: Extractor,
+        category: str = OTHER,
+        on_error: ExtractErrorHandler | None = None,
+    ) -> Iterator[tuple[str, R]]:
+        """Extract every fetched page
+
+        :param pages: (link, html) pairs, usually `Scraper.get_pages`
+        :param extract: called as `extract(link, html)` in a worker process
+        :param category: parse and extract times are recorded under this category
+        :param on_error: called as `on_error(link, html, error)` for pages the
+            extractor failed on, which are then skipped, by default the first
+            failure is raised
+        :return: (link, result) pairs, in completion order. Fetching stops
+            when the pipeline stops early, on an error or when the caller
+            closes the iterator
+        """
+        if self.workers == 0:
+            pages = iter(pages)
+            try:
+                for link, html in pages:
+                    ok, result = self._result(
+                        link,
+                        html,
+                        partial(timed_call, extract, link, html),
+                        category,
+                        on_error,
+                    )
+                    if ok:
+                        yield link, result
+            finally:
+                _close(pages)
+            return
+
+        fetched: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce, args=(pages, fetched, stop), daemon=True
+        )
+        producer.start()
+
+        if self.pool is not None:
+            pool_context = nullcontext(self.pool)
+        else:
+            pool_context = make_parse_pool(self.workers)
+        with pool_context as pool:
+            # the html is kept until the page is extracted, for `on_error`
+            pending: dict[Future, tuple[str, str]] = {}
+
+            def finished(done: set[Future]) -> Iterator[tuple[str, R]]:
+                for future in done:
+                    link, html = pending.pop(future)
+                    ok, result = self._result(
+                        link, html, future.result, category, on_error
+                    )
+                    if ok:
+                        yield link, result
+
+            try:
+                while True:
+                    item = fetched.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, _FetchError):
+                        raise item.error
+
+                    link, html = item
+                    pending[pool.submit(timed_call, extract, link, html)] = item
+                    # keep the workers fed, without piling raw html up in the pool
+                    if len(pending) >= self.workers * 2:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from finished(done)
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from finished(done)
+            finally:
+                # stopped early: a producer blocked on the full queue sees the
+                # event, stops fetching and closes the pages
+                stop.set()
+                for future in pending:
+                    future.cancel()
+                while True:
+                    try:
+                        fetched.get_nowait()
+                    except queue.Empty:
+                        break
@@ -0,0 +1,295 @@
+import random
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from src.util.logger import get_logger
+
+# responses worth retrying a GET for
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# responses telling us to slow down
+THROTTLE_STATUSES = frozenset({429, 503})
+# responses of a failing host, counted by its circuit breaker, a host answering
+# 503 all along is down rather than busy
+FAILURE_STATUSES = frozenset({500, 502, 503, 504})
+
+
+# takes a request slot of a host from a limit shared with other processes, e.g.
+# `WorkQueue.reserve`, returns the seconds to wait before using it
+SharedLimiter = Callable[[str], float]
+
+
+class CircuitOpenError(Exception):
+    """A host failed too many times in a row and is paused"""
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    """Parse a `Retry-After` header, either seconds or a HTTP date
+
+    :param value: header value
+    :return: seconds to wait, None when missing or malformed
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token, possibly ahead of time
+
+        :return: seconds to wait before using it
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+@dataclass
+class PolicyConfig:
+    # requests per second per host, adapted between min_rate and max_rate
+    initial_rate: float = 4
+    min_rate: float = 0.2
+    max_rate: float = 50
+    burst: float = 4
+    # additive increase per fast success, multiplicative decrease on throttling
+    increase: float = 0.25
+    decrease: float = 0.5
+    # requests already in flight when the rate drops are answered the same way,
+    # the rate only drops once per interval
+    decrease_interval: float = 1.0
+    # latency above this many times the host's running average counts as slow
+    slow_factor: float = 2.0
+    slow_decrease: float = 0.9
+    # retries of a GET, with full jitter exponential backoff
+    max_attempts: int = 5
+    backoff_base: float = 0.5
+    backoff_cap: float = 30
+    # consecutive failures before a host is paused, and for how long
+    failure_threshold: int = 5
+    cooldown: float = 60
+
+
+class HostPolicy:
+    """Rate, latency estimate and circuit breaker of one host\n
+    The rate grows additively while responses come back fast, and shrinks
+    multiplicatively on 429/503 and on responses much slower than usual\n
+    A scope of a host, e.g. one language edition, also goes through the policy
+    of the whole host, which gets the same feedback, so throttling on one scope
+    slows down the others
+    """
+
+    def __init__(
+        self,
+        host: str,
+        config: PolicyConfig,
+        shared: SharedLimiter | None = None,
+        outer: "HostPolicy | None" = None,
+    ) -> None:
+        """
+        :param host: host or scope
+        :param config: _description_
+        :param shared: see `FetchPolicy`
+        :param outer: policy of the host a scope is part of
+        """
+        self.host = host
+        self.config = config
+        self.bucket = TokenBucket(config.initial_rate, config.burst)
+        self.shared = shared
+        self.outer = outer
+        self.latency: float | None = None  # running average, seconds
+        self.failures = 0
+        self.paused_until = 0.0
+        # the circuit is open until then, after too many failures in a row
+        self.open_until = 0.0
+        self.decreased_at = 0.0
+        self._lock = threading.Lock()
+        self.logger = get_logger("FetchPolicy")
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def _set_rate(self, rate: float) -> None:
+        self.bucket.rate = min(max(rate, self.config.min_rate), self.config.max_rate)
+
+    def _decrease(self, factor: float) -> bool:
+        now = time.monotonic()
+        if now - self.decreased_at < self.config.decrease_interval:
+            return False
+        self.decreased_at = now
+        self._set_rate(self.rate * factor)
+        return True
+
+    def pause(self, seconds: float, open_circuit: bool = False) -> None:
+        """
+        :param seconds: _description_
+        :param open_circuit: the host is failing rather than asking to wait
+        """
+        with self._lock:
+            until = time.monotonic() + seconds
+            self.paused_until = max(self.paused_until, until)
+            if open_circuit:
+                self.open_until = max(self.open_until, until)
+
+    def acquire(self, wait_open: bool = True) -> None:
+        """Block until a request to the host is allowed, pauses asked for with
+        `Retry-After` are always waited out
+
+        :param wait_open: wait for an open circuit to close, else raise
+        :raises CircuitOpenError: when the circuit is open and `wait_open` is False
+        """
+        with self._lock:
+            now = time.monotonic()
+            paused, opened = self.paused_until - now, self.open_until - now
+        if opened > 0 and not wait_open:
+            raise CircuitOpenError(f"{self.host} paused for {opened:.0f}s")
+        if paused > 0:
+            time.sleep(paused)
+        delay = self.bucket.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        if self.outer is not None:
+            self.outer.acquire(wait_open)
+        if self.shared is not None:
+            delay = self.shared(self.host)
+            if delay > 0:
+                time.sleep(delay)
+
+    def success(self, latency: float) -> None:
+        if self.outer is not None:
+            self.outer.success(latency)
+        with self._lock:
+            self.failures = 0
+            if self.latency is None:
+                self.latency = latency
+            slow = latency > self.config.slow_factor * self.latency
+            self.latency = 0.8 * self.latency + 0.2 * latency
+            if slow:
+                self._decrease(self.config.slow_decrease)
+            else:
+                self._set_rate(self.rate + self.config.increase)
+
+    def throttled(self, retry_after: float | None) -> None:
+        if self.outer is not None:
+            self.outer.throttled(retry_after)
+        with self._lock:
+            if self._decrease(self.config.decrease):
+                self.logger.info(
+                    f"{self.host} throttled, rate down to {self.rate:.2f}/s"
+                )
+        if retry_after:
+            self.pause(retry_after)
+
+    def failure(self) -> None:
+        if self.outer is not None:
+            self.outer.failure()
+        with self._lock:
+            self.failures += 1
+            tripped = self.failures >= self.config.failure_threshold
+            if tripped:
+                self.failures = 0
+        if tripped:
+            self.logger.warning(
+                f"{self.host} failed {self.config.failure_threshold} times in a row, "
+                f"pausing it for {self.config.cooldown:.0f}s"
+            )
+            self.pause(self.config.cooldown, open_circuit=True)
+
+
+class FetchPolicy:
+    """Per host rate limiting, retries and circuit breaking for GET requests\n
+    Urls under a scope added with `add_scope`, e.g. one language edition of a
+    wiki, are limited on their own as well as with the rest of their host
+    """
+
+    def __init__(
+        self, config: PolicyConfig | None = None, shared: SharedLimiter | None = None
+    ) -> None:
+        """
+        :param config: _description_
+        :param shared: limit every host also takes its requests from, when other
+            processes fetch from the same hosts
+        """
+        self.config = config if config is not None else PolicyConfig()
+        self.shared = shared
+        self._hosts: dict[str, HostPolicy] = {}
+        # url prefix -> config, longest prefixes first
+        self._scopes: dict[str, PolicyConfig] = {}
+        self._lock = threading.Lock()
+
+    def add_scope(self, prefix: str, config: PolicyConfig | None = None) -> None:
+        """Limit the urls under a prefix on their own, within the limit of the
+        whole host
+
+        :param prefix: e.g. https://genshin-impact.fandom.com/fr
+        :param config: defaults to the policy's
+        """
+        prefix = prefix.rstrip("/")
+        with self._lock:
+            scopes = {**self._scopes, prefix: config or self.config}
+            self._scopes = dict(
+                sorted(scopes.items(), key=lambda item: len(item[0]), reverse=True)
+            )
+
+    def scope(self, url: str) -> str:
+        """
+        :param url: url about to be requested
+        :return: the longest scope the url is under, else its host
+        """
+        for prefix in self._scopes:
+            if url == prefix or url.startswith(prefix + "/"):
+                return prefix
+        return urlsplit(url).netloc
+
+    def _host(self, host: str) -> HostPolicy:
+        if host not in self._hosts:
+            if host in self._scopes:
+                outer = self._host(urlsplit(host).netloc)
+                policy = HostPolicy(host, self._scopes[host], outer=outer)
+            else:
+                policy = HostPolicy(host, self.config, self.shared)
+            self._hosts[host] = policy
+        return self._hosts[host]
+
+    def host(self, host: str) -> HostPolicy:
+        """
+        :param host: host or scope, see `scope`
+        :return: policy of a host, or of a scope going through its host's
+        """
+        with self._lock:
+            return self._host(host)
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter exponential backoff
+
+        :param attempt: 1 for the first retry
+        :return: seconds to wait
+        """
+        ceiling = min(self.config.backoff_cap, self.config.backoff_base * 2**attempt)
+        return random.uniform(0, ceiling)
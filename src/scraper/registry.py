@@ -0,0 +1,12 @@
+from src.common.book_type import Category
+from src.scraper.artifact_scraper import ArtifactScraper
+from src.scraper.base import Scraper
+from src.scraper.book_scraper import BookScraper
+from src.scraper.weapon_scraper import WeaponScraper
+
+# scraper of the item pages of each category
+ITEM_SCRAPERS: dict[Category, type[Scraper]] = {
+    Category.ARTIFACT: ArtifactScraper,
+    Category.WEAPON: WeaponScraper,
+    Category.BOOK: BookScraper,
+}
@@ -0,0 +1,217 @@
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from functools import cache
+
+from bs4 import BeautifulSoup, Tag
+from src.common.book_type import BookCategory, Category
+from src.common.links import EN, Locale
+from src.scraper.sections import Section, article_root, make_soup, split_sections
+from src.util.logger import get_logger
+from src.util.metrics import item_stage
+
+logger = get_logger("ExtractionRule")
+
+# portable infobox row, e.g. data-source="region_location"
+INFOBOX_ROW_CLASS = "pi-item pi-data pi-item-spacing pi-border-color"
+INFOBOX_VALUE_CLASS = "pi-data-value"
+
+
+@dataclass(frozen=True)
+class ExtractionRule:
+    """Declarative description of where a content type keeps its text on a wiki page"""
+
+    # section holding the text, by headline id, e.g. "Lore"
+    section_id: str | None = None
+    # or every h2 whose title contains one of these, checked in order
+    title_keywords: tuple[str, ...] = ()
+    # matched titles split into one item per h3 (each h3 closes the item before it)
+    split_keywords: tuple[str, ...] = ()
+    # one item per subsection at this heading level, titled by its headline
+    item_level: int | None = None
+    # elements with one of these classes are not part of the text
+    skip_classes: tuple[str, ...] = ("description-wrapper",)
+    # class inside a skipped element that holds the item description
+    description_class: str | None = None
+    # get_text separator for <p>, and for other elements (None ignores them)
+    paragraph_separator: str = ""
+    other_separator: str | None = None
+    # joins the text of every element of an item
+    joiner: str = "\n"
+    # infobox rows to extract, by data-source
+    infobox_fields: tuple[str, ...] = ()
+
+
+@dataclass
+class Item:
+    title: str
+    text: str
+    description: str = ""
+
+
+@dataclass
+class PageExtract:
+    items: list[Item] = field(default_factory=list)
+    infobox: dict[str, str] = field(default_factory=dict)
+
+
+def _timed_soup(html: str) -> BeautifulSoup:
+    with item_stage("parse"):
+        return make_soup(html)
+
+
+class CompiledRule:
+    """An `ExtractionRule` resolved once into the functions run for every page"""
+
+    def __init__(self, rule: ExtractionRule) -> None:
+        self.rule = rule
+        self._skip = frozenset(rule.skip_classes)
+        self._keywords = tuple(keyword.lower() for keyword in rule.title_keywords)
+        self._split = frozenset(keyword.lower() for keyword in rule.split_keywords)
+        self._paragraph_separator = rule.paragraph_separator
+        self._other_separator = rule.other_separator
+        self._joiner = rule.joiner
+        self._select = self._select_by_id if rule.section_id else self._select_by_title
+
+    def _select_by_id(self, page: Section) -> Iterator[tuple[Section, bool]]:
+        section = page.find(self.rule.section_id)
+        if not section:
+            raise ValueError(
+                f"{self.rule.section_id} section not found. Page may have changed"
+            )
+        yield section, False
+
+    def _select_by_title(self, page: Section) -> Iterator[tuple[Section, bool]]:
+        for section in page.subsections:
+            # ignore headings without a headline (edit links only)
+            if not section.headline:
+                continue
+            title = section.title.lower()
+            for keyword in self._keywords:
+                if keyword in title:
+                    yield section, keyword in self._split
+                    break
+
+    def _item(
+        self, title: str, elements: Iterable[Tag], link: str, description: str = ""
+    ) -> Item:
+        texts = []
+        for elem in elements:
+            if self._skip and not self._skip.isdisjoint(elem.get("class", ())):
+                if self.rule.description_class:
+                    desc_el = elem.find("div", class_=self.rule.description_class)
+                    if desc_el:
+                        description = desc_el.get_text(strip=True)
+                    else:
+                        logger.warning(f"no description found for {link} {title}")
+                continue
+
+            if elem.name == "p":
+                texts.append(elem.get_text(self._paragraph_separator, strip=True))
+            elif self._other_separator is not None and elem.get_text(strip=True):
+                texts.append(elem.get_text(self._other_separator, strip=True))
+        return Item(title=title, text=self._joiner.join(texts), description=description)
+
+    def _split_items(self, section: Section, link: str) -> Iterator[Item]:
+        # text before the first h3 goes with it, each later h3 closes the item
+        # collected so far, text after the last h3 is not an item
+        chunks = [section.elements] + [sub.elements for sub in section.subsections]
+        elements: list[Tag] = []
+        for i, chunk in enumerate(chunks):
+            if i > 1:
+                yield self._item(section.title, elements, link)
+                elements = []
+            elements.extend(chunk)
+
+    def _items(self, section: Section, split: bool, link: str) -> Iterator[Item]:
+        if split:
+            yield from self._split_items(section, link)
+        elif self.rule.item_level:
+            for sub in section.subsections:
+                if sub.level == self.rule.item_level and sub.headline:
+                    yield self._item(sub.title, sub.elements, link)
+        else:
+            yield self._item(section.title, section.iter_elements(), link)
+
+    def _infobox(self, soup: BeautifulSoup) -> dict[str, str]:
+        infobox = {}
+        for name in self.rule.infobox_fields:
+            row = soup.find(
+                "div", class_=INFOBOX_ROW_CLASS, attrs={"data-source": name}
+            )
+            value = row.find("div", class_=INFOBOX_VALUE_CLASS) if row else None
+            infobox[name] = value.get_text(" ", strip=True) if value else ""
+        return infobox
+
+    def apply(self, link: str, html: str) -> PageExtract:
+        """Extract the items of a page in a single pass over its sections
+
+        :param link: page link, for logging
+        :param html: page html
+        :raises ValueError: when `section_id` is not on the page
+        :return: items and infobox fields
+        """
+        # item pages are parsed once, in a parse pool process more often than
+        # not, the tree is given back as soon as the items are out of it
+        soup = _timed_soup(html)
+        try:
+            with item_stage("parse"):
+                page = split_sections(article_root(soup))
+            items = [
+                item
+                for section, split in self._select(page)
+                for item in self._items(section, split, link)
+            ]
+            return PageExtract(items=items, infobox=self._infobox(soup))
+        finally:
+            soup.decompose()
+
+
+def make_rules(locale: Locale = EN) -> dict[Category | BookCategory, ExtractionRule]:
+    """Rules of every content type, with the section ids and titles of an edition
+
+    :param locale: _description_
+    :return: _description_
+    """
+    return {
+        # h2 Lore, one h3 per piece, description-wrapper holds the piece's stats
+        Category.ARTIFACT: ExtractionRule(
+            section_id=locale.lore_id,
+            item_level=3,
+            other_separator=" ",
+        ),
+        Category.WEAPON: ExtractionRule(
+            section_id=locale.lore_id,
+            paragraph_separator="\n",
+            other_separator=" ",
+        ),
+        # one volume per "Vol." h2, "Version" h2s hold one volume per h3
+        BookCategory.collection: ExtractionRule(
+            title_keywords=locale.volume_keywords,
+            split_keywords=locale.version_keywords,
+            description_class="description-content",
+            paragraph_separator="\n",
+            infobox_fields=("region_location",),
+        ),
+        BookCategory.quest: ExtractionRule(
+            section_id=locale.text_id,
+            paragraph_separator="\n",
+            infobox_fields=("region_location",),
+        ),
+    }
+
+
+@cache
+def compiled_rules(
+    locale: Locale = EN,
+) -> dict[Category | BookCategory, CompiledRule]:
+    """Compiled rules of an edition, compiled once per process
+
+    :param locale: _description_
+    :return: _description_
+    """
+    return {key: CompiledRule(rule) for key, rule in make_rules(locale).items()}
+
+
+RULES: dict[Category | BookCategory, ExtractionRule] = make_rules()
+
+COMPILED_RULES: dict[Category | BookCategory, CompiledRule] = compiled_rules()
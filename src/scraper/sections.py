@@ -0,0 +1,132 @@
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+from bs4 import BeautifulSoup, Tag
+
+try:
+    import lxml  # noqa: F401
+
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+HEADING_LEVELS = {f"h{level}": level for level in range(1, 7)}
+
+# wiki article content starts at this class, the skin footer after </main>
+ARTICLE_BODY_CLASS = "mw-parser-output"
+ARTICLE_END = "</main>"
+ARTICLE_START = re.compile(r'<div[^>]*class="[^"]*\bmw-parser-output\b')
+
+
+def article_html(html: str) -> str:
+    """Cut the article body out of a skinned page before parsing\n
+    Slicing the string is much cheaper than a `SoupStrainer`, which still
+    runs every tag of the page through the tree builder
+
+    :param html: page html, either a full skinned page or an api.php parse result
+    :return: html from the article body to the end of the main content
+    """
+    match = ARTICLE_START.search(html)
+    if not match:
+        return html
+    start = match.start()
+    end = html.find(ARTICLE_END, start)
+    return html[start:] if end == -1 else html[start:end]
+
+
+def make_soup(html: str, body_only: bool = True) -> BeautifulSoup:
+    """Parse a wiki page with the fastest available parser
+
+    :param html: page html, either a full skinned page or an api.php parse result
+    :param body_only: only build the tree of the article body
+    :return: parsed document
+    """
+    return BeautifulSoup(article_html(html) if body_only else html, PARSER)
+
+
+@dataclass
+class Section:
+    """Content between a heading and the next heading of the same or higher level"""
+
+    level: int
+    heading: Tag | None = None
+    headline: Tag | None = None  # <span class="mw-headline">, holds id and title
+    elements: list[Tag] = field(default_factory=list)
+    subsections: list["Section"] = field(default_factory=list)
+
+    @property
+    def id(self) -> str | None:
+        return self.headline.get("id") if self.headline else None
+
+    @property
+    def title(self) -> str:
+        if self.headline:
+            return self.headline.get_text(strip=True)
+        return self.heading.get_text(strip=True) if self.heading else ""
+
+    def iter_elements(self) -> Iterator[Tag]:
+        """Own elements, then every subsection's heading and elements, in document order
+
+        :return: _description_
+        """
+        yield from self.elements
+        for sub in self.subsections:
+            yield sub.heading
+            yield from sub.iter_elements()
+
+    def find(self, section_id: str) -> "Section | None":
+        """Find a (sub)section by its headline id
+
+        :param section_id: e.g. "Lore"
+        :return: _description_
+        """
+        for sub in self.subsections:
+            if sub.id == section_id:
+                return sub
+            found = sub.find(section_id)
+            if found:
+                return found
+        return None
+
+
+def article_root(soup: BeautifulSoup) -> Tag:
+    """Element holding the article headings as direct children
+
+    :param soup: _description_
+    :return: _description_
+    """
+    return soup.find("div", class_=ARTICLE_BODY_CLASS) or soup
+
+
+def split_sections(root: Tag, levels: tuple[int, ...] = (2, 3)) -> Section:
+    """Split the children of `root` into heading delimited sections in a single pass
+
+    :param root: element holding headings and content as direct children
+    :param levels: heading levels that open a section, other headings are content
+    :return: lead section (level 1), h2 sections nested under it, h3 under those
+    """
+    lead = Section(level=1)
+    stack = [lead]
+    for elem in root.children:
+        if not isinstance(elem, Tag):
+            continue
+        level = HEADING_LEVELS.get(elem.name)
+        if level not in levels:
+            stack[-1].elements.append(elem)
+            continue
+
+        while stack[-1].level >= level:
+            stack.pop()
+        section = Section(
+            level=level,
+            heading=elem,
+            headline=elem.find("span", class_="mw-headline"),
+        )
+        stack[-1].subsections.append(section)
+        stack.append(section)
+    return lead
+
+
+def has_class(elem: Tag, name: str) -> bool:
+    return name in elem.get("class", [])
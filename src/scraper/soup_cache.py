@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+from bs4 import BeautifulSoup
+from src.util.logger import get_logger
+
+# a parsed tree takes 11-16 times the size of its html (measured with tracemalloc
+# on the index pages, lxml and html.parser alike)
+SOUP_COST_FACTOR = 16
+
+DEFAULT_BUDGET = 64 * 1024 * 1024
+
+
+def soup_cost(html: str) -> int:
+    """Estimated memory of the parsed tree of a page
+
+    :param html: _description_
+    :return: bytes
+    """
+    return len(html) * SOUP_COST_FACTOR
+
+
+class SoupCache:
+    """LRU of parsed pages, bounded by the estimated memory of the trees\n
+    Evicted soups are decomposed right away, so their memory is given back
+    without waiting for the garbage collector to break the tree's cycles.
+    Soups being used are never evicted, a soup bigger than the whole budget
+    is decomposed as soon as it is given back
+    """
+
+    def __init__(self, budget: int = DEFAULT_BUDGET) -> None:
+        """
+        :param budget: bytes of parsed trees kept around
+        """
+        self.budget = budget
+        self.logger = get_logger("SoupCache")
+        self._lock = threading.Lock()
+        # key -> (soup, cost, users)
+        self._soups: OrderedDict[str, list] = OrderedDict()
+        self.size = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._soups
+
+    def _evict(self) -> None:
+        for key in list(self._soups):
+            if self.size <= self.budget:
+                return
+            soup, cost, users = self._soups[key]
+            if users:
+                continue
+            del self._soups[key]
+            self.size -= cost
+            soup.decompose()
+            self.logger.debug(f"Evicted {key}, {self.size} bytes cached")
+
+    @contextmanager
+    def borrow(
+        self, key: str, load: Callable[[], str], parse: Callable[[str], BeautifulSoup]
+    ) -> Iterator[BeautifulSoup]:
+        """Parsed page, from the cache or parsed now\n
+        Don't keep references to the soup or its tags past the `with` block
+
+        :param key: _description_
+        :param load: returns the page html, only called on a miss
+        :param parse: builds the soup from the html
+        :return: the soup
+        """
+        with self._lock:
+            entry = self._soups.get(key)
+            if entry is not None:
+                self._soups.move_to_end(key)
+                entry[2] += 1
+        if entry is None:
+            html = load()
+            soup = parse(html)
+            entry = [soup, soup_cost(html), 1]
+            del html
+            with self._lock:
+                # two threads may parse the same page, keep the first one
+                if key in self._soups:
+                    soup.decompose()
+                    entry = self._soups[key]
+                    entry[2] += 1
+                else:
+                    self._soups[key] = entry
+                    self.size += entry[1]
+        try:
+            yield entry[0]
+        finally:
+            with self._lock:
+                entry[2] -= 1
+                self._evict()
+
+    def discard(self, key: str) -> None:
+        """Drop and decompose a soup nobody is using anymore
+
+        :param key: _description_
+        """
+        with self._lock:
+            entry = self._soups.get(key)
+            if entry is None or entry[2]:
+                return
+            del self._soups[key]
+            self.size -= entry[1]
+            entry[0].decompose()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in [key for key, entry in self._soups.items() if not entry[2]]:
+                soup, cost, _ = self._soups.pop(key)
+                self.size -= cost
+                soup.decompose()
+
+
+_soup_cache: SoupCache | None = None
+_soup_cache_lock = threading.Lock()
+
+
+def get_soup_cache() -> SoupCache:
+    """Returns the soup cache shared by every scraper of the process
+
+    :return: _description_
+    """
+    global _soup_cache
+    with _soup_cache_lock:
+        if _soup_cache is None:
+            _soup_cache = SoupCache()
+        return _soup_cache
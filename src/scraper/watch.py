@@ -0,0 +1,270 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+from src.common.archives import DEFAULT_LOCALE, WATCH_STATE_PATH, data_paths
+from src.common.book_type import Category
+from src.common.links import EN, Locale, get_locale
+from src.export.epub import export_epub
+from src.export.text import export_text
+from src.scraper.fetcher import Fetcher, get_fetcher
+from src.scraper.link_scraper import LinkScraper, load_links
+from src.scraper.mediawiki import call_api
+from src.scraper.registry import ITEM_SCRAPERS
+from src.util.archive import ARCHIVE_PARTS
+from src.util.database import ArchiveDatabase
+from src.util.file import write_if_changed
+from src.util.logger import get_logger
+from src.util.quarantine import Quarantine
+from src.util.url import link_title
+
+# api.php returns at most 500 changes per request for regular clients
+CHANGES_PER_QUERY = 500
+
+
+def utc_timestamp(seconds: float | None = None) -> str:
+    """MediaWiki timestamp, e.g. 2024-01-31T12:00:00Z
+
+    :param seconds: unix time, defaults to now
+    :return: _description_
+    """
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+
+class Watcher:
+    """Re-scrapes the pages edited on the wiki, as listed by its recent changes\n
+    Every poll asks `list=recentchanges` for the edits since the last one, keeps
+    those of listed items and index pages, and re-scrapes only them through the
+    usual scrapers. An edited index page refreshes its link list, and links new
+    to it are scraped too. Exports are updated in place afterwards\n
+    Where the feed left off is kept in `archive/watch_state.json`, and only moved
+    forward once a batch was scraped, so a failed batch is polled again. Edited
+    pages the scrapers quarantined are kept there too, and scraped again with
+    the next batch until they go through\n
+    Any edition can be watched, one per watcher. Its state and quarantine are
+    those of the edition, the exports only cover the English one
+    """
+
+    def __init__(
+        self,
+        fetcher: Fetcher | None = None,
+        state_path: str | Path | None = None,
+        parse_workers: int | None = None,
+        database: ArchiveDatabase | None = None,
+        export: bool = True,
+        locale: Locale | None = None,
+    ) -> None:
+        """
+        :param fetcher: _description_
+        :param state_path: defaults to `watch_state.json` in the edition's archive
+        :param parse_workers: _description_
+        :param database: kept up to date with the archive, if any
+        :param export: update the text and EPUB exports after every batch, only
+            the English edition is exported
+        :param locale: edition to watch, defaults to the English one
+        """
+        self.fetcher = fetcher if fetcher is not None else get_fetcher()
+        self.locale = locale or EN
+        self.paths = data_paths(self.locale.code)
+        self.api_url = self.locale.api_link
+        if state_path is None:
+            state_path = self.paths.archive_dir / WATCH_STATE_PATH.name
+        self.state_path = Path(state_path)
+        self.parse_workers = parse_workers
+        self.database = database
+        self.export = export
+        self.logger = get_logger("Watcher")
+        self.state = {"timestamp": utc_timestamp(), "rcid": 0}
+        if self.state_path.exists():
+            with open(self.state_path, "r") as f:
+                self.state = json.load(f)
+
+    def save_state(self) -> None:
+        data = json.dumps(self.state, indent=4, sort_keys=True).encode("utf-8")
+        write_if_changed(self.state_path, data)
+
+    def poll(self) -> list[dict]:
+        """Edits and page creations in the main namespace since the last batch
+
+        :return: recent changes, oldest first
+        """
+        params = {
+            "action": "query",
+            "list": "recentchanges",
+            "rcnamespace": "0",
+            "rctype": "edit|new",
+            "rcprop": "title|ids|timestamp",
+            "rcdir": "newer",
+            "rclimit": str(CHANGES_PER_QUERY),
+            "rcstart": self.state["timestamp"],
+        }
+        changes = []
+        while True:
+            data = call_api(self.fetcher, self.api_url, params)
+            for change in data.get("query", {}).get("recentchanges", []):
+                # rcstart is inclusive, changes of the last batch come back
+                if change["rcid"] > self.state["rcid"]:
+                    changes.append(change)
+            if "continue" not in data:
+                break
+            params = {**params, **data["continue"]}
+        return changes
+
+    def _scrape_links(self, names: list[str]) -> set[str]:
+        # refresh the link lists of edited index pages, return the new links
+        scraper = LinkScraper(
+            load_from_file=False, fetcher=self.fetcher, locale=self.locale
+        )
+        new = set()
+        for name in names:
+            category = Category(name)
+            before = set(load_links(category, self.paths.links_dir))
+            {
+                Category.ARTIFACT: scraper.scrape_artifact_links,
+                Category.WEAPON: scraper.scrape_weapon_links,
+                Category.BOOK: scraper.scrape_book_links,
+            }[category]()
+            added = set(load_links(category, self.paths.links_dir)) - before
+            self.logger.info(f"{name} index edited, {len(added)} new links")
+            new |= added
+        return new
+
+    def refresh(self, titles: set[str]) -> set[str]:
+        """Re-scrape the listed pages among `titles`
+
+        :param titles: edited page titles
+        :return: item links scraped again
+        """
+        indexes = [
+            name
+            for name, link in self.locale.index_links.items()
+            if link_title(link) in titles
+        ]
+        only = self._scrape_links(indexes) if indexes else set()
+        categories = {Category(name) for name in indexes}
+        for category in Category:
+            edited = {
+                link
+                for link in load_links(category, self.paths.links_dir)
+                if link_title(link) in titles
+            }
+            if edited:
+                categories.add(category)
+                only |= edited
+
+        for category in categories:
+            scraper = ITEM_SCRAPERS[category](
+                self.fetcher,
+                self.parse_workers,
+                self.database,
+                only=only,
+                locale=self.locale,
+            )
+            scraper.paths.makedirs()
+            scraper.run()
+        if self.export and categories and self.locale.code == DEFAULT_LOCALE:
+            export_text()
+            export_epub()
+        return only
+
+    def quarantined(self, links: set[str]) -> set[str]:
+        """
+        :param links: item links just scraped
+        :return: those the scrapers set aside instead
+        """
+        failed = set()
+        for name in ARCHIVE_PARTS:
+            failed |= links.intersection(
+                Quarantine(name, self.paths.quarantine_dir).links()
+            )
+        return failed
+
+    def run_once(self) -> int:
+        """Poll once and re-scrape what changed, and what was quarantined before
+
+        :return: number of item links scraped again
+        """
+        changes = self.poll()
+        pending = set(self.state.get("pending", []))
+        if not changes and not pending:
+            # keep the starting point of a first run
+            self.save_state()
+            return 0
+        titles = {change["title"] for change in changes} | pending
+        self.logger.info(
+            f"{len(changes)} edits, {len(titles)} pages to scrape again "
+            f"({len(pending)} quarantined before)"
+        )
+        links = self.refresh(titles)
+        failed = {link_title(link) for link in self.quarantined(links)}
+        if failed:
+            self.logger.warning(
+                f"{len(failed)} edited pages quarantined, retrying them next poll"
+            )
+        position = {key: self.state[key] for key in ("timestamp", "rcid")}
+        if changes:
+            last = max(
+                changes, key=lambda change: (change["timestamp"], change["rcid"])
+            )
+            position = {"timestamp": last["timestamp"], "rcid": last["rcid"]}
+        self.state = {**position, "pending": sorted(failed)}
+        self.save_state()
+        return len(links)
+
+    def run(self, interval: float = 300) -> None:
+        """Poll forever, every `interval` seconds
+
+        :param interval: _description_
+        """
+        while True:
+            start = time.monotonic()
+            try:
+                scraped = self.run_once()
+                if scraped:
+                    self.logger.info(f"Scraped {scraped} edited pages")
+            except Exception as e:
+                self.logger.error(f"Watch batch failed, retrying next poll: {e!r}")
+            time.sleep(max(interval - (time.monotonic() - start), 0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Re-scrape pages as they are edited on the wiki"
+    )
+    parser.add_argument("--interval", type=float, default=300, help="seconds")
+    parser.add_argument("--once", action="store_true", help="poll a single time")
+    parser.add_argument(
+        "--since", type=str, default=None, help="start from this timestamp (UTC ISO)"
+    )
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--database", action="store_true", help="update archive.db")
+    parser.add_argument(
+        "--locale", type=str, default=DEFAULT_LOCALE, help="edition to watch"
+    )
+    parser.add_argument("--no-export", action="store_true")
+    parser.add_argument(
+        "--target", type=str, default=None, help="send wiki requests to this server"
+    )
+    args = parser.parse_args()
+    if args.database and args.locale != DEFAULT_LOCALE:
+        parser.error("--database only holds the English edition")
+
+    fetcher = get_fetcher()
+    if args.target:
+        from src.bench.mock_wiki import route_to
+
+        route_to(fetcher, args.target)
+    watcher = Watcher(
+        fetcher,
+        parse_workers=args.parse_workers,
+        database=ArchiveDatabase() if args.database else None,
+        export=not args.no_export,
+        locale=get_locale(args.locale),
+    )
+    if args.since:
+        watcher.state = {"timestamp": args.since, "rcid": 0}
+    if args.once:
+        watcher.run_once()
+    else:
+        watcher.run(args.interval)
@@ -0,0 +1,87 @@
+import json
+from collections.abc import Iterable
+from concurrent.futures import Executor
+from functools import partial
+
+from src.common.book_type import Category
+from src.common.links import EN, Locale
+from src.scraper.base import Scraper
+from src.scraper.fetcher import Fetcher
+from src.scraper.rules import compiled_rules
+from src.util.database import ArchiveDatabase
+from src.util.file import dump_stream_to_json
+from src.util.logger import get_logger
+from src.util.manifest import Manifest
+from src.util.url import extract_slug
+
+
+def extract_weapon(link: str, page_html: str, locale: Locale = EN) -> tuple[str, str]:
+    """Extract the lore of a weapon page
+
+    :param link: weapon link
+    :param page_html: html of the page
+    :param locale: edition the page is from
+    :raises ValueError: when the page has no Lore section
+    :return: weapon name, lore
+    """
+    weapon_name = extract_slug(link)
+    page = compiled_rules(locale)[Category.WEAPON].apply(link, page_html)
+    return weapon_name, page.items[0].text
+
+
+class WeaponScraper(Scraper):
+    """Scrapes weapon lore from links in `links/weapon.json`\n
+    Saves scraped weapon lore to `archive/json/weapon.json`
+    """
+
+    category = Category.WEAPON.value
+
+    def __init__(
+        self,
+        fetcher: Fetcher | None = None,
+        parse_workers: int | None = None,
+        database: ArchiveDatabase | None = None,
+        offline: bool = False,
+        retry_failed: bool = False,
+        only: Iterable[str] | None = None,
+        locale: Locale | None = None,
+        parse_pool: Executor | None = None,
+    ):
+        super().__init__(
+            fetcher,
+            parse_workers,
+            database,
+            offline,
+            retry_failed,
+            only,
+            locale,
+            parse_pool,
+        )
+        self.logger = get_logger("WeaponScraper")
+
+    def run(self):
+        """Scrape! Pages without a Lore section are quarantined"""
+        with open(self.paths.links_dir / f"{Category.WEAPON.value}.json", "r") as f:
+            links = json.load(f)
+
+        self.logger.info(f"Checking {len(links)} weapon links")
+        manifest = Manifest(Category.WEAPON.value, self.paths.manifest_dir)
+        try:
+            dropped = manifest.retain(links)
+            if dropped:
+                self.logger.info(f"Dropped {len(dropped)} unlisted weapon links")
+
+            extract = partial(extract_weapon, locale=self.locale)
+            changed = self.scrape_changed(links, manifest, extract)
+
+            manifest.save()
+            output_path = self.paths.json_dir / f"{Category.WEAPON.value}.json"
+            self.logger.info(
+                f"Extracted info from {changed} changed links, "
+                f"{len(manifest)} in archive"
+            )
+            with self.metrics.timer("write", self.category):
+                # long text is left as blob references, like in the manifest
+                dump_stream_to_json(manifest.iter_results(rehydrate=False), output_path)
+        finally:
+            manifest.close()
@@ -0,0 +1,254 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+from functools import partial
+from pathlib import Path
+
+from src.common.archives import LINKS_DIR, QUEUE_PATH, WORKER_PACK_DIR
+from src.common.book_type import BookCategory, Category
+from src.scraper.artifact_scraper import extract_artifact
+from src.scraper.book_scraper import extract_collection, extract_quest
+from src.scraper.fetcher import Fetcher
+from src.scraper.link_scraper import load_book_links
+from src.scraper.pipeline import Extractor
+from src.scraper.policy import FetchPolicy, PolicyConfig
+from src.scraper.weapon_scraper import extract_weapon
+from src.util.archive import ARCHIVE_PARTS, dump_archive
+from src.util.codec import to_record
+from src.util.html_pack import HtmlPack, get_html_pack
+from src.util.http_cache import HttpCache
+from src.util.logger import get_logger
+from src.util.manifest import Manifest, content_hash
+from src.util.work_queue import WorkQueue
+
+logger = get_logger("Worker")
+
+# requests per second of all the workers together, per host
+DEFAULT_RATE = PolicyConfig.initial_rate
+# suffix of the pack of a worker still running, collect leaves it alone
+OPEN_PACK_SUFFIX = ".open"
+
+# queue (= manifest) name -> extractor
+EXTRACTORS: dict[str, Extractor] = {
+    "artifact": extract_artifact,
+    "weapon": extract_weapon,
+    "book_collection": extract_collection,
+    "book_quest": extract_quest,
+}
+
+
+def queues_of(category: Category) -> list[str]:
+    return [name for name, (part, _) in ARCHIVE_PARTS.items() if part == category]
+
+
+def load_links(queue: str) -> list[str]:
+    """Current links of a queue, from `links/<category>.json`
+
+    :param queue: _description_
+    :return: _description_
+    """
+    category, _ = ARCHIVE_PARTS[queue]
+    if category == Category.BOOK:
+        kind = BookCategory(queue.removeprefix("book_"))
+        return load_book_links(LINKS_DIR)[kind.value]
+    with open(LINKS_DIR / f"{category.value}.json", "r") as f:
+        return json.load(f)
+
+
+def enqueue(category: Category, path=QUEUE_PATH) -> None:
+    queue = WorkQueue(path)
+    for name in queues_of(category):
+        queued = queue.enqueue(name, load_links(name))
+        logger.info(f"Queued {queued} {name} links, {queue.counts(name)}")
+    queue.close()
+
+
+def work(
+    queues: list[str],
+    path=QUEUE_PATH,
+    batch: int = 4,
+    lease_seconds: float = 300,
+    poll_seconds: float = 5,
+    rate: float = DEFAULT_RATE,
+    pack_dir: str | Path = WORKER_PACK_DIR,
+) -> int:
+    """Claim, fetch and extract items until every queue is finished\n
+    Each worker fetches one page at a time, so the number of workers is the
+    number of requests in flight. Workers share the http cache, and take their
+    requests from a rate limit kept in the queue database. Pages are packed in
+    a pack of their own, merged into the shared one by `collect`
+
+    :param queues: _description_
+    :param path: queue database
+    :param batch: items claimed at once
+    :param lease_seconds: _description_
+    :param poll_seconds: wait between claims while other workers hold every item
+    :param rate: requests per second to a host, for all the workers together
+    :param pack_dir: where the worker packs its pages
+    :return: number of items done by this worker
+    """
+    owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    queue = WorkQueue(path)
+    config = PolicyConfig(initial_rate=rate, max_rate=rate)
+    policy = FetchPolicy(config, shared=partial(queue.reserve, rate=rate))
+    fetcher = Fetcher(
+        max_workers=1, per_host_limit=1, cache=HttpCache(prune=False), policy=policy
+    )
+    pack_path = Path(pack_dir) / f"{owner}.pack"
+    pack = HtmlPack(pack_path.with_name(pack_path.name + OPEN_PACK_SUFFIX))
+    done = 0
+    try:
+        for name in queues:
+            extract = EXTRACTORS[name]
+            while queue.unfinished(name):
+                links = queue.claim(name, owner, batch, lease_seconds)
+                if not links:
+                    time.sleep(poll_seconds)
+                    continue
+                for i, link in enumerate(links):
+                    try:
+                        html = fetcher.fetch(link)
+                        pack.put(link, html)
+                        key, result = extract(link, html)
+                    except Exception as e:
+                        logger.warning(f"{link} failed: {e!r}")
+                        queue.fail(name, owner, link, repr(e))
+                        continue
+                    if queue.complete(
+                        name, owner, link, content_hash(html), key, to_record(result)
+                    ):
+                        done += 1
+                    else:
+                        logger.warning(f"Lost the lease of {link}")
+                    queue.renew(name, owner, links[i + 1 :], lease_seconds)
+    finally:
+        fetcher.close()
+        queue.close()
+        pack.close()
+        os.replace(pack.path, pack_path)
+    logger.info(f"{owner} done with {done} items")
+    return done
+
+
+def run_workers(queues: list[str], workers: int, path=QUEUE_PATH, **kwargs) -> None:
+    """Run `work` in several processes
+
+    :param queues: _description_
+    :param workers: _description_
+    :param path: _description_
+    """
+    # evicted once here, the workers share the cache without pruning it
+    HttpCache()
+    processes = [
+        multiprocessing.Process(target=work, args=(queues, path), kwargs=kwargs)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def merge_packs(pack_dir: str | Path = WORKER_PACK_DIR) -> int:
+    """Move the pages packed by finished workers into the shared html pack
+
+    :param pack_dir: _description_
+    :return: number of records added
+    """
+    shared = get_html_pack()
+    added = 0
+    for pack_path in sorted(Path(pack_dir).glob("*.pack")):
+        pack = HtmlPack(pack_path)
+        added += shared.merge(pack)
+        pack.close()
+        shared.flush()
+        pack_path.unlink()
+    return added
+
+
+def collect(category: Category, path=QUEUE_PATH) -> int:
+    """Move finished results into the manifests and write the category archive,
+    and the pages of finished workers into the html pack\n
+    The only step writing the manifests, run it from one process
+
+    :param category: _description_
+    :param path: _description_
+    :return: number of new or changed results
+    """
+    merged = merge_packs()
+    if merged:
+        logger.info(f"Packed {merged} pages fetched by the workers")
+    queue = WorkQueue(path)
+    manifests = {name: Manifest(name) for name in queues_of(category)}
+    changed = 0
+    try:
+        for name, manifest in manifests.items():
+            collected = []
+            for link, version, key, result in queue.results(name):
+                if not manifest.is_current(link, version):
+                    manifest.update(link, version, key, result)
+                    changed += 1
+                collected.append(link)
+            queue.mark_collected(name, collected)
+            manifest.retain(queue.links(name))
+            manifest.save()
+            for link, error in queue.failures(name):
+                logger.warning(f"Gave up on {link}: {error}")
+        dump_archive(category, manifests)
+    finally:
+        for manifest in manifests.values():
+            manifest.close()
+        queue.close()
+    logger.info(f"Collected {changed} new or changed {category.value} results")
+    return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape through the work queue")
+    parser.add_argument("command", choices=["enqueue", "work", "collect", "status"])
+    parser.add_argument(
+        "--category",
+        choices=[category.value for category in Category],
+        action="append",
+        help="defaults to every category",
+    )
+    parser.add_argument("--queue", type=str, default=str(QUEUE_PATH))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="worker processes, also the requests in flight on this host",
+    )
+    parser.add_argument("--lease", type=float, default=300)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=DEFAULT_RATE,
+        help="requests per second to a host, shared by every worker",
+    )
+    args = parser.parse_args()
+
+    categories = [
+        Category(name) for name in args.category or [c.value for c in Category]
+    ]
+    if args.command == "enqueue":
+        for category in categories:
+            enqueue(category, args.queue)
+    elif args.command == "work":
+        queues = [name for category in categories for name in queues_of(category)]
+        run_workers(
+            queues, args.workers, args.queue, lease_seconds=args.lease, rate=args.rate
+        )
+    elif args.command == "collect":
+        for category in categories:
+            collect(category, args.queue)
+    else:
+        queue = WorkQueue(args.queue)
+        for category in categories:
+            for name in queues_of(category):
+                print(f"{name}: {queue.counts(name)}")
+        queue.close()
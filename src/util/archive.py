@@ -0,0 +1,200 @@
+from collections.abc import Iterator
+from pathlib import Path
+
+from src.common.archives import (
+    JSON_DIR,
+    LOCALE_DIR,
+    MANIFEST_DIR,
+    SNAPSHOT_PATH,
+    DataPaths,
+    data_paths,
+)
+from src.common.book_type import (
+    ArtifactLore,
+    BookArchive,
+    BookCollection,
+    Category,
+    QuestBook,
+    WeaponLore,
+)
+from src.util.blob_store import get_blob_store, iter_refs
+from src.util.codec import (
+    CODECS,
+    Codec,
+    from_record,
+    get_codec,
+    iter_stream,
+    loads_json,
+    write_stream,
+)
+from src.util.file import dump_stream_to_json
+from src.util.manifest import Manifest
+
+# manifest name -> archive file, and the key of the part inside it
+ARCHIVE_PARTS: dict[str, tuple[Category, str | None]] = {
+    "artifact": (Category.ARTIFACT, None),
+    "weapon": (Category.WEAPON, None),
+    "book_collection": (Category.BOOK, "book_collections"),
+    "book_quest": (Category.BOOK, "quest_books"),
+}
+
+# manifest name -> type of its records, for `from_record`
+ARCHIVE_TYPES: dict[str, type] = {
+    "artifact": ArtifactLore,
+    "weapon": WeaponLore,
+    "book_collection": BookCollection,
+    "book_quest": QuestBook,
+}
+
+
+def snapshot_paths() -> list[Path]:
+    """Snapshot files of every format, newest first
+
+    :return: existing snapshots
+    """
+    paths = [SNAPSHOT_PATH.with_suffix(codec.suffix) for codec in CODECS.values()]
+    paths = [path for path in paths if path.exists()]
+    return sorted(paths, key=lambda path: path.stat().st_mtime, reverse=True)
+
+
+def _snapshot_of(category: Category) -> Path | None:
+    # a snapshot older than the json it was made from is stale
+    json_path = JSON_DIR / f"{category.value}.json"
+    for path in snapshot_paths():
+        if not json_path.exists() or path.stat().st_mtime >= json_path.stat().st_mtime:
+            return path
+    return None
+
+
+def iter_archive(name: str, typed: bool = False) -> Iterator[tuple[str, object]]:
+    """Stream the records of an archive part, one at a time when possible\n
+    Records are read from the manifest segment a scraper left behind, else
+    from the snapshot, else from `archive/json/<category>.json`, whose blob
+    references are replaced with their text one record at a time
+
+    :param name: one of `ARCHIVE_PARTS`, e.g. "book_collection"
+    :param typed: decode records to their `ARCHIVE_TYPES`, e.g. `BookCollection`
+    :return: (key, record) pairs sorted by key
+    """
+    records = _iter_records(name)
+    if not typed:
+        yield from records
+        return
+    tp = ARCHIVE_TYPES[name]
+    for key, record in records:
+        yield key, from_record(tp, record)
+
+
+def _iter_records(name: str) -> Iterator[tuple[str, object]]:
+    category, part = ARCHIVE_PARTS[name]
+    if (MANIFEST_DIR / f"{name}.jsonl").exists():
+        manifest = Manifest(name, readonly=True)
+        try:
+            yield from manifest.iter_results()
+        finally:
+            manifest.close()
+        return
+
+    snapshot = _snapshot_of(category)
+    if snapshot is not None:
+        for frame_name, key, record in iter_stream(snapshot):
+            if frame_name == name:
+                yield key, record
+        return
+
+    path = JSON_DIR / f"{category.value}.json"
+    if not path.exists():
+        return
+    with open(path, "rb") as f:
+        archive = loads_json(f.read())
+    if part is not None:
+        archive = archive.get(part, {})
+    blobs = get_blob_store(readonly=True)
+    for key, record in sorted(archive.items()):
+        yield key, blobs.rehydrate(record)
+
+
+def load_book_archive() -> BookArchive:
+    """Every book as typed objects, sorted by title
+
+    :return: _description_
+    """
+    return BookArchive(
+        book_collections=[
+            record for _, record in iter_archive("book_collection", typed=True)
+        ],
+        quest_books=[record for _, record in iter_archive("book_quest", typed=True)],
+    )
+
+
+def write_snapshot(codec: Codec | None = None) -> Path:
+    """Write every archive part to one compact stream file, records are decoded
+    one at a time when it is read back\n
+    Frames are `[part, key, record]`, grouped by part and sorted by key
+
+    :param codec: defaults to compact json
+    :return: path of the snapshot, `archive/archive.<format suffix>`
+    """
+    codec = codec if codec is not None else get_codec()
+    path = SNAPSHOT_PATH.with_suffix(codec.suffix)
+    frames = (
+        (name, key, record)
+        for name in ARCHIVE_PARTS
+        for key, record in iter_archive(name)
+    )
+    write_stream(path, frames, codec)
+    return path
+
+
+def edition_paths() -> list[DataPaths]:
+    """
+    :return: data directories of every edition scraped so far
+    """
+    paths = [data_paths()]
+    if LOCALE_DIR.is_dir():
+        paths += [data_paths(path.name) for path in LOCALE_DIR.iterdir()]
+    return [path for path in paths if path.archive_dir.is_dir()]
+
+
+def compact_blobs() -> int:
+    """Drop text blobs no manifest or archive json refers to anymore, run when
+    no scraper is running\n
+    Every edition shares the blob store, the archives of all of them are kept
+
+    :return: number of dropped blobs
+    """
+    blobs = get_blob_store()
+    refs = set()
+    for paths in edition_paths():
+        for name in ARCHIVE_PARTS:
+            if not (paths.manifest_dir / f"{name}.jsonl").exists():
+                continue
+            manifest = Manifest(name, paths.manifest_dir, blobs=blobs, readonly=True)
+            refs.update(manifest.iter_refs())
+            manifest.close()
+        for path in paths.json_dir.glob("*.json"):
+            with open(path, "rb") as f:
+                refs.update(iter_refs(loads_json(f.read())))
+    return blobs.compact(refs)
+
+
+def dump_archive(category: Category, manifests: dict[str, Manifest]) -> None:
+    """Write `archive/json/<category>.json` from the manifests of its parts, long
+    text is left as blob references like in the manifests
+
+    :param category: _description_
+    :param manifests: manifest of every part of the category, by name
+    """
+    parts = [
+        (name, part)
+        for name, (part_category, part) in ARCHIVE_PARTS.items()
+        if part_category == category
+    ]
+    path = JSON_DIR / f"{category.value}.json"
+    if len(parts) == 1 and parts[0][1] is None:
+        dump_stream_to_json(manifests[parts[0][0]].iter_results(False), path)
+    else:
+        dump_stream_to_json(
+            [(part, manifests[name].iter_results(False)) for name, part in parts],
+            path,
+        )
@@ -0,0 +1,185 @@
+import hashlib
+import threading
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from src.common.archives import BLOB_PATH
+from src.util.segment import SegmentFile
+
+# text shorter than this stays inline, titles and locations aren't worth a lookup
+MIN_BLOB_LENGTH = 64
+
+# a deduplicated string, {"$blob": <sha256 of the text>}
+BLOB_REF = "$blob"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_ref(value) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and BLOB_REF in value
+
+
+def iter_refs(record) -> Iterator[str]:
+    """Every blob hash a record refers to
+
+    :param record: deduplicated record
+    :return: _description_
+    """
+    if is_ref(record):
+        yield record[BLOB_REF]
+    elif isinstance(record, dict):
+        for value in record.values():
+            yield from iter_refs(value)
+    elif isinstance(record, list):
+        for value in record:
+            yield from iter_refs(value)
+
+
+class BlobStore:
+    """Content-addressed store of long strings, each kept once however many
+    records (or runs) it appears in\n
+    Blobs are appended to `archive/manifest/blobs.jsonl` as `{"hash", "text"}`,
+    only the offset of each hash stays in memory
+    """
+
+    def __init__(
+        self,
+        path: str | Path = BLOB_PATH,
+        checkpoint_every: int = 64,
+        readonly: bool = False,
+    ):
+        """
+        :param path: _description_
+        :param checkpoint_every: blobs appended between two fsyncs
+        :param readonly: only read the store, another process may be writing it
+        """
+        self.segment = SegmentFile(path, checkpoint_every, readonly)
+        # manifests of scrapers running in different threads share the store
+        self._lock = threading.Lock()
+        self.offsets: dict[str, int] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Index the blobs appended since the last scan, by another process when
+        the store is read-only
+        """
+        with self._lock:
+            for offset, record in self.segment.scan(self.segment.end):
+                self.offsets[record["hash"]] = offset
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self.offsets
+
+    def put(self, text: str) -> str:
+        """Store a string unless an identical one is already there
+
+        :param text: _description_
+        :return: hash of the text
+        """
+        digest = text_hash(text)
+        with self._lock:
+            if digest not in self.offsets:
+                record = {"hash": digest, "text": text}
+                self.offsets[digest] = self.segment.append(record)
+        return digest
+
+    def get(self, digest: str) -> str:
+        """
+        :param digest: hash returned by `put`
+        :raises KeyError: when the blob isn't stored
+        :return: text
+        """
+        if digest not in self.offsets and self.segment.readonly:
+            self.refresh()
+        with self._lock:
+            return self.segment.read(self.offsets[digest])["text"]
+
+    def dedupe(self, record):
+        """Replace every long string of a record with a reference to its blob
+
+        :param record: json serializable record
+        :return: record with `{"$blob": hash}` in place of long strings
+        """
+        if isinstance(record, str):
+            if len(record) < MIN_BLOB_LENGTH:
+                return record
+            return {BLOB_REF: self.put(record)}
+        if isinstance(record, dict):
+            return {key: self.dedupe(value) for key, value in record.items()}
+        if isinstance(record, list):
+            return [self.dedupe(value) for value in record]
+        return record
+
+    def rehydrate(self, record):
+        """Inverse of `dedupe`, records stored before deduplication pass through
+
+        :param record: deduplicated record
+        :return: record with the text of every blob
+        """
+        if is_ref(record):
+            return self.get(record[BLOB_REF])
+        if isinstance(record, dict):
+            return {key: self.rehydrate(value) for key, value in record.items()}
+        if isinstance(record, list):
+            return [self.rehydrate(value) for value in record]
+        return record
+
+    def has_refs(self, record) -> bool:
+        """Whether every blob a record refers to is stored, it may not be after a crash
+
+        :param record: deduplicated record
+        :return: _description_
+        """
+        digests = list(iter_refs(record))
+        if self.segment.readonly and any(d not in self.offsets for d in digests):
+            self.refresh()
+        return all(digest in self.offsets for digest in digests)
+
+    def checkpoint(self) -> None:
+        with self._lock:
+            self.segment.checkpoint()
+
+    def compact(self, keep: Iterable[str]) -> int:
+        """Drop blobs no record refers to anymore
+
+        :param keep: hashes still referred to
+        :return: number of dropped blobs
+        """
+        keep = set(keep)
+        with self._lock:
+            digests = [digest for digest in self.offsets if digest in keep]
+            dropped = len(self.offsets) - len(digests)
+            offsets = self.segment.rewrite(
+                self.segment.read(self.offsets[digest]) for digest in digests
+            )
+            self.offsets = dict(zip(digests, offsets))
+        return dropped
+
+    def close(self) -> None:
+        self.segment.close()
+
+
+_blob_store: BlobStore | None = None
+_readonly_blob_store: BlobStore | None = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store(readonly: bool = False) -> BlobStore:
+    """Returns the blob store shared by every manifest of the process
+
+    :param readonly: for readers, they get the writable store if the process
+        already opened it, else a read-only one that never touches the file
+    :return: _description_
+    """
+    global _blob_store, _readonly_blob_store
+    with _blob_store_lock:
+        if _blob_store is not None:
+            return _blob_store
+        if readonly:
+            if _readonly_blob_store is None:
+                _readonly_blob_store = BlobStore(readonly=True)
+            return _readonly_blob_store
+        _blob_store = BlobStore()
+        return _blob_store
@@ -0,0 +1,244 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import fields, is_dataclass
+from functools import cache
+from pathlib import Path
+from typing import IO, TypeVar, get_args, get_origin, get_type_hints
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+T = TypeVar("T")
+
+
+@cache
+def _field_names(cls: type) -> tuple[str, ...]:
+    return tuple(field.name for field in fields(cls))
+
+
+def to_record(obj):
+    """Plain json types of an archive object, like `dataclasses.asdict` without
+    its deep copies
+
+    :param obj: dataclass, list, dict or scalar
+    :return: _description_
+    """
+    if isinstance(obj, (str, int, float, bool)) or obj is None:
+        return obj
+    if is_dataclass(obj):
+        return {name: to_record(getattr(obj, name)) for name in _field_names(type(obj))}
+    if isinstance(obj, dict):
+        return {key: to_record(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_record(value) for value in obj]
+    raise TypeError(f"{type(obj).__name__} is not an archive type")
+
+
+def _identity(value):
+    return value
+
+
+@cache
+def _decoder(tp) -> Callable[[object], object]:
+    # built once per type from its annotations, e.g. list[Volume]
+    if is_dataclass(tp):
+        hints = get_type_hints(tp)
+        schema = [(name, _decoder(hints[name])) for name in _field_names(tp)]
+        return lambda record: tp(*[decode(record[name]) for name, decode in schema])
+    origin, args = get_origin(tp), get_args(tp)
+    if origin is list and args:
+        item = _decoder(args[0])
+        if item is _identity:
+            return list
+        return lambda values: [item(value) for value in values]
+    if origin is dict and len(args) == 2:
+        value_decoder = _decoder(args[1])
+        if value_decoder is _identity:
+            return dict
+        return lambda values: {k: value_decoder(v) for k, v in values.items()}
+    return _identity
+
+
+def from_record(tp: type[T], record) -> T:
+    """Typed archive object of a record, e.g. `from_record(BookCollection, record)`
+
+    :param tp: dataclass, `list[...]`, `dict[str, ...]` or a plain type
+    :param record: as returned by `to_record`
+    :return: _description_
+    """
+    return _decoder(tp)(record)
+
+
+def dumps_json(obj) -> bytes:
+    """Compact json, with orjson when it is installed
+
+    :param obj: json types or archive dataclasses
+    :return: utf-8 encoded json, without a trailing newline
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(
+        obj, separators=(",", ":"), ensure_ascii=False, default=to_record
+    ).encode("utf-8")
+
+
+def loads_json(data: bytes | str):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class Codec(ABC):
+    """Encodes archive records, and streams of them as frames in a file"""
+
+    name: str
+    suffix: str
+
+    @abstractmethod
+    def dumps(self, obj) -> bytes:
+        """
+        :param obj: json types or archive dataclasses
+        :return: one encoded record
+        """
+
+    @abstractmethod
+    def loads(self, data: bytes):
+        """
+        :param data: as returned by `dumps`
+        :return: plain json types, see `from_record` for the archive types
+        """
+
+    @abstractmethod
+    def write_frames(self, f: IO[bytes], frames: Iterable) -> int:
+        """
+        :param f: binary file
+        :param frames: values to encode, may be produced lazily
+        :return: number of frames written
+        """
+
+    @abstractmethod
+    def iter_frames(self, f: IO[bytes]) -> Iterator:
+        """
+        :param f: binary file written by `write_frames`
+        :return: decoded frames, one at a time
+        """
+
+
+class JsonCodec(Codec):
+    """Compact json, one frame per line"""
+
+    name = "json"
+    suffix = ".jsonl"
+
+    def dumps(self, obj) -> bytes:
+        return dumps_json(obj)
+
+    def loads(self, data: bytes):
+        return loads_json(data)
+
+    def write_frames(self, f: IO[bytes], frames: Iterable) -> int:
+        count = 0
+        for frame in frames:
+            f.write(dumps_json(frame) + b"\n")
+            count += 1
+        return count
+
+    def iter_frames(self, f: IO[bytes]) -> Iterator:
+        for line in f:
+            yield loads_json(line)
+
+
+class MsgpackCodec(Codec):
+    """MessagePack, frames are written back to back"""
+
+    name = "msgpack"
+    suffix = ".msgpack"
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise RuntimeError("the msgpack format needs msgpack, install it")
+
+    def dumps(self, obj) -> bytes:
+        return msgpack.packb(obj, default=to_record)
+
+    def loads(self, data: bytes):
+        return msgpack.unpackb(data, raw=False)
+
+    def write_frames(self, f: IO[bytes], frames: Iterable) -> int:
+        packer = msgpack.Packer(default=to_record)
+        count = 0
+        for frame in frames:
+            f.write(packer.pack(frame))
+            count += 1
+        return count
+
+    def iter_frames(self, f: IO[bytes]) -> Iterator:
+        yield from msgpack.Unpacker(f, raw=False)
+
+
+CODECS: dict[str, type[Codec]] = {
+    JsonCodec.name: JsonCodec,
+    MsgpackCodec.name: MsgpackCodec,
+}
+
+
+def get_codec(name: str = JsonCodec.name) -> Codec:
+    """
+    :param name: "json" or "msgpack"
+    :raises RuntimeError: when the format's library isn't installed
+    :return: _description_
+    """
+    return CODECS[name]()
+
+
+def codec_of(path: str | Path) -> Codec:
+    """Codec of a stream file, by its suffix
+
+    :param path: _description_
+    :raises ValueError: for unknown suffixes
+    :return: _description_
+    """
+    suffix = Path(path).suffix
+    for cls in CODECS.values():
+        if cls.suffix == suffix:
+            return cls()
+    raise ValueError(f"No codec for {suffix} files")
+
+
+def write_stream(path: str | Path, frames: Iterable, codec: Codec) -> int:
+    """Atomically write frames to a stream file, one at a time
+
+    :param path: _description_
+    :param frames: values to encode, may be produced lazily
+    :param codec: _description_
+    :return: number of frames written
+    """
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        count = codec.write_frames(f, frames)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return count
+
+
+def iter_stream(path: str | Path, codec: Codec | None = None) -> Iterator:
+    """Decode a stream file one frame at a time
+
+    :param path: _description_
+    :param codec: defaults to the codec of the file's suffix
+    :return: frames, in file order
+    """
+    codec = codec if codec is not None else codec_of(path)
+    with open(path, "rb") as f:
+        yield from codec.iter_frames(f)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+from collections.abc import Callable, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+from src.util.logger import get_logger
+
+logger = get_logger("Dag")
+
+RAN = "ran"
+SKIPPED = "skipped"
+FAILED = "failed"
+BLOCKED = "blocked"  # a dependency failed
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    run: Callable[[], object]
+    deps: tuple[str, ...] = ()
+    # files the task writes, downstream tasks are skipped while they don't change
+    outputs: tuple[Path, ...] = ()
+    # reads remote pages the fingerprints of its dependencies don't cover, it is
+    # never skipped and checks what changed on its own
+    remote: bool = False
+
+
+def fingerprint(paths: Iterable[Path]) -> str | None:
+    """Digest of the content of some files
+
+    :param paths: _description_
+    :return: sha256 hex digest, None when a file is missing
+    """
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        if not path.is_file():
+            return None
+        digest.update(str(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunState:
+    """Upstream fingerprints every task last ran with, in `archive/run_state.json`"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.tasks: dict[str, dict] = {}
+        if path.exists():
+            with open(path, "r") as f:
+                self.tasks = json.load(f)
+
+    def inputs(self, name: str) -> dict | None:
+        return self.tasks.get(name, {}).get("inputs")
+
+    def record(self, name: str, inputs: dict) -> None:
+        self.tasks[name] = {"inputs": inputs}
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.tasks, f, indent=4, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def _order(tasks: dict[str, Task]) -> list[str]:
+    order: list[str] = []
+    state: dict[str, bool] = {}  # False while visiting
+
+    def visit(name: str) -> None:
+        if state.get(name) is False:
+            raise ValueError(f"Dependency cycle through {name}")
+        if name in state:
+            return
+        state[name] = False
+        for dep in tasks[name].deps:
+            if dep not in tasks:
+                raise ValueError(f"{name} depends on unknown task {dep}")
+            visit(dep)
+        state[name] = True
+        order.append(name)
+
+    for name in tasks:
+        visit(name)
+    return order
+
+
+def run_dag(
+    tasks: Iterable[Task],
+    state_path: Path,
+    jobs: int = 2,
+    since_last_run: bool = False,
+    dry_run: bool = False,
+) -> dict[str, str]:
+    """Run tasks once their dependencies are done, independent ones concurrently
+
+    :param tasks: _description_
+    :param state_path: where the upstream fingerprints of every run are kept
+    :param jobs: tasks running at the same time
+    :param since_last_run: skip tasks whose upstream outputs haven't changed
+        since they last ran, and whose own outputs are still there, `remote`
+        tasks always run
+    :param dry_run: only log what would run
+    :return: {task name: RAN, SKIPPED, FAILED or BLOCKED}
+    """
+    tasks = {task.name: task for task in tasks}
+    order = _order(tasks)
+    state = RunState(state_path)
+    status: dict[str, str] = {}
+
+    def inputs_of(task: Task) -> dict:
+        return {dep: fingerprint(tasks[dep].outputs) for dep in task.deps}
+
+    def up_to_date(task: Task, inputs: dict) -> bool:
+        if not since_last_run or not task.deps or task.remote:
+            return False
+        if state.inputs(task.name) != inputs:
+            return False
+        return fingerprint(task.outputs) is not None
+
+    if dry_run:
+        for name in order:
+            task = tasks[name]
+            action = SKIPPED if up_to_date(task, inputs_of(task)) else "would run"
+            deps = f" after {', '.join(task.deps)}" if task.deps else ""
+            logger.info(f"{name}: {action}{deps}")
+        return {name: SKIPPED for name in order}
+
+    running: dict[Future, tuple[str, dict]] = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while len(status) < len(order):
+            for name in order:
+                task = tasks[name]
+                if name in status or any(f[0] == name for f in running.values()):
+                    continue
+                dep_status = [status.get(dep) for dep in task.deps]
+                if any(s in (FAILED, BLOCKED) for s in dep_status):
+                    logger.warning(f"{name}: blocked by a failed dependency")
+                    status[name] = BLOCKED
+                    continue
+                if None in dep_status:
+                    continue
+                inputs = inputs_of(task)
+                if up_to_date(task, inputs):
+                    logger.info(f"{name}: upstream unchanged, skipped")
+                    status[name] = SKIPPED
+                    continue
+                logger.info(f"{name}: running")
+                running[pool.submit(task.run)] = (name, inputs)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, inputs = running.pop(future)
+                try:
+                    future.result()
+                except Exception:
+                    logger.exception(f"{name}: failed")
+                    status[name] = FAILED
+                    continue
+                state.record(name, inputs)
+                status[name] = RAN
+    return status
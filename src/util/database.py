@@ -0,0 +1,268 @@
+import argparse
+import sqlite3
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+from src.common.archives import DATABASE_PATH
+from src.util.archive import ARCHIVE_PARTS, iter_archive
+from src.util.logger import get_logger
+from src.util.manifest import result_digest
+
+logger = get_logger("ArchiveDatabase")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifact_pieces (
+    artifact TEXT NOT NULL,
+    piece TEXT NOT NULL,
+    lore TEXT NOT NULL,
+    PRIMARY KEY (artifact, piece)
+);
+CREATE TABLE IF NOT EXISTS weapons (
+    name TEXT PRIMARY KEY,
+    lore TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS book_collections (
+    title TEXT PRIMARY KEY,
+    location TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS volumes (
+    collection TEXT NOT NULL REFERENCES book_collections (title) ON DELETE CASCADE,
+    number INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (collection, number)
+);
+CREATE TABLE IF NOT EXISTS quest_books (
+    title TEXT PRIMARY KEY,
+    location TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+-- digest of every stored record, so unchanged records are not written again
+CREATE TABLE IF NOT EXISTS records (
+    part TEXT NOT NULL,
+    key TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (part, key)
+);
+-- one row per searchable passage, part and key point back at the record
+CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5 (
+    part UNINDEXED,
+    key UNINDEXED,
+    title,
+    text,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# part -> (table, key column), deleting a record deletes its rows
+PART_TABLES: dict[str, tuple[str, str]] = {
+    "artifact": ("artifact_pieces", "artifact"),
+    "weapon": ("weapons", "name"),
+    "book_collection": ("book_collections", "title"),
+    "book_quest": ("quest_books", "title"),
+}
+
+
+@dataclass
+class Passage:
+    part: str
+    key: str
+    title: str
+    snippet: str
+
+
+class ArchiveDatabase:
+    """SQLite copy of the archive, one row per artifact piece, weapon, book
+    collection, volume and quest book\n
+    Every passage of text is also kept in a FTS5 index, so lore can be searched
+    without loading the JSON archive
+    """
+
+    def __init__(self, path: str | Path = DATABASE_PATH) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def _passages(self, part: str, key: str, record) -> Iterable[tuple[str, str]]:
+        if part == "artifact":
+            return record.items()
+        if part == "weapon":
+            return [(key, record)]
+        if part == "book_collection":
+            return [
+                (f"{record['title']} Vol. {i}", volume["text"])
+                for i, volume in enumerate(record["volumes"], start=1)
+            ]
+        return [(record["title"], record["text"])]
+
+    def _delete(self, part: str, key: str) -> None:
+        table, column = PART_TABLES[part]
+        self.conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (key,))
+        self.conn.execute(
+            "DELETE FROM passages WHERE part = ? AND key = ?", (part, key)
+        )
+        self.conn.execute("DELETE FROM records WHERE part = ? AND key = ?", (part, key))
+
+    def upsert(self, part: str, key: str, record) -> None:
+        """Replace the rows of one archive record
+
+        :param part: one of `ARCHIVE_PARTS`, e.g. "book_collection"
+        :param key: key of the record in the archive
+        :param record: record as found in the JSON archive
+        """
+        if part not in PART_TABLES:
+            raise ValueError(f"part must be one of {list(PART_TABLES)}")
+
+        with self.conn:
+            self._delete(part, key)
+            if part == "artifact":
+                self.conn.executemany(
+                    "INSERT INTO artifact_pieces VALUES (?, ?, ?)",
+                    [(key, piece, lore) for piece, lore in record.items()],
+                )
+            elif part == "weapon":
+                self.conn.execute("INSERT INTO weapons VALUES (?, ?)", (key, record))
+            elif part == "book_collection":
+                self.conn.execute(
+                    "INSERT INTO book_collections VALUES (?, ?)",
+                    (key, record["location"]),
+                )
+                self.conn.executemany(
+                    "INSERT INTO volumes VALUES (?, ?, ?, ?)",
+                    [
+                        (key, i, volume["description"], volume["text"])
+                        for i, volume in enumerate(record["volumes"], start=1)
+                    ],
+                )
+            else:
+                self.conn.execute(
+                    "INSERT INTO quest_books VALUES (?, ?, ?)",
+                    (key, record["location"], record["text"]),
+                )
+            self.conn.executemany(
+                "INSERT INTO passages (part, key, title, text) VALUES (?, ?, ?, ?)",
+                [
+                    (part, key, title, text)
+                    for title, text in self._passages(part, key, record)
+                ],
+            )
+            self.conn.execute(
+                "INSERT INTO records VALUES (?, ?, ?)",
+                (part, key, result_digest(record)),
+            )
+
+    def keys(self, part: str) -> set[str]:
+        """Keys of every stored record of a part
+
+        :param part: _description_
+        :return: _description_
+        """
+        table, column = PART_TABLES[part]
+        return {key for (key,) in self.conn.execute(f"SELECT {column} FROM {table}")}
+
+    def retain(self, part: str, keys: Iterable[str]) -> int:
+        """Drops records no longer in the archive
+
+        :param part: _description_
+        :param keys: keys of every current record of the part
+        :return: number of dropped records
+        """
+        dropped = self.keys(part) - set(keys)
+        with self.conn:
+            for key in dropped:
+                self._delete(part, key)
+        return len(dropped)
+
+    def digests(self, part: str) -> dict[str, str]:
+        """Digest of every stored record of a part
+
+        :param part: _description_
+        :return: {key: `result_digest` of the record}
+        """
+        rows = self.conn.execute(
+            "SELECT key, digest FROM records WHERE part = ?", (part,)
+        )
+        return dict(rows)
+
+    def import_archive(self, parts: Iterable[str] = ARCHIVE_PARTS) -> int:
+        """Bring the database up to date with the current archive, only new and
+        changed records are written and records no longer in the archive dropped
+
+        :param parts: _description_
+        :return: number of records written or dropped
+        """
+        count = 0
+        for part in parts:
+            stored = self.digests(part)
+            keys = []
+            for key, record in iter_archive(part):
+                if stored.get(key) != result_digest(record):
+                    self.upsert(part, key, record)
+                    count += 1
+                keys.append(key)
+            count += self.retain(part, keys)
+        return count
+
+    def search(
+        self, query: str, part: str | None = None, limit: int = 10
+    ) -> list[Passage]:
+        """Full-text search over every passage, best matches first
+
+        :param query: FTS5 query, e.g. `"dark sea" OR abyss`
+        :param part: only search this archive part
+        :param limit: _description_
+        :return: matching passages, with the match highlighted in `[...]`
+        """
+        sql = (
+            "SELECT part, key, title, snippet(passages, 3, '[', ']', '...', 16)"
+            " FROM passages WHERE passages MATCH ?"
+        )
+        params: list = [query]
+        if part is not None:
+            sql += " AND part = ?"
+            params.append(part)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return [Passage(*row) for row in self.conn.execute(sql, params)]
+
+    def optimize(self) -> None:
+        """Merge the FTS index segments, run after large imports"""
+        with self.conn:
+            self.conn.execute("INSERT INTO passages (passages) VALUES ('optimize')")
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the archive database")
+    parser.add_argument("--db", type=Path, default=DATABASE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("import", help="load the JSON archive into the database")
+    search = commands.add_parser("search", help="full-text search over lore")
+    search.add_argument("query")
+    search.add_argument("--part", choices=list(PART_TABLES))
+    search.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    database = ArchiveDatabase(args.db)
+    if args.command == "import":
+        count = database.import_archive()
+        if count:
+            database.optimize()
+        logger.info(f"{count} records written or dropped in {args.db}")
+    else:
+        start = time.perf_counter()
+        passages = database.search(args.query, args.part, args.limit)
+        for passage in passages:
+            print(f"{passage.part}/{passage.key} - {passage.title}")
+            print(f"    {passage.snippet}")
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.info(f"{len(passages)} passages in {elapsed:.1f} ms")
+    database.close()
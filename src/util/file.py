@@ -1,5 +1,9 @@
 import json
+import os
+import re
+from collections.abc import Iterable, Iterator
 from pathlib import Path
+from typing import IO
 
 
 def dump_to_json(obj, output_path: str | Path) -> None:
@@ -11,3 +15,60 @@ def dump_to_json(obj, output_path: str | Path) -> None:
 
     with open(output_path, "w") as fp:
         json.dump(obj, fp, indent=4, sort_keys=True)
+
+
+def _write_items(fp: IO[str], items: Iterable[tuple[str, object]], level: int) -> None:
+    indent = " " * 4 * (level + 1)
+    empty = True
+    for key, value in items:
+        fp.write("{\n" if empty else ",\n")
+        empty = False
+        fp.write(f"{indent}{json.dumps(key)}: ")
+        if isinstance(value, Iterator):
+            _write_items(fp, value, level + 1)
+        else:
+            text = json.dumps(value, indent=4, sort_keys=True)
+            fp.write(text.replace("\n", "\n" + indent))
+    fp.write("{}" if empty else "\n" + " " * 4 * level + "}")
+
+
+def dump_stream_to_json(
+    items: Iterable[tuple[str, object]], output_path: str | Path
+) -> None:
+    """Dump (key, value) pairs to json one at a time, formatted like `dump_to_json`\n
+    Values that are iterators of (key, value) pairs are streamed as nested objects
+
+    :param items: pairs, already sorted by key
+    :param output_path: _description_
+    """
+    with open(output_path, "w") as fp:
+        _write_items(fp, items, 0)
+
+
+def safe_file_name(title: str) -> str:
+    """File name for an item title, characters unsafe in paths become `_`
+
+    :param title: _description_
+    :return: _description_
+    """
+    return re.sub(r"[^\w\-. ]", "_", title).strip() or "untitled"
+
+
+def write_if_changed(path: str | Path, data: bytes) -> bool:
+    """Atomically replace a file, unless it already holds exactly `data`
+
+    :param path: _description_
+    :param data: _description_
+    :return: whether the file was written
+    """
+    path = Path(path)
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
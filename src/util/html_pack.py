@@ -0,0 +1,333 @@
+import atexit
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+
+from src.common.archives import HTML_PACK_PATH
+from src.util.logger import get_logger
+
+try:
+    import zstandard
+
+    DEFAULT_CODEC = "zstd"
+except ImportError:
+    zstandard = None
+    DEFAULT_CODEC = "gzip"
+
+# record: magic, url length, payload length, fetched_at, codec id, url, payload
+RECORD = struct.Struct("<4sIQdB")
+RECORD_MAGIC = b"GIPR"
+# trailer: index offset, magic, the index itself is gzipped json
+TRAILER = struct.Struct("<Q4s")
+TRAILER_MAGIC = b"GIPX"
+
+CODECS = {"gzip": 1, "zstd": 2}
+CODEC_NAMES = {value: name for name, value in CODECS.items()}
+
+
+@dataclass
+class PackEntry:
+    url: str
+    fetched_at: float
+    offset: int  # of the payload
+    length: int  # compressed
+    codec: str
+    digest: str  # sha256 of the html
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("page was packed with zstd, install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class HtmlPack:
+    """Single file archive of raw pages, each compressed on its own\n
+    Records are appended, the index of every record (by url and fetch time) is
+    written after the last one on `flush`. Pages are read back through `mmap`,
+    only the requested record is decompressed. Without a valid index, e.g.
+    after a crash, records are recovered by scanning the file
+    """
+
+    def __init__(self, path: str | Path = HTML_PACK_PATH, codec: str = DEFAULT_CODEC):
+        """
+        :param path: _description_
+        :param codec: "zstd" (if zstandard is installed) or "gzip"
+        """
+        if codec not in CODECS:
+            raise ValueError(f"codec must be one of {list(CODECS)}")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.codec = codec
+        self.logger = get_logger("HtmlPack")
+        self._lock = threading.Lock()
+        self._map: mmap.mmap | None = None
+        self._dirty = False
+
+        # every version of a page, oldest first
+        self.entries: dict[str, list[PackEntry]] = {}
+        self.path.touch(exist_ok=True)
+        self._file = open(self.path, "r+b")
+        self._end = self._load()
+
+    def _mmap(self) -> mmap.mmap | None:
+        if self._map is None and self._end:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _unmap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _load(self) -> int:
+        """Read the index, or scan the records if there is none
+
+        :return: offset new records are appended at
+        """
+        size = os.fstat(self._file.fileno()).st_size
+        if size >= TRAILER.size:
+            self._file.seek(size - TRAILER.size)
+            index_offset, magic = TRAILER.unpack(self._file.read(TRAILER.size))
+            if magic == TRAILER_MAGIC and index_offset <= size - TRAILER.size:
+                self._file.seek(index_offset)
+                raw = self._file.read(size - TRAILER.size - index_offset)
+                for item in json.loads(gzip.decompress(raw)):
+                    entry = PackEntry(**item)
+                    self.entries.setdefault(entry.url, []).append(entry)
+                return index_offset
+        return self._scan(size)
+
+    def _scan(self, size: int) -> int:
+        offset = 0
+        self._file.seek(0)
+        while offset + RECORD.size <= size:
+            header = self._file.read(RECORD.size)
+            magic, url_length, length, fetched_at, codec = RECORD.unpack(header)
+            end = offset + RECORD.size + url_length + length
+            if magic != RECORD_MAGIC or codec not in CODEC_NAMES or end > size:
+                break
+            url = self._file.read(url_length).decode("utf-8")
+            payload = self._file.read(length)
+            html = _decompress(payload, CODEC_NAMES[codec])
+            entry = PackEntry(
+                url=url,
+                fetched_at=fetched_at,
+                offset=offset + RECORD.size + url_length,
+                length=length,
+                codec=CODEC_NAMES[codec],
+                digest=hashlib.sha256(html).hexdigest(),
+            )
+            self.entries.setdefault(url, []).append(entry)
+            offset = end
+        if size:
+            self.logger.warning(f"No index in {self.path}, recovered by scanning")
+            self._dirty = True
+        return offset
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def latest(self, url: str) -> PackEntry | None:
+        versions = self.entries.get(url)
+        return versions[-1] if versions else None
+
+    def put(self, url: str, html: str, fetched_at: float | None = None) -> bool:
+        """Pack a page, unless it is the same as the latest packed version
+
+        :param url: _description_
+        :param html: _description_
+        :param fetched_at: unix time, defaults to now
+        :return: whether a record was added
+        """
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            latest = self.latest(url)
+            if latest is not None and latest.digest == digest:
+                return False
+
+            payload = _compress(data, self.codec)
+            encoded_url = url.encode("utf-8")
+            fetched_at = time.time() if fetched_at is None else fetched_at
+            header = RECORD.pack(
+                RECORD_MAGIC,
+                len(encoded_url),
+                len(payload),
+                fetched_at,
+                CODECS[self.codec],
+            )
+            self._unmap()
+            # overwrites the index, it is written again on flush
+            self._file.seek(self._end)
+            self._file.write(header + encoded_url + payload)
+            self._file.truncate()
+            entry = PackEntry(
+                url=url,
+                fetched_at=fetched_at,
+                offset=self._end + RECORD.size + len(encoded_url),
+                length=len(payload),
+                codec=self.codec,
+                digest=digest,
+            )
+            self._end = self._file.tell()
+            self.entries.setdefault(url, []).append(entry)
+            self._dirty = True
+            return True
+
+    def read(self, entry: PackEntry) -> str:
+        with self._lock:
+            if self._dirty:
+                self._file.flush()
+            payload = self._mmap()[entry.offset : entry.offset + entry.length]
+        return _decompress(payload, entry.codec).decode("utf-8")
+
+    def get(self, url: str, before: float | None = None) -> str | None:
+        """Packed html of a page
+
+        :param url: _description_
+        :param before: latest version fetched before this unix time, else the latest
+        :return: html, None when the page was never packed
+        """
+        versions = self.entries.get(url, [])
+        if before is not None:
+            versions = [entry for entry in versions if entry.fetched_at < before]
+        return self.read(versions[-1]) if versions else None
+
+    def iter_latest(self) -> Iterator[tuple[str, str]]:
+        """Latest version of every page, in file order
+
+        :return: (url, html) pairs
+        """
+        latest = sorted(
+            (versions[-1] for versions in self.entries.values()),
+            key=lambda entry: entry.offset,
+        )
+        for entry in latest:
+            yield entry.url, self.read(entry)
+
+    def _trailer(self, entries: dict[str, list[PackEntry]], end: int) -> bytes:
+        # the index of `entries`, written at `end`, and the trailer pointing at it
+        index = [asdict(entry) for versions in entries.values() for entry in versions]
+        raw = gzip.compress(json.dumps(index).encode("utf-8"), mtime=0)
+        return raw + TRAILER.pack(end, TRAILER_MAGIC)
+
+    def merge(self, other: "HtmlPack") -> int:
+        """Pack every version of the pages of another pack, e.g. of a worker process
+
+        :param other: _description_
+        :return: number of records added
+        """
+        versions = sorted(
+            (entry for entries in other.entries.values() for entry in entries),
+            key=lambda entry: entry.fetched_at,
+        )
+        return sum(
+            self.put(entry.url, other.read(entry), entry.fetched_at)
+            for entry in versions
+        )
+
+    def flush(self) -> None:
+        """Write the index after the last record and fsync"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._unmap()
+            self._file.seek(self._end)
+            self._file.write(self._trailer(self.entries, self._end))
+            self._file.truncate()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def compact(self) -> int:
+        """Drop every version of a page but the latest one, run when no scraper
+        is packing pages\n
+        Records are copied as they are, without compressing them again, to a new
+        file with its own index, which then replaces the pack
+
+        :return: number of dropped records
+        """
+        with self._lock:
+            latest = sorted(
+                (versions[-1] for versions in self.entries.values()),
+                key=lambda entry: entry.offset,
+            )
+            dropped = sum(map(len, self.entries.values())) - len(latest)
+            if not dropped:
+                return 0
+            if self._dirty:
+                self._file.flush()
+            source = self._mmap()
+            tmp = self.path.with_suffix(f"{self.path.suffix}.tmp")
+            entries: dict[str, list[PackEntry]] = {}
+            with open(tmp, "wb") as f:
+                for entry in latest:
+                    encoded_url = entry.url.encode("utf-8")
+                    header = RECORD.pack(
+                        RECORD_MAGIC,
+                        len(encoded_url),
+                        entry.length,
+                        entry.fetched_at,
+                        CODECS[entry.codec],
+                    )
+                    f.write(header + encoded_url)
+                    offset = f.tell()
+                    f.write(source[entry.offset : entry.offset + entry.length])
+                    entries[entry.url] = [replace(entry, offset=offset)]
+                end = f.tell()
+                f.write(self._trailer(entries, end))
+                f.flush()
+                os.fsync(f.fileno())
+            self._unmap()
+            self._file.close()
+            os.replace(tmp, self.path)
+            self._file = open(self.path, "r+b")
+            self.entries = entries
+            self._end = end
+            self._dirty = False
+        self.logger.info(f"Dropped {dropped} old page versions from {self.path}")
+        return dropped
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush()
+        self._unmap()
+        self._file.close()
+
+
+_html_pack: HtmlPack | None = None
+_html_pack_lock = threading.Lock()
+
+
+def get_html_pack() -> HtmlPack:
+    """Returns the pack shared by every scraper of the process
+
+    :return: _description_
+    """
+    global _html_pack
+    with _html_pack_lock:
+        if _html_pack is None:
+            _html_pack = HtmlPack()
+            atexit.register(_html_pack.close)
+        return _html_pack
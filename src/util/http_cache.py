@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from src.common.archives import CACHE_DIR
+from src.util.logger import get_logger
+
+
+@dataclass
+class CacheEntry:
+    """Metadata of one cached response"""
+
+    url: str
+    digest: str  # sha256 of the body, names the object file
+    size: int
+    fetched_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+
+    def conditional_headers(self) -> dict[str, str]:
+        """Headers to revalidate this entry with a conditional GET
+
+        :return: If-None-Match / If-Modified-Since headers
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def _sha256(data: str) -> str:
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _atomic_write(path: Path, data: str) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class HttpCache:
+    """Content-addressed on-disk response cache\n
+    `meta/<sha256(url)>.json` holds the validators of a url,
+    `objects/<sha256(body)>.html` holds the body, shared by urls with the same content
+    """
+
+    def __init__(
+        self,
+        root: str | Path = CACHE_DIR,
+        fresh_for: float = 0,
+        max_age: float | None = 30 * 24 * 3600,
+        max_bytes: int | None = 512 * 1024 * 1024,
+        prune: bool = True,
+    ) -> None:
+        """
+        :param root: cache directory
+        :param fresh_for: seconds an entry is served without revalidation
+        :param max_age: entries older than this are evicted, None keeps forever
+        :param max_bytes: total body size kept on disk, oldest evicted first
+        :param prune: evict on open, processes sharing the cache leave it to one
+            of them, writes are atomic so they can share it otherwise
+        """
+        self.root = Path(root)
+        self.meta_dir = self.root / "meta"
+        self.object_dir = self.root / "objects"
+        self.meta_dir.mkdir(parents=True, exist_ok=True)
+        self.object_dir.mkdir(parents=True, exist_ok=True)
+
+        self.fresh_for = fresh_for
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.logger = get_logger("HttpCache")
+        if prune:
+            self.prune()
+
+    def _meta_path(self, url: str) -> Path:
+        return self.meta_dir / f"{_sha256(url)}.json"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.object_dir / f"{digest}.html"
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        """Returns the cache entry of a url, if its body is on disk
+
+        :param url: _description_
+        :return: entry or None on a miss
+        """
+        try:
+            with open(self._meta_path(url), "r", encoding="utf-8") as f:
+                entry = CacheEntry(**json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+        if not self._object_path(entry.digest).exists():
+            return None
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched_at < self.fresh_for
+
+    def read(self, entry: CacheEntry) -> str:
+        """Reads the cached body of an entry
+
+        :param entry: _description_
+        :return: html as a string
+        """
+        with open(self._object_path(entry.digest), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def get(self, url: str) -> str | None:
+        """Cached body of a url regardless of freshness
+
+        :param url: _description_
+        :return: html, or None on a miss
+        """
+        entry = self.lookup(url)
+        return self.read(entry) if entry else None
+
+    def store(self, url: str, body: str, headers: dict[str, str] | None = None) -> None:
+        """Stores a response body and its validators
+
+        :param url: requested url
+        :param body: response body
+        :param headers: response headers
+        """
+        headers = headers or {}
+        digest = _sha256(body)
+        obj = self._object_path(digest)
+        if not obj.exists():
+            _atomic_write(obj, body)
+        entry = CacheEntry(
+            url=url,
+            digest=digest,
+            size=len(body.encode("utf-8")),
+            fetched_at=time.time(),
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+        )
+        _atomic_write(self._meta_path(url), json.dumps(asdict(entry)))
+
+    def touch(self, entry: CacheEntry) -> None:
+        """Marks an entry as just revalidated (304 Not Modified)
+
+        :param entry: _description_
+        """
+        entry.fetched_at = time.time()
+        _atomic_write(self._meta_path(entry.url), json.dumps(asdict(entry)))
+
+    def prune(self) -> None:
+        """Evicts entries past `max_age`, then oldest entries until under `max_bytes`,
+        then deletes bodies no entry refers to
+        """
+        now = time.time()
+        entries: list[tuple[Path, CacheEntry]] = []
+        for path in self.meta_dir.glob("*.json"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = CacheEntry(**json.load(f))
+            except (json.JSONDecodeError, TypeError):
+                path.unlink(missing_ok=True)
+                continue
+            if self.max_age is not None and now - entry.fetched_at > self.max_age:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((path, entry))
+
+        if self.max_bytes is not None:
+            entries.sort(key=lambda item: item[1].fetched_at, reverse=True)
+            total = 0
+            kept = []
+            for path, entry in entries:
+                total += entry.size
+                if total > self.max_bytes:
+                    path.unlink(missing_ok=True)
+                else:
+                    kept.append((path, entry))
+            entries = kept
+
+        referenced = {entry.digest for _, entry in entries}
+        evicted = 0
+        for obj in self.object_dir.glob("*.html"):
+            if obj.stem not in referenced:
+                obj.unlink(missing_ok=True)
+                evicted += 1
+        if evicted:
+            self.logger.info(f"Evicted {evicted} cached pages")
@@ -10,5 +10,5 @@ def get_logger(name: str = "GIArchive", verbose: bool = False):
     """
     logging.basicConfig()
     logger = logging.getLogger(name)
-    logger.setLevel(level=logging.INFO if not verbose else logging.debug)
+    logger.setLevel(level=logging.INFO if not verbose else logging.DEBUG)
     return logger
@@ -0,0 +1,177 @@
+import hashlib
+import json
+from collections.abc import Iterator
+from pathlib import Path
+
+from src.common.archives import MANIFEST_DIR
+from src.util.blob_store import BlobStore, get_blob_store, iter_refs
+from src.util.logger import get_logger
+from src.util.segment import SegmentFile
+
+
+def content_hash(html: str) -> str:
+    """Version of a page when no revision id is known
+
+    :param html: page html
+    :return: sha256 hex digest
+    """
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def result_digest(result) -> str:
+    """Digest of a deduplicated result, equal digests mean equal results
+
+    :param result: result as returned by `BlobStore.dedupe`
+    :return: sha256 hex digest
+    """
+    dumped = json.dumps(result, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(dumped.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """Per-category record of the version each link was last extracted from\n
+    Every extracted result is appended to `archive/manifest/<name>.jsonl` as soon
+    as it is known, as `{"link", "version", "key", "result"}`. Only the version,
+    key and file offset of each link stay in memory, results are read back one at
+    a time. A run that dies half way resumes from the last checkpoint, and
+    unchanged pages don't need to be parsed again\n
+    Long strings of a result are kept once in the shared `BlobStore`, results
+    only refer to them by hash, so comparing two results is comparing digests\n
+    Readers open it `readonly`, only the scraper owning the manifest writes it
+    """
+
+    def __init__(
+        self,
+        name: str,
+        root: str | Path = MANIFEST_DIR,
+        checkpoint_every: int = 16,
+        blobs: BlobStore | None = None,
+        readonly: bool = False,
+    ) -> None:
+        """
+        :param name: category name
+        :param root: manifest directory
+        :param checkpoint_every: results appended between two fsyncs
+        :param blobs: text store, defaults to the shared one
+        :param readonly: only read results, a scraper may be writing them
+        """
+        self.name = name
+        self.blobs = blobs if blobs is not None else get_blob_store(readonly)
+        self.logger = get_logger("Manifest")
+        self.segment = SegmentFile(
+            Path(root) / f"{name}.jsonl", checkpoint_every, readonly
+        )
+        self.entries: dict[str, dict] = {}
+        for offset, record in self.segment.scan():
+            result = record["result"]
+            # blobs are fsynced on their own, a crash can lose some
+            if not self.blobs.has_refs(result):
+                self.logger.warning(f"Missing text of {record['link']}, dropping it")
+                self.entries.pop(record["link"], None)
+                continue
+            self.entries[record["link"]] = {
+                "version": record["version"],
+                "key": record["key"],
+                "digest": record.get("digest") or result_digest(result),
+                "offset": offset,
+            }
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def is_current(self, link: str, version: str) -> bool:
+        """Whether a link was already extracted from this version of the page
+
+        :param link: _description_
+        :param version: revision id or `content_hash` of the page
+        :return: _description_
+        """
+        entry = self.entries.get(link)
+        return entry is not None and entry["version"] == version
+
+    def update(self, link: str, version: str, key: str, result) -> bool:
+        """Persists a freshly extracted result
+
+        :param link: _description_
+        :param version: revision id or `content_hash` of the page
+        :param key: key of the result in the archive
+        :param result: json serializable result
+        :return: whether the result differs from the one recorded before
+        """
+        result = self.blobs.dedupe(result)
+        digest = result_digest(result)
+        previous = self.entries.get(link)
+        changed = previous is None or previous["digest"] != digest
+        record = {
+            "link": link,
+            "version": version,
+            "key": key,
+            "digest": digest,
+            "result": result,
+        }
+        offset = self.segment.append(record)
+        self.entries[link] = {
+            "version": version,
+            "key": key,
+            "digest": digest,
+            "offset": offset,
+        }
+        return changed
+
+    def retain(self, links: list[str]) -> list[str]:
+        """Drops entries whose link is no longer listed
+
+        :param links: current links of the category
+        :return: dropped links
+        """
+        keep = set(links)
+        dropped = [link for link in self.entries if link not in keep]
+        for link in dropped:
+            del self.entries[link]
+        return dropped
+
+    def result(self, link: str):
+        """Recorded result of a link, read back from disk
+
+        :param link: _description_
+        :return: _description_
+        """
+        record = self.segment.read(self.entries[link]["offset"])
+        return self.blobs.rehydrate(record["result"])
+
+    def _sorted_entries(self) -> list[tuple[str, dict]]:
+        return sorted(self.entries.items(), key=lambda item: item[1]["key"])
+
+    def iter_results(self, rehydrate: bool = True) -> Iterator[tuple[str, object]]:
+        """Stream every recorded result, read back from disk one at a time
+
+        :param rehydrate: replace blob references with their text, else results
+            are left as stored
+        :return: (key, result) pairs sorted by key
+        """
+        for _, entry in self._sorted_entries():
+            result = self.segment.read(entry["offset"])["result"]
+            yield entry["key"], self.blobs.rehydrate(result) if rehydrate else result
+
+    def iter_refs(self) -> Iterator[str]:
+        """Every blob hash the live results refer to
+
+        :return: _description_
+        """
+        for entry in self.entries.values():
+            yield from iter_refs(self.segment.read(entry["offset"])["result"])
+
+    def save(self) -> None:
+        """Compact the segment down to the live results, sorted by key"""
+        # results must not outlive the text they refer to
+        self.blobs.checkpoint()
+        entries = self._sorted_entries()
+        offsets = self.segment.rewrite(
+            self.segment.read(entry["offset"]) for _, entry in entries
+        )
+        for (_, entry), offset in zip(entries, offsets):
+            entry["offset"] = offset
+
+    def close(self) -> None:
+        self.blobs.checkpoint()
+        self.segment.close()
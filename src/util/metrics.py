@@ -0,0 +1,235 @@
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+OTHER = "other"
+
+# stage timings of the item currently being extracted, per thread
+_item_stages = threading.local()
+
+
+@contextmanager
+def item_stage(stage: str) -> Iterator[None]:
+    """Time part of an extraction, picked up by `timed_call` (works in worker processes)
+
+    :param stage: e.g. "parse"
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = getattr(_item_stages, "stages", None)
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0) + time.perf_counter() - start
+
+
+def timed_call(fn: Callable, *args) -> tuple[object, dict[str, float]]:
+    """Call `fn`, returning the `item_stage` timings recorded during the call\n
+    "total" holds the duration of the whole call
+
+    :param fn: module level function, so it can run in a worker process
+    :return: result, {stage: seconds}
+    """
+    _item_stages.stages = {}
+    start = time.perf_counter()
+    try:
+        result = fn(*args)
+        stages = _item_stages.stages
+        stages["total"] = time.perf_counter() - start
+        return result, stages
+    finally:
+        _item_stages.stages = None
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0
+    rank = max(math.ceil(pct / 100 * len(samples)) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+class Metrics:
+    """Per category timings and counters of a scrape run\n
+    Stage timings (fetch, parse, extract, write) are kept as samples to report
+    percentiles, counters (pages, bytes, cache hits) as totals
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._samples: dict[tuple[str, str], list[float]] = defaultdict(list)
+        self._counters: dict[tuple[str, str], float] = defaultdict(float)
+        self._wall: dict[str, float] = defaultdict(float)
+        self._url_category: dict[str, str] = {}
+
+    def assign(self, urls: Iterable[str], category: str) -> None:
+        """Attribute the fetches of these urls to a category
+
+        :param urls: _description_
+        :param category: e.g. "artifact"
+        """
+        with self._lock:
+            for url in urls:
+                self._url_category[url] = category
+
+    def category_of(self, url: str) -> str:
+        return self._url_category.get(url, OTHER)
+
+    def observe(self, stage: str, seconds: float, category: str = OTHER) -> None:
+        with self._lock:
+            self._samples[(category, stage)].append(seconds)
+
+    def count(self, name: str, value: float = 1, category: str = OTHER) -> None:
+        with self._lock:
+            self._counters[(category, name)] += value
+
+    def record_fetch(
+        self, url: str, seconds: float, nbytes: int, cache_hit: bool
+    ) -> None:
+        """Record one page fetch
+
+        :param url: fetched url
+        :param seconds: latency, including revalidation
+        :param nbytes: response bytes downloaded
+        :param cache_hit: whether the body came from the cache
+        """
+        category = self.category_of(url)
+        self.observe("fetch", seconds, category)
+        self.count("pages", 1, category)
+        self.count("response_bytes", nbytes, category)
+        self.count("cache_hits" if cache_hit else "cache_misses", 1, category)
+
+    @contextmanager
+    def timer(self, stage: str, category: str = OTHER) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, category)
+
+    @contextmanager
+    def run(self, category: str) -> Iterator[None]:
+        """Time the whole run of a category, for pages/sec
+
+        :param category: _description_
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._wall[category] += time.perf_counter() - start
+
+    def samples(self, stage: str) -> list[float]:
+        """Every sample of a stage, across categories
+
+        :param stage: e.g. "fetch"
+        :return: sorted samples, seconds
+        """
+        with self._lock:
+            return sorted(
+                value
+                for (_, name), values in self._samples.items()
+                if name == stage
+                for value in values
+            )
+
+    def summary(self) -> dict:
+        """Aggregate every category
+
+        :return: {category: {"wall_seconds", "pages_per_sec", "counters", "stages"}}
+        """
+        with self._lock:
+            samples = {key: sorted(values) for key, values in self._samples.items()}
+            counters = dict(self._counters)
+            wall = dict(self._wall)
+
+        categories = {category for category, _ in [*samples, *counters]} | set(wall)
+        report = {}
+        for category in sorted(categories):
+            stages = {}
+            for (cat, stage), values in samples.items():
+                if cat != category:
+                    continue
+                stages[stage] = {
+                    "count": len(values),
+                    "total": sum(values),
+                    "p50": percentile(values, 50),
+                    "p90": percentile(values, 90),
+                    "p99": percentile(values, 99),
+                    "max": values[-1],
+                }
+            category_counters = {
+                name: value
+                for (cat, name), value in counters.items()
+                if cat == category
+            }
+            seconds = wall.get(category, 0)
+            pages = category_counters.get("pages", 0)
+            report[category] = {
+                "wall_seconds": seconds,
+                "pages_per_sec": pages / seconds if seconds else 0,
+                "counters": category_counters,
+                "stages": stages,
+            }
+        return report
+
+    def to_prometheus(self) -> str:
+        """Render the summary in the Prometheus text exposition format
+
+        :return: _description_
+        """
+        lines = []
+        summary = self.summary()
+        for category, report in summary.items():
+            label = f'category="{category}"'
+            lines.append(
+                f"giarchive_pages_per_second{{{label}}} {report['pages_per_sec']}"
+            )
+            lines.append(f"giarchive_run_seconds{{{label}}} {report['wall_seconds']}")
+            for name, value in sorted(report["counters"].items()):
+                lines.append(f"giarchive_{name}_total{{{label}}} {value}")
+            for stage, stats in sorted(report["stages"].items()):
+                stage_label = f'{label},stage="{stage}"'
+                for quantile in ("p50", "p90", "p99"):
+                    q = int(quantile[1:]) / 100
+                    lines.append(
+                        f'giarchive_stage_seconds{{{stage_label},quantile="{q}"}} '
+                        f"{stats[quantile]}"
+                    )
+                lines.append(
+                    f"giarchive_stage_seconds_sum{{{stage_label}}} {stats['total']}"
+                )
+                lines.append(
+                    f"giarchive_stage_seconds_count{{{stage_label}}} {stats['count']}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path: str | Path) -> None:
+        """Write the run report, Prometheus text for `.prom` files, else JSON
+
+        :param path: _description_
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            if path.suffix == ".prom":
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.summary(), f, indent=4, sort_keys=True)
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Returns the process-wide metrics registry
+
+    :return: _description_
+    """
+    return _metrics
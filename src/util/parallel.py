@@ -0,0 +1,27 @@
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor
+from typing import TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def imap_ordered(
+    pool: Executor, fn: Callable[[T], R], items: Iterable[T], window: int
+) -> Iterator[R]:
+    """Like `Executor.map`, but only `window` items are submitted ahead of the consumer
+
+    :param pool: thread or process pool
+    :param fn: function to run, module level for a process pool
+    :param items: inputs, consumed lazily
+    :param window: max submitted but not yet consumed items
+    :return: results in input order
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
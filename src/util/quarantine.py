@@ -0,0 +1,133 @@
+import hashlib
+import json
+import time
+import traceback
+from collections.abc import Iterable
+from pathlib import Path
+
+from src.common.archives import QUARANTINE_DIR
+from src.util.file import write_if_changed
+
+FETCH = "fetch"
+EXTRACT = "extract"
+
+
+def html_file_name(link: str) -> str:
+    """
+    :param link: _description_
+    :return: name of the saved html of a link, links whose slugs are the same
+        file name don't overwrite each other
+    """
+    return hashlib.sha256(link.encode("utf-8")).hexdigest()[:16]
+
+
+class Quarantine:
+    """Links of one manifest that failed to fetch or extract, set aside so the
+    rest of the batch completes\n
+    Entries are kept in `archive/quarantine/<name>.json` with the error and its
+    traceback, the html of pages that were fetched is saved next to it in
+    `archive/quarantine/<name>/`, named after a hash of the link, so a fixed
+    extractor can be retried on the exact page that broke it
+    """
+
+    def __init__(self, name: str, root: str | Path = QUARANTINE_DIR) -> None:
+        """
+        :param name: manifest name, e.g. "book_quest"
+        :param root: quarantine directory
+        """
+        self.name = name
+        self.path = Path(root) / f"{name}.json"
+        self.html_dir = Path(root) / name
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def __contains__(self, link: str) -> bool:
+        return link in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def links(self) -> list[str]:
+        return list(self.entries)
+
+    def add(
+        self,
+        link: str,
+        error: BaseException,
+        html: str | None = None,
+        stage: str = EXTRACT,
+    ) -> None:
+        """Record a failure, replacing an older one of the same link
+
+        :param link: _description_
+        :param error: _description_
+        :param html: page html, None when the page couldn't be fetched
+        :param stage: `FETCH` or `EXTRACT`
+        """
+        self._remove_html(link)
+        html_file = None
+        if html is not None:
+            self.html_dir.mkdir(parents=True, exist_ok=True)
+            html_file = f"{html_file_name(link)}.html"
+            write_if_changed(self.html_dir / html_file, html.encode("utf-8"))
+        self.entries[link] = {
+            "stage": stage,
+            "error": repr(error),
+            "traceback": "".join(traceback.format_exception(error)),
+            "html": html_file,
+            "failed_at": time.time(),
+        }
+
+    def html(self, link: str) -> str | None:
+        """Saved html of a quarantined link
+
+        :param link: _description_
+        :return: None when the link isn't quarantined or wasn't fetched
+        """
+        entry = self.entries.get(link)
+        if entry is None or entry["html"] is None:
+            return None
+        try:
+            return (self.html_dir / entry["html"]).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def _remove_html(self, link: str) -> None:
+        entry = self.entries.get(link)
+        if entry is not None and entry["html"] is not None:
+            (self.html_dir / entry["html"]).unlink(missing_ok=True)
+
+    def remove(self, link: str) -> bool:
+        """Release a link that was scraped successfully
+
+        :param link: _description_
+        :return: whether it was quarantined
+        """
+        if link not in self.entries:
+            return False
+        self._remove_html(link)
+        del self.entries[link]
+        return True
+
+    def retain(self, links: Iterable[str]) -> list[str]:
+        """Release links that are no longer listed
+
+        :param links: current links of the manifest
+        :return: released links
+        """
+        keep = set(links)
+        dropped = [link for link in self.entries if link not in keep]
+        for link in dropped:
+            self.remove(link)
+        return dropped
+
+    def save(self) -> None:
+        """Write the quarantine file, removed once nothing is quarantined"""
+        if not self.entries:
+            self.path.unlink(missing_ok=True)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(self.entries, indent=4, sort_keys=True)
+        write_if_changed(self.path, data.encode("utf-8"))
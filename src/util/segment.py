@@ -0,0 +1,152 @@
+import os
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from src.util.codec import dumps_json, loads_json
+from src.util.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:  # windows, writers go without the lock
+    fcntl = None
+
+
+class SegmentFile:
+    """Append-only JSON Lines file, one record per line\n
+    Records are flushed and fsynced every `checkpoint_every` appends, a torn
+    last line left by a crash is dropped when the file is scanned again\n
+    A single writer owns the file, it holds an exclusive lock on it and is the
+    only one repairing a torn tail. Read-only instances stop before an
+    incomplete last line, it may be a record a live writer is still appending
+    """
+
+    def __init__(
+        self, path: str | Path, checkpoint_every: int = 16, readonly: bool = False
+    ) -> None:
+        """
+        :param path: _description_
+        :param checkpoint_every: appends between two fsyncs
+        :param readonly: never write or truncate the file, a missing file reads
+            as empty
+        """
+        self.path = Path(path)
+        self.checkpoint_every = checkpoint_every
+        self.readonly = readonly
+        self.logger = get_logger("SegmentFile")
+        # end of the last complete record scanned
+        self.end = 0
+        self._uncommitted = 0
+        self._writer = None
+        self._reader = None
+        if readonly:
+            if self.path.exists():
+                self._reader = open(self.path, "rb")
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._open_writer()
+
+    def _open_writer(self) -> None:
+        self._writer = open(self.path, "ab")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._writer.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.logger.info(f"Waiting for another writer of {self.path}")
+                fcntl.flock(self._writer.fileno(), fcntl.LOCK_EX)
+        self._reader = open(self.path, "rb")
+
+    def scan(self, start: int = 0) -> Iterator[tuple[int, dict]]:
+        """Read every complete record, the writer truncates a torn tail
+
+        :param start: offset to scan from, e.g. `end` to read records appended
+            since the last scan
+        :return: (offset, record) pairs in file order
+        """
+        if self._reader is None and self.readonly and self.path.exists():
+            self._reader = open(self.path, "rb")
+        if self._reader is None:
+            return
+        self._reader.seek(start)
+        offset = start
+        for line in self._reader:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("torn line")
+                record = loads_json(line)
+            except ValueError:
+                if self.readonly:
+                    break
+                self.logger.warning(f"Dropping torn record at {self.path}:{offset}")
+                self._writer.truncate(offset)
+                # appends land at the end of the file, offsets come from tell()
+                self._writer.seek(offset)
+                break
+            offset += len(line)
+            self.end = offset
+            yield offset - len(line), record
+
+    def _check_writable(self) -> None:
+        if self.readonly:
+            raise PermissionError(f"{self.path} is opened read-only")
+
+    def append(self, record: dict) -> int:
+        """Append a record, fsync if a checkpoint is due
+
+        :param record: json serializable record
+        :return: offset of the record
+        """
+        self._check_writable()
+        offset = self._writer.tell()
+        line = dumps_json(record) + b"\n"
+        self._writer.write(line)
+        self._uncommitted += 1
+        if self._uncommitted >= self.checkpoint_every:
+            self.checkpoint()
+        return offset
+
+    def read(self, offset: int) -> dict:
+        """Read the record at an offset returned by `append` or `scan`
+
+        :param offset: _description_
+        :return: record
+        """
+        if self._writer is not None:
+            self._writer.flush()
+        self._reader.seek(offset)
+        return loads_json(self._reader.readline())
+
+    def checkpoint(self) -> None:
+        """Make every appended record durable"""
+        if self._writer is None:
+            return
+        self._writer.flush()
+        os.fsync(self._writer.fileno())
+        self._uncommitted = 0
+
+    def rewrite(self, records: Iterable[dict]) -> list[int]:
+        """Atomically replace the file with `records`, e.g. only live records
+
+        :param records: records to keep, may be read lazily from this file
+        :return: new offset of every record, in order
+        """
+        self._check_writable()
+        tmp = self.path.with_suffix(f"{self.path.suffix}.tmp")
+        offsets = []
+        with open(tmp, "wb") as f:
+            for record in records:
+                offsets.append(f.tell())
+                f.write(dumps_json(record) + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(tmp, self.path)
+        self._open_writer()
+        self.end = self._writer.tell()
+        return offsets
+
+    def close(self) -> None:
+        self.checkpoint()
+        # closing the writer releases its lock
+        for f in (self._writer, self._reader):
+            if f is not None:
+                f.close()
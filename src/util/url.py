@@ -13,3 +13,16 @@ def extract_slug(link: str) -> str:
     decoded = unquote(last_part)
     slug = decoded.replace("_", " ")
     return slug
+
+
+def link_title(link: str) -> str:
+    """Wiki page title of a url, subpages included\n
+    Example: https://genshin-impact.fandom.com/wiki/Artifact/Sets\n
+    Returns: Artifact/Sets
+
+    :param link: _description_
+    :return: title, as listed by the MediaWiki api
+    """
+    path = unquote(urlparse(link).path)
+    # language editions live under a prefix, e.g. /fr/wiki/
+    return path.split("/wiki/", 1)[-1].replace("_", " ")
@@ -0,0 +1,266 @@
+import json
+import sqlite3
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from src.common.archives import QUEUE_PATH
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"  # result waiting to be collected
+COLLECTED = "collected"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    queue TEXT NOT NULL,
+    link TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    version TEXT,
+    key TEXT,
+    result TEXT,
+    error TEXT,
+    PRIMARY KEY (queue, link)
+);
+CREATE INDEX IF NOT EXISTS items_claim ON items (queue, state, lease_expires);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    host TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class WorkQueue:
+    """Links to scrape, claimed by worker processes with time limited leases\n
+    A worker that dies keeps its items until the lease expires, they are then
+    handed out again. Results are stored with the item, in the same transaction
+    that marks it done, and collected later by a single writer
+    """
+
+    def __init__(self, path: str | Path = QUEUE_PATH, max_attempts: int = 3):
+        """
+        :param path: SQLite database, shared by every worker
+        :param max_attempts: claims of an item before it is marked failed
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def _transaction(self):
+        # take the write lock up front, so two workers can't claim the same rows
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def enqueue(self, queue: str, links: Iterable[str]) -> int:
+        """Add links not queued yet, finished links are queued again, and links
+        no longer listed are dropped
+
+        :param queue: e.g. "book_collection"
+        :param links: every current link of the queue
+        :return: number of links (re)queued
+        """
+        links = list(dict.fromkeys(links))
+        conn = self._transaction()
+        try:
+            conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS listed (link TEXT PRIMARY KEY)"
+            )
+            conn.execute("DELETE FROM listed")
+            conn.executemany(
+                "INSERT INTO listed VALUES (?)", [(link,) for link in links]
+            )
+            conn.execute(
+                "DELETE FROM items WHERE queue = ? AND link NOT IN listed", (queue,)
+            )
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO items (queue, link) VALUES (?, ?)",
+                [(queue, link) for link in links],
+            )
+            conn.execute(
+                "UPDATE items SET state = ?, attempts = 0, error = NULL"
+                " WHERE queue = ? AND state IN (?, ?)",
+                (PENDING, queue, COLLECTED, FAILED),
+            )
+            queued = conn.total_changes - before
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return queued
+
+    def claim(
+        self, queue: str, owner: str, count: int = 8, lease_seconds: float = 300
+    ) -> list[str]:
+        """Lease pending items, and items whose lease expired
+
+        :param queue: _description_
+        :param owner: worker id
+        :param count: items to claim
+        :param lease_seconds: how long the items are reserved for `owner`
+        :return: claimed links, empty when nothing is claimable right now
+        """
+        now = time.time()
+        conn = self._transaction()
+        try:
+            # expired items out of attempts are given up on
+            conn.execute(
+                "UPDATE items SET state = ?, error = coalesce(error, 'lease expired')"
+                " WHERE queue = ? AND state = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, queue, LEASED, now, self.max_attempts),
+            )
+            links = [
+                link
+                for (link,) in conn.execute(
+                    "SELECT link FROM items WHERE queue = ?"
+                    " AND (state = ? OR (state = ? AND lease_expires < ?))"
+                    " ORDER BY attempts, link LIMIT ?",
+                    (queue, PENDING, LEASED, now, count),
+                )
+            ]
+            conn.executemany(
+                "UPDATE items SET state = ?, owner = ?, lease_expires = ?,"
+                " attempts = attempts + 1 WHERE queue = ? AND link = ?",
+                [(LEASED, owner, now + lease_seconds, queue, link) for link in links],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return links
+
+    def renew(
+        self, queue: str, owner: str, links: Iterable[str], lease_seconds: float = 300
+    ) -> None:
+        """Extend the lease of items still being worked on"""
+        expires = time.time() + lease_seconds
+        self.conn.executemany(
+            "UPDATE items SET lease_expires = ?"
+            " WHERE queue = ? AND link = ? AND owner = ? AND state = ?",
+            [(expires, queue, link, owner, LEASED) for link in links],
+        )
+
+    def complete(
+        self, queue: str, owner: str, link: str, version: str, key: str, result
+    ) -> bool:
+        """Store the result of an item and mark it done
+
+        :param queue: _description_
+        :param owner: worker id, the item must still be leased to it
+        :param link: _description_
+        :param version: `content_hash` of the page
+        :param key: key of the result in the archive
+        :param result: json serializable result
+        :return: False when the lease was lost to another worker
+        """
+        cursor = self.conn.execute(
+            "UPDATE items SET state = ?, version = ?, key = ?, result = ?, error = NULL"
+            " WHERE queue = ? AND link = ? AND owner = ? AND state = ?",
+            (DONE, version, key, json.dumps(result), queue, link, owner, LEASED),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, queue: str, owner: str, link: str, error: str) -> None:
+        """Give an item back, or give up on it after `max_attempts`"""
+        self.conn.execute(
+            "UPDATE items SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+            " error = ? WHERE queue = ? AND link = ? AND owner = ? AND state = ?",
+            (self.max_attempts, FAILED, PENDING, error, queue, link, owner, LEASED),
+        )
+
+    def results(self, queue: str) -> Iterator[tuple[str, str, str, object]]:
+        """Results waiting to be collected, one at a time
+
+        :param queue: _description_
+        :return: (link, version, key, result)
+        """
+        rows = self.conn.execute(
+            "SELECT link, version, key, result FROM items WHERE queue = ? AND state = ?",
+            (queue, DONE),
+        )
+        for link, version, key, result in rows:
+            yield link, version, key, json.loads(result)
+
+    def reserve(self, host: str, rate: float, burst: float = 1) -> float:
+        """Take a request token of a host, from a bucket every worker of the queue
+        shares, possibly ahead of time
+
+        :param host: host or policy scope
+        :param rate: requests per second, for all the workers together
+        :param burst: _description_
+        :return: seconds to wait before using the token
+        """
+        now = time.time()
+        conn = self._transaction()
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_limits WHERE host = ?", (host,)
+            ).fetchone()
+            tokens = (
+                burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            )
+            tokens -= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?)",
+                (host, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return 0 if tokens >= 0 else -tokens / rate
+
+    def mark_collected(self, queue: str, links: Iterable[str]) -> None:
+        self.conn.executemany(
+            "UPDATE items SET state = ?, result = NULL"
+            " WHERE queue = ? AND link = ? AND state = ?",
+            [(COLLECTED, queue, link, DONE) for link in links],
+        )
+
+    def links(self, queue: str) -> list[str]:
+        return [
+            link
+            for (link,) in self.conn.execute(
+                "SELECT link FROM items WHERE queue = ?", (queue,)
+            )
+        ]
+
+    def failures(self, queue: str) -> list[tuple[str, str]]:
+        """
+        :return: (link, error) of every item given up on
+        """
+        return self.conn.execute(
+            "SELECT link, error FROM items WHERE queue = ? AND state = ?",
+            (queue, FAILED),
+        ).fetchall()
+
+    def counts(self, queue: str) -> dict[str, int]:
+        """
+        :return: number of items in every state
+        """
+        rows = self.conn.execute(
+            "SELECT state, count(*) FROM items WHERE queue = ? GROUP BY state",
+            (queue,),
+        )
+        return dict(rows.fetchall())
+
+    def unfinished(self, queue: str) -> int:
+        """Items pending or leased, a worker stops once there are none
+
+        :param queue: _description_
+        :return: _description_
+        """
+        counts = self.counts(queue)
+        return counts.get(PENDING, 0) + counts.get(LEASED, 0)
+
+    def close(self) -> None:
+        self.conn.close()
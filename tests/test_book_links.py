@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from src.common.archives import DataPaths
+from src.scraper.book_scraper import BookScraper
+from src.scraper.link_scraper import load_book_links
+
+
+def test_mismatched_book_links_fail_before_touching_the_manifest(tmp_path):
+    paths = DataPaths(tmp_path)
+    paths.makedirs()
+    # layout of an older link scraper
+    links = {"book": ["https://example.org/wiki/A"], "quest": []}
+    (paths.links_dir / "book.json").write_text(json.dumps(links))
+    paths.manifest_dir.mkdir(parents=True)
+    manifest = paths.manifest_dir / "book_collection.jsonl"
+    manifest.write_text('{"link": "https://example.org/wiki/A"}\n')
+
+    with pytest.raises(ValueError, match="don't match"):
+        load_book_links(paths.links_dir)
+    scraper = BookScraper(offline=True, parse_workers=0)
+    scraper.paths = paths
+    with pytest.raises(ValueError):
+        scraper.run()
+    assert manifest.read_text() == '{"link": "https://example.org/wiki/A"}\n'
+    assert not (paths.json_dir / "book.json").exists()
+
+
+def test_book_links_by_kind(tmp_path):
+    links = {"collection": ["https://example.org/wiki/A"], "quest": []}
+    (tmp_path / "book.json").write_text(json.dumps(links))
+    assert load_book_links(tmp_path) == links
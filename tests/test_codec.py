@@ -0,0 +1,86 @@
+import pytest
+
+from src.common.book_type import BookArchive, BookCollection, QuestBook, Volume
+from src.util import codec
+from src.util.codec import (
+    codec_of,
+    from_record,
+    get_codec,
+    iter_stream,
+    to_record,
+    write_stream,
+)
+
+BOOKS = BookArchive(
+    book_collections=[
+        BookCollection(
+            title="Heart of Clear Springs",
+            location="Mondstadt",
+            volumes=[Volume("first", "Lá la\nlé"), Volume("", "")],
+        ),
+        BookCollection(title="Empty", location="", volumes=[]),
+    ],
+    quest_books=[QuestBook(title="Note", location="Liyue", text="你好")],
+)
+
+CODECS = [
+    "json",
+    pytest.param(
+        "msgpack",
+        marks=pytest.mark.skipif(codec.msgpack is None, reason="needs msgpack"),
+    ),
+]
+
+
+def test_records_round_trip():
+    record = to_record(BOOKS)
+    assert record["book_collections"][0]["volumes"][0] == {
+        "description": "first",
+        "text": "Lá la\nlé",
+    }
+    assert from_record(BookArchive, record) == BOOKS
+
+    collection = BOOKS.book_collections[0]
+    assert from_record(BookCollection, to_record(collection)) == collection
+    volume = collection.volumes[0]
+    assert from_record(Volume, to_record(volume)) == volume
+    assert from_record(list[Volume], to_record(collection.volumes)) == (
+        collection.volumes
+    )
+    # records are decoded into new objects, nothing is shared
+    assert from_record(BookCollection, to_record(collection)) is not collection
+
+    with pytest.raises(TypeError):
+        to_record({1, 2})
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_stream_round_trip(tmp_path, name):
+    fmt = get_codec(name)
+    path = tmp_path / f"books{fmt.suffix}"
+    frames = [["book_collection", to_record(book)] for book in BOOKS.book_collections]
+    frames.append(["book_quest", to_record(BOOKS.quest_books[0])])
+
+    # dataclasses are encoded as their records
+    assert write_stream(path, iter(BOOKS.book_collections), fmt) == 2
+    assert list(iter_stream(path)) == [record for _, record in frames[:2]]
+
+    assert write_stream(path, frames, fmt) == 3
+    assert list(iter_stream(path, fmt)) == frames
+    assert [path.name for path in tmp_path.iterdir()] == [path.name]
+    assert fmt.loads(fmt.dumps(frames[0])) == frames[0]
+
+
+def test_stdlib_json_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(codec, "orjson", None)
+    path = tmp_path / "books.jsonl"
+    write_stream(path, BOOKS.book_collections, get_codec("json"))
+    assert path.read_text(encoding="utf-8").splitlines()[0].startswith('{"title"')
+    assert [from_record(BookCollection, r) for r in iter_stream(path)] == (
+        BOOKS.book_collections
+    )
+
+
+def test_unknown_suffix():
+    with pytest.raises(ValueError):
+        codec_of("books.csv")
@@ -0,0 +1,95 @@
+import pytest
+
+from src.util.dag import BLOCKED, FAILED, RAN, SKIPPED, Task, run_dag
+
+
+@pytest.fixture
+def files(tmp_path):
+    source, result = tmp_path / "source.txt", tmp_path / "result.txt"
+    source.write_text("v1")
+    return tmp_path, source, result
+
+
+def pipeline(source, result, ran: list[str], remote: bool = False) -> list[Task]:
+    def write():
+        ran.append("write")
+        result.write_text(source.read_text().upper())
+
+    return [
+        Task("source", run=lambda: ran.append("source"), outputs=(source,)),
+        Task("write", run=write, deps=("source",), outputs=(result,), remote=remote),
+    ]
+
+
+def test_unchanged_upstream_is_skipped(files):
+    root, source, result = files
+    state = root / "run_state.json"
+    ran = []
+    assert run_dag(pipeline(source, result, ran), state, since_last_run=True) == {
+        "source": RAN,
+        "write": RAN,
+    }
+
+    ran.clear()
+    status = run_dag(pipeline(source, result, ran), state, since_last_run=True)
+    # tasks without dependencies always run
+    assert ran == ["source"] and status["write"] == SKIPPED
+
+    # without the flag everything runs
+    ran.clear()
+    run_dag(pipeline(source, result, ran), state)
+    assert ran == ["source", "write"]
+
+
+def test_changed_upstream_or_missing_output_runs(files):
+    root, source, result = files
+    state = root / "run_state.json"
+    run_dag(pipeline(source, result, []), state, since_last_run=True)
+
+    source.write_text("v2")
+    ran = []
+    run_dag(pipeline(source, result, ran), state, since_last_run=True)
+    assert ran == ["source", "write"] and result.read_text() == "V2"
+
+    result.unlink()
+    ran.clear()
+    run_dag(pipeline(source, result, ran), state, since_last_run=True)
+    assert ran == ["source", "write"]
+
+
+def test_remote_tasks_always_run(files):
+    root, source, result = files
+    state = root / "run_state.json"
+    run_dag(pipeline(source, result, [], remote=True), state, since_last_run=True)
+    ran = []
+    status = run_dag(
+        pipeline(source, result, ran, remote=True), state, since_last_run=True
+    )
+    assert ran == ["source", "write"] and status["write"] == RAN
+
+
+def test_failures_block_dependents(tmp_path):
+    def fail():
+        raise RuntimeError("boom")
+
+    ran = []
+    tasks = [
+        Task("a", run=fail),
+        Task("b", run=lambda: ran.append("b"), deps=("a",)),
+        Task("c", run=lambda: ran.append("c")),
+    ]
+    status = run_dag(tasks, tmp_path / "run_state.json")
+    assert status == {"a": FAILED, "b": BLOCKED, "c": RAN} and ran == ["c"]
+
+
+def test_dry_run_and_cycles(tmp_path):
+    ran = []
+    tasks = [Task("a", run=lambda: ran.append("a"))]
+    assert run_dag(tasks, tmp_path / "run_state.json", dry_run=True) == {"a": SKIPPED}
+    assert ran == []
+
+    with pytest.raises(ValueError):
+        run_dag(
+            [Task("a", run=print, deps=("b",)), Task("b", run=print, deps=("a",))],
+            tmp_path / "run_state.json",
+        )
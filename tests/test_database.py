@@ -0,0 +1,77 @@
+import pytest
+
+from src.util import database as db
+from src.util.database import ArchiveDatabase
+
+COLLECTION = {
+    "title": "Tales",
+    "location": "Liyue",
+    "volumes": [
+        {"description": "first", "text": "the dark sea swallowed the ship"},
+        {"description": "second", "text": "the abyss answered"},
+    ],
+}
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = ArchiveDatabase(tmp_path / "archive.db")
+    yield database
+    database.close()
+
+
+def test_upsert_replaces_rows(database):
+    database.upsert("book_collection", "Tales", COLLECTION)
+    rows = database.conn.execute("SELECT number, text FROM volumes").fetchall()
+    assert [number for number, _ in rows] == [1, 2]
+
+    changed = dict(COLLECTION, volumes=COLLECTION["volumes"][:1])
+    database.upsert("book_collection", "Tales", changed)
+    assert database.conn.execute("SELECT count(*) FROM volumes").fetchone() == (1,)
+    assert [p.title for p in database.search("abyss")] == []
+    assert [p.title for p in database.search("sea")] == ["Tales Vol. 1"]
+
+    with pytest.raises(ValueError):
+        database.upsert("character", "Lumine", {})
+
+
+def test_retain_drops_missing_records(database):
+    database.upsert("weapon", "Rust", "an old bow")
+    database.upsert("weapon", "Favonius", "a knight's sword")
+    assert database.retain("weapon", ["Rust"]) == 1
+    assert database.keys("weapon") == {"Rust"}
+    assert database.digests("weapon").keys() == {"Rust"}
+    assert database.search("knight") == []
+
+
+def test_search(database):
+    database.upsert("artifact", "Gladiator", {"Flower": "a knight of old"})
+    database.upsert("weapon", "Favonius", "sword of the knights of Favonius")
+    database.upsert("book_collection", "Tales", COLLECTION)
+
+    passages = database.search("knight*")
+    assert {(p.part, p.key, p.title) for p in passages} == {
+        ("artifact", "Gladiator", "Flower"),
+        ("weapon", "Favonius", "Favonius"),
+    }
+    (passage,) = database.search('"dark sea"', part="book_collection")
+    assert passage.key == "Tales" and "[dark sea]" in passage.snippet
+    assert database.search("knight*", part="book_quest") == []
+    assert len(database.search("knight*", limit=1)) == 1
+
+
+def test_import_only_writes_changes(database, monkeypatch):
+    archive = {
+        "weapon": {"Rust": "an old bow", "Favonius": "a knight's sword"},
+        "book_collection": {"Tales": COLLECTION},
+    }
+    monkeypatch.setattr(
+        db, "iter_archive", lambda part: iter(archive.get(part, {}).items())
+    )
+    assert database.import_archive() == 3
+    assert database.import_archive() == 0
+
+    archive["weapon"] = {"Rust": "a new bow"}
+    assert database.import_archive() == 2
+    assert database.keys("weapon") == {"Rust"}
+    assert database.search("new")[0].key == "Rust"
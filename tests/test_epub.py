@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.export import epub
+
+ARCHIVE = {
+    "artifact": {"Set": {"Flower": "petal"}},
+    "weapon": {"Sword": "sharp"},
+    "book_collection": {
+        "Tales": {
+            "title": "Tales",
+            "location": "Liyue",
+            "volumes": [{"description": "first", "text": "once upon"}],
+        },
+        "Songs": {
+            "title": "Songs",
+            "location": "Mondstadt",
+            "volumes": [{"description": "", "text": "la la"}],
+        },
+    },
+    "book_quest": {"Note": {"title": "Note", "location": "", "text": "hello"}},
+}
+
+
+def use_archive(monkeypatch, archive):
+    monkeypatch.setattr(
+        epub, "iter_archive", lambda part: iter(archive.get(part, {}).items())
+    )
+
+
+def test_rebuilding_is_byte_identical(tmp_path, monkeypatch):
+    use_archive(monkeypatch, ARCHIVE)
+    path = tmp_path / "book.epub"
+    parts = ["book_collection", "book_quest"]
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert epub.build_book(path, "Books", lambda: epub._stream(parts), pool, 4)
+        first = path.read_bytes()
+        # up to date, left alone
+        assert not epub.build_book(path, "Books", lambda: epub._stream(parts), pool, 4)
+
+        path.unlink()
+        assert epub.build_book(path, "Books", lambda: epub._stream(parts), pool, 4)
+        assert path.read_bytes() == first
+
+
+def test_stale_books_are_removed(tmp_path, monkeypatch):
+    use_archive(monkeypatch, ARCHIVE)
+    epub.export_epub("library", tmp_path, workers=1)
+    epub.export_epub("collection", tmp_path, workers=1)
+    # the library book of the previous split is gone
+    assert {path.name for path in tmp_path.glob("*.epub")} == {
+        "artifact.epub",
+        "weapon.epub",
+        "book.epub",
+        "Tales.epub",
+        "Songs.epub",
+    }
+
+    archive = dict(
+        ARCHIVE, book_collection={"Tales": ARCHIVE["book_collection"]["Tales"]}
+    )
+    use_archive(monkeypatch, archive)
+    assert epub.export_epub("collection", tmp_path, workers=1) == []
+    assert not (tmp_path / "Songs.epub").exists()
+    assert (tmp_path / "Tales.epub").exists()
@@ -0,0 +1,215 @@
+from bs4 import BeautifulSoup
+
+from src.bench.mock_wiki import (
+    _article,
+    _heading,
+    _infobox,
+    _paragraphs,
+    artifact_page,
+    collection_page,
+    quest_page,
+    weapon_page,
+)
+from src.common.book_type import BookCollection, QuestBook, Volume
+from src.scraper.artifact_scraper import extract_artifact
+from src.scraper.book_scraper import extract_collection, extract_quest
+from src.scraper.weapon_scraper import extract_weapon
+
+# the sibling loops the extraction rules replaced, as they were in the scrapers
+
+
+def _location(soup: BeautifulSoup) -> str:
+    container = soup.find(
+        "div",
+        class_="pi-item pi-data pi-item-spacing pi-border-color",
+        attrs={"data-source": "region_location"},
+    )
+    if not container:
+        return ""
+    return container.find("div", class_="pi-data-value").get_text(" ", strip=True)
+
+
+def _description(sib) -> str | None:
+    if sib.name == "div" and "description-wrapper" in sib.get("class", []):
+        desc_el = sib.find("div", class_="description-content")
+        return desc_el.get_text(strip=True) if desc_el else ""
+    return None
+
+
+def sibling_artifact(html: str) -> dict[str, str]:
+    soup = BeautifulSoup(html, "html.parser")
+    lore_h2 = soup.find("span", id="Lore").find_parent("h2")
+    result = {}
+    for elem in lore_h2.find_next_siblings():
+        if elem.name == "h2":
+            break
+        if elem.name != "h3":
+            continue
+        title_span = elem.find("span", class_="mw-headline")
+        if not title_span:
+            continue
+        texts = []
+        for sibling in elem.find_next_siblings():
+            if sibling.name in ("h2", "h3"):
+                break
+            if sibling.name == "div" and "description-wrapper" in sibling.get(
+                "class", []
+            ):
+                continue
+            if sibling.name == "p":
+                texts.append(sibling.get_text(strip=True))
+            elif sibling.get_text(strip=True):
+                texts.append(sibling.get_text(" ", strip=True))
+        result[title_span.get_text(strip=True)] = "\n".join(texts)
+    return result
+
+
+def sibling_collection(title: str, html: str) -> BookCollection:
+    soup = BeautifulSoup(html, "html.parser")
+    volumes = []
+    for h2 in soup.find_all("h2"):
+        headline_span = h2.find("span", class_="mw-headline")
+        if not headline_span:
+            continue
+        h2_text = headline_span.get_text(strip=True).lower()
+        if "version" in h2_text:
+            texts, description, first_h3 = [], "", True
+            for sib in h2.find_next_siblings():
+                if sib.name == "h2":
+                    break
+                if sib.name == "h3":
+                    if first_h3:
+                        first_h3 = False
+                    else:
+                        volumes.append(Volume(description, "\n".join(texts)))
+                        texts, description = [], ""
+                if _description(sib) is not None:
+                    description = _description(sib)
+                if sib.name == "p":
+                    texts.append(sib.get_text(separator="\n", strip=True))
+        elif "vol" in h2_text:
+            texts, description = [], ""
+            for sib in h2.find_next_siblings():
+                if sib.name == "h2":
+                    break
+                if _description(sib) is not None:
+                    description = _description(sib)
+                if sib.name == "p":
+                    texts.append(sib.get_text(separator="\n", strip=True))
+            volumes.append(Volume(description, "\n".join(texts)))
+    return BookCollection(title=title, location=_location(soup), volumes=volumes)
+
+
+def sibling_quest(title: str, html: str) -> QuestBook:
+    soup = BeautifulSoup(html, "html.parser")
+    text_h2 = soup.find("span", id="Text").find_parent("h2")
+    texts = []
+    for sib in text_h2.find_next_siblings():
+        if sib.name == "h2":
+            break
+        if sib.name == "p":
+            texts.append(sib.get_text(separator="\n", strip=True))
+    return QuestBook(title=title, location=_location(soup), text="\n".join(texts))
+
+
+def link(title: str) -> str:
+    return f"https://genshin-impact.fandom.com/wiki/{title.replace(' ', '_')}"
+
+
+def description(text: str) -> str:
+    return (
+        '<div class="description-wrapper"><div class="description-content">'
+        f"{text}</div></div>"
+    )
+
+
+def test_artifact_matches_the_sibling_loop():
+    for name in ("Gladiator's Finale", "Wanderer's Troupe"):
+        html = artifact_page(name)
+        key, pieces = extract_artifact(link(name), html)
+        assert key == name and len(pieces) == 2
+        assert pieces == sibling_artifact(html)
+
+
+def test_artifact_skips_stats_but_keeps_other_text():
+    html = _article(
+        [
+            _heading(2, "Lore"),
+            _heading(3, "Flower"),
+            '<div class="description-wrapper">HP +4780</div>',
+            "<p>First line</p><div><b>quoted</b> <i>verse</i></div>",
+            _heading(3, "Plume"),
+            "<p>Only <a>line</a></p>",
+            _heading(2, "Gallery"),
+            "<p>not lore</p>",
+        ]
+    )
+    _, pieces = extract_artifact(link("Set"), html)
+    assert pieces == {"Flower": "First line\nquoted verse", "Plume": "Onlyline"}
+    assert pieces == sibling_artifact(html)
+
+
+def test_collection_matches_the_sibling_loop():
+    for name in ("Heart of Clear Springs", "Vera's Melancholy", "Toki Alley Tales"):
+        html = collection_page(name)
+        title, book = extract_collection(link(name), html)
+        assert title == name and book.volumes
+        assert book == sibling_collection(name, html)
+
+
+def test_collection_version_headings():
+    html = _article(
+        [
+            _infobox("Liyue"),
+            _heading(2, "Vol. 1"),
+            description("First"),
+            _paragraphs("one\ntwo"),
+            _heading(2, "Versions"),
+            # text before the first h3 goes with it, each later h3 closes a volume
+            _heading(3, "Version 1"),
+            description("Old"),
+            _paragraphs("old text"),
+            _heading(3, "Version 2"),
+            description("New"),
+            _paragraphs("new text"),
+            _heading(3, "Notes"),
+            _paragraphs("dropped, after the last h3"),
+            _heading(2, "Trivia"),
+            _paragraphs("not a volume"),
+        ]
+    )
+    _, book = extract_collection(link("Book"), html)
+    assert book == BookCollection(
+        title="Book",
+        location="Liyue",
+        volumes=[
+            Volume("First", "one\ntwo"),
+            Volume("Old", "old text"),
+            Volume("New", "new text"),
+        ],
+    )
+    assert book == sibling_collection("Book", html)
+
+
+def test_quest_matches_the_sibling_loop():
+    for name in ("Diary of Roald", "Noelle's Notes"):
+        html = quest_page(name)
+        title, book = extract_quest(link(name), html)
+        assert title == name and book.text
+        assert book == sibling_quest(name, html)
+
+
+def test_weapon_lore():
+    key, lore = extract_weapon(link("Rust"), weapon_page("Rust"))
+    assert key == "Rust" and lore and "Weapon" not in lore
+
+    html = _article(
+        [
+            _heading(2, "Lore"),
+            '<div class="description-wrapper">stats</div>',
+            "<p>line one<br/>line two</p>",
+            "<ul><li>a</li><li>b</li></ul>",
+            _heading(2, "Gallery"),
+        ]
+    )
+    assert extract_weapon(link("Rust"), html) == ("Rust", "line one\nline two\na b")
@@ -0,0 +1,30 @@
+from src.util.html_pack import HtmlPack
+
+
+def test_compact_keeps_latest_versions(tmp_path):
+    path = tmp_path / "pages.pack"
+    pack = HtmlPack(path, codec="gzip")
+    for version in range(3):
+        pack.put("https://x/wiki/A", f"<p>A {version}</p>", fetched_at=version)
+    pack.put("https://x/wiki/B", "<p>B</p>", fetched_at=1)
+    pack.flush()
+    size = path.stat().st_size
+
+    assert pack.compact() == 2
+    assert path.stat().st_size < size
+    assert pack.get("https://x/wiki/A") == "<p>A 2</p>"
+    assert pack.get("https://x/wiki/B") == "<p>B</p>"
+    assert pack.compact() == 0
+    # still appendable, and its index is valid on disk
+    pack.put("https://x/wiki/C", "<p>C</p>")
+    pack.close()
+
+    pack = HtmlPack(path, codec="gzip")
+    assert not pack._dirty
+    assert {url: len(versions) for url, versions in pack.entries.items()} == {
+        "https://x/wiki/A": 1,
+        "https://x/wiki/B": 1,
+        "https://x/wiki/C": 1,
+    }
+    assert dict(pack.iter_latest())["https://x/wiki/A"] == "<p>A 2</p>"
+    pack.close()
@@ -0,0 +1,72 @@
+import json
+import time
+from dataclasses import asdict
+
+from src.bench.mock_wiki import MockWiki, route_to, weapon_page
+from src.common.links import BASE_LINK
+from src.scraper.fetcher import Fetcher
+from src.util.http_cache import HttpCache, _atomic_write
+
+URL = f"{BASE_LINK}/wiki/Rust"
+
+
+def age(cache: HttpCache, url: str, seconds: float) -> None:
+    entry = cache.lookup(url)
+    entry.fetched_at = time.time() - seconds
+    _atomic_write(cache._meta_path(url), json.dumps(asdict(entry)))
+
+
+def test_revalidation(tmp_path):
+    with MockWiki(pages={"/wiki/Rust": weapon_page("Rust")}) as wiki:
+        cache = HttpCache(tmp_path)
+        fetcher = Fetcher(max_workers=1, cache=cache)
+        route_to(fetcher, wiki.url)
+
+        html = fetcher.fetch(URL)
+        entry = cache.lookup(URL)
+        assert entry.etag and entry.conditional_headers() == {
+            "If-None-Match": entry.etag
+        }
+
+        age(cache, URL, 60)
+        assert fetcher.fetch(URL) == html
+        assert wiki.stats["not_modified"] == 1
+        # a 304 marks the entry as just revalidated
+        assert time.time() - cache.lookup(URL).fetched_at < 5
+
+        wiki.set_page("/wiki/Rust", weapon_page("Rust") + "<p>edited</p>")
+        edited = fetcher.fetch(URL)
+        assert edited != html and cache.get(URL) == edited
+        assert wiki.stats["ok"] == 2 and wiki.stats["not_modified"] == 1
+
+        # fresh entries are served without asking
+        fresh = HttpCache(tmp_path, fresh_for=60)
+        fetcher.cache = fresh
+        assert fetcher.fetch(URL) == edited
+        assert wiki.stats["requests"] == 3
+        fetcher.close()
+
+
+def test_prune(tmp_path):
+    cache = HttpCache(tmp_path, max_age=3600, max_bytes=10, prune=False)
+    cache.store("old", "aaaa")
+    cache.store("shared", "bbbb")
+    cache.store("same", "bbbb")
+    cache.store("newest", "cccc")
+    age(cache, "old", 7200)
+    age(cache, "shared", 20)
+    age(cache, "same", 10)
+    (cache.meta_dir / "broken.json").write_text("{")
+
+    cache.prune()
+    # too old, then the oldest past 10 bytes, "same" still refers to "bbbb"
+    assert cache.lookup("old") is None and cache.lookup("shared") is None
+    assert cache.get("same") == "bbbb" and cache.get("newest") == "cccc"
+    assert len(list(cache.object_dir.glob("*.html"))) == 2
+    assert len(list(cache.meta_dir.glob("*.json"))) == 2
+
+    # nothing is evicted without limits
+    unlimited = HttpCache(tmp_path, max_age=None, max_bytes=None)
+    age(unlimited, "same", 10**9)
+    unlimited.prune()
+    assert unlimited.get("same") == "bbbb"
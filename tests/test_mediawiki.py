@@ -0,0 +1,60 @@
+import pytest
+
+from src.bench.mock_wiki import MockWiki, MockWikiConfig, route_to, weapon_page
+from src.common.links import BASE_LINK
+from src.scraper.mediawiki import MediaWikiFetcher
+from src.scraper.weapon_scraper import extract_weapon
+
+NAMES = ["Amber Bow", "Dull Blade", "Harbinger of Dawn", "Skyward Harp", "Rust"]
+
+
+def link(name: str) -> str:
+    return f"{BASE_LINK}/wiki/{name.replace(' ', '_')}"
+
+
+@pytest.fixture
+def wiki():
+    pages = {f"/wiki/{name.replace(' ', '_')}": weapon_page(name) for name in NAMES}
+    with MockWiki(MockWikiConfig(revisions_per_query=2), pages=pages) as wiki:
+        yield wiki
+
+
+@pytest.fixture
+def fetcher(wiki):
+    fetcher = MediaWikiFetcher(batch_size=3, per_host_limit=8)
+    route_to(fetcher, wiki.url)
+    yield fetcher
+    fetcher.close()
+
+
+def test_batches_and_continuation(wiki, fetcher):
+    pages = dict(fetcher.fetch_many([link(name) for name in NAMES]))
+    assert sorted(pages) == sorted(link(name) for name in NAMES)
+    # the extractors take the article body as is
+    key, lore = extract_weapon(link("Rust"), pages[link("Rust")])
+    assert key == "Rust" and "Weapon" not in lore and lore
+    # 2 batches of 3 and 2 titles, the first one continued once, then one parse
+    # per page
+    assert wiki.stats["requests"] == 3 + len(NAMES)
+
+
+def test_redirects(wiki, fetcher):
+    wiki.add_redirect("Old Bow", "Amber Bow")
+    html = fetcher.fetch(link("Old Bow"))
+    assert html == fetcher.fetch(link("Amber Bow"))
+
+
+def test_missing_titles_fail_on_their_own(wiki, fetcher):
+    failed = {}
+    urls = [link(name) for name in NAMES] + [link("Nowhere")]
+    pages = dict(fetcher.fetch_many(urls, lambda url, e: failed.setdefault(url, e)))
+    assert sorted(pages) == sorted(link(name) for name in NAMES)
+    assert list(failed) == [link("Nowhere")]
+    with pytest.raises(ValueError):
+        fetcher.fetch(link("Nowhere"))
+
+
+def test_edits_are_new_revisions(wiki, fetcher):
+    before = fetcher.fetch(link("Rust"))
+    wiki.edit_page("/wiki/Rust", weapon_page("Rusty"))
+    assert fetcher.fetch(link("Rust")) != before
@@ -0,0 +1,12 @@
+from src.util.metrics import percentile
+
+
+def test_percentile_nearest_rank():
+    samples = [float(n) for n in range(1, 11)]
+    assert percentile(samples, 50) == 5
+    assert percentile(samples, 90) == 9
+    assert percentile(samples, 95) == 10
+    assert percentile(samples, 99) == 10
+    assert percentile(samples, 0) == 1
+    assert percentile([3.0], 50) == 3
+    assert percentile([], 50) == 0
@@ -0,0 +1,62 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from src.bench.mock_wiki import weapon_page
+from src.scraper.pipeline import ParsePipeline, make_parse_pool
+from src.scraper.weapon_scraper import extract_weapon
+
+
+def pages(names: list[str]) -> list[tuple[str, str]]:
+    return [(f"https://x/wiki/{name}", weapon_page(name)) for name in names]
+
+
+def test_pipelines_share_a_pool():
+    with make_parse_pool(2) as pool:
+        for names in (["Rust", "Slingshot"], ["Dull Blade"]):
+            pipeline = ParsePipeline(workers=2, pool=pool)
+            results = dict(pipeline.run(pages(names), extract_weapon))
+            assert sorted(key for key, _ in results.values()) == sorted(names)
+        # left running for the next pipeline
+        assert pool.submit(len, "abc").result() == 3
+
+
+def test_extract_failures_are_reported():
+    failed = []
+    pipeline = ParsePipeline(workers=0)
+    broken = [("https://x/wiki/Broken", "<p>no lore</p>")]
+    results = list(
+        pipeline.run(broken, extract_weapon, on_error=lambda l, h, e: failed.append(l))
+    )
+    assert results == [] and failed == ["https://x/wiki/Broken"]
+
+
+def endless_pages(closed: threading.Event):
+    try:
+        for i in itertools.count():
+            yield f"https://x/wiki/Broken_{i}", "<p>no lore</p>"
+    finally:
+        closed.set()
+
+
+@pytest.mark.parametrize("workers", [0, 1])
+def test_stopping_early_stops_fetching(workers):
+    closed = threading.Event()
+    threads = threading.active_count()
+    with make_parse_pool(1) as pool:
+        # the queue fills up while the first page fails
+        pipeline = ParsePipeline(workers=workers, queue_size=2, pool=pool)
+        with pytest.raises(ValueError):
+            list(pipeline.run(endless_pages(closed), extract_weapon))
+        assert closed.wait(5)
+
+        closed.clear()
+        results = pipeline.run(pages(["Rust"]) * 50, extract_weapon)
+        next(results)
+        results.close()
+    deadline = time.monotonic() + 5
+    while threading.active_count() > threads and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert threading.active_count() <= threads
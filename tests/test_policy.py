@@ -0,0 +1,121 @@
+import time
+
+import pytest
+import requests
+
+from src.bench.mock_wiki import MockWiki, route_to, weapon_page
+from src.common.links import BASE_LINK
+from src.scraper.fetcher import Fetcher
+from src.scraper.policy import CircuitOpenError, FetchPolicy, PolicyConfig
+
+ROOT = "https://wiki.example"
+
+
+def test_scopes_share_their_host_limit():
+    policy = FetchPolicy(PolicyConfig(initial_rate=10, burst=1))
+    policy.add_scope(ROOT)
+    policy.add_scope(f"{ROOT}/fr", PolicyConfig(initial_rate=10, burst=1))
+    en = policy.host(policy.scope(f"{ROOT}/wiki/Amber"))
+    fr = policy.host(policy.scope(f"{ROOT}/fr/wiki/Amber"))
+    assert en is not fr
+    assert en.outer is fr.outer is policy.host("wiki.example")
+
+    fr.throttled(None)
+    assert fr.rate == 5 and en.outer.rate == 5 and en.rate == 10
+
+    # every request of either edition takes a token of the host
+    start = time.monotonic()
+    for _ in range(3):
+        en.acquire()
+        fr.acquire()
+    assert time.monotonic() - start >= 5 / 5 - 0.05
+
+
+def test_hosts_without_scopes_stand_alone():
+    policy = FetchPolicy()
+    assert policy.host(policy.scope("https://other.example/page")).outer is None
+
+
+def test_paused_host_fails_fast_with_an_error_handler():
+    pages = {f"/wiki/Item_{i}": weapon_page(f"Item {i}") for i in range(4)}
+    urls = [f"{BASE_LINK}{path}" for path in pages]
+    with MockWiki(pages=pages) as wiki:
+        fetcher = Fetcher(max_workers=2)
+        route_to(fetcher, wiki.url)
+        host = fetcher.policy.host(fetcher.policy.scope(BASE_LINK))
+        for _ in range(host.config.failure_threshold):
+            host.failure()
+
+        start = time.monotonic()
+        failed = {}
+        fetched = list(fetcher.fetch_many(urls, failed.__setitem__))
+        assert time.monotonic() - start < 5
+        assert fetched == [] and sorted(failed) == sorted(urls)
+        assert all(isinstance(e, CircuitOpenError) for e in failed.values())
+        assert wiki.stats["requests"] == 0
+        with pytest.raises(CircuitOpenError):
+            fetcher.fetch(urls[0], wait_open=False)
+        fetcher.close()
+
+
+def test_retry_after_is_waited_out_even_with_an_error_handler():
+    pages = {"/wiki/Rust": weapon_page("Rust")}
+    with MockWiki(pages=pages) as wiki:
+        fetcher = Fetcher(max_workers=2)
+        route_to(fetcher, wiki.url)
+        fetcher.policy.host(fetcher.policy.scope(BASE_LINK)).throttled(0.3)
+
+        start = time.monotonic()
+        failed = {}
+        fetched = dict(
+            fetcher.fetch_many([f"{BASE_LINK}/wiki/Rust"], failed.__setitem__)
+        )
+        assert time.monotonic() - start >= 0.25
+        assert list(fetched) == [f"{BASE_LINK}/wiki/Rust"] and not failed
+        fetcher.close()
+
+
+class StatusSession:
+    """Answers every GET with the same status, counting them"""
+
+    def __init__(self, status: int) -> None:
+        self.status = status
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        resp = requests.Response()
+        resp.status_code = self.status
+        return resp
+
+
+def status_fetcher(status: int) -> tuple[Fetcher, StatusSession]:
+    config = PolicyConfig(
+        initial_rate=100,
+        min_rate=10,
+        burst=10,
+        max_attempts=5,
+        backoff_base=0,
+        failure_threshold=3,
+        decrease_interval=0,
+    )
+    fetcher = Fetcher(policy=FetchPolicy(config))
+    session = fetcher.session = StatusSession(status)
+    return fetcher, session
+
+
+def test_a_run_of_503s_opens_the_circuit():
+    fetcher, session = status_fetcher(503)
+    with pytest.raises(CircuitOpenError):
+        fetcher.get(f"{BASE_LINK}/wiki/Rust", wait_open=False)
+    assert session.calls == 3
+    host = fetcher.policy.host(fetcher.policy.scope(BASE_LINK))
+    assert host.open_until > time.monotonic()
+
+
+def test_429s_slow_down_without_opening_the_circuit():
+    fetcher, session = status_fetcher(429)
+    resp = fetcher.get(f"{BASE_LINK}/wiki/Rust", wait_open=False)
+    assert resp.status_code == 429 and session.calls == 5
+    host = fetcher.policy.host(fetcher.policy.scope(BASE_LINK))
+    assert host.open_until == 0 and host.rate < host.config.initial_rate
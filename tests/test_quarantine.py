@@ -0,0 +1,19 @@
+from src.common.links import BASE_LINK
+from src.util.quarantine import FETCH, Quarantine
+
+
+def test_links_with_the_same_slug_keep_their_html(tmp_path):
+    quarantine = Quarantine("book_quest", tmp_path)
+    links = [f"{BASE_LINK}/wiki/A/B", f"{BASE_LINK}/wiki/A?B", f"{BASE_LINK}/wiki/A_B"]
+    for link in links:
+        quarantine.add(link, ValueError("no text"), html=f"<p>{link}</p>")
+    quarantine.add(f"{BASE_LINK}/wiki/C", ConnectionError(), stage=FETCH)
+    quarantine.save()
+
+    quarantine = Quarantine("book_quest", tmp_path)
+    assert [quarantine.html(link) for link in links] == [
+        f"<p>{link}</p>" for link in links
+    ]
+    assert quarantine.html(f"{BASE_LINK}/wiki/C") is None
+    assert quarantine.remove(links[0])
+    assert len(list(quarantine.html_dir.iterdir())) == 2
@@ -0,0 +1,78 @@
+from bs4 import BeautifulSoup
+
+from src.bench.mock_wiki import _article, _heading
+from src.scraper.sections import article_root, make_soup, split_sections
+
+HTML = _article(
+    [
+        "<p>lead</p>",
+        _heading(2, "Lore"),
+        "<p>intro</p>",
+        _heading(3, "Flower"),
+        "<p>petal</p>",
+        _heading(4, "Note"),
+        "<p>aside</p>",
+        _heading(3, "Plume"),
+        "<p>feather</p>",
+        _heading(2, "Gallery"),
+        "<p>pictures</p>",
+    ]
+)
+
+
+def names(elements) -> list[str]:
+    # headings by their headline, without the edit link
+    return [
+        (elem.find("span", class_="mw-headline") or elem).get_text(strip=True)
+        for elem in elements
+    ]
+
+
+def test_default_levels_nest_h3_under_h2():
+    lead = split_sections(article_root(make_soup(HTML)))
+    assert lead.level == 1 and names(lead.elements) == ["lead"]
+    assert [(s.level, s.title) for s in lead.subsections] == [
+        (2, "Lore"),
+        (2, "Gallery"),
+    ]
+
+    lore = lead.find("Lore")
+    assert lore.id == "Lore" and names(lore.elements) == ["intro"]
+    assert [s.title for s in lore.subsections] == ["Flower", "Plume"]
+    # h4 is not a section level, it stays in the h3 it follows
+    assert names(lead.find("Flower").elements) == ["petal", "Note", "aside"]
+    assert names(lore.iter_elements()) == [
+        "intro",
+        "Flower",
+        "petal",
+        "Note",
+        "aside",
+        "Plume",
+        "feather",
+    ]
+    assert lead.find("Trivia") is None
+
+
+def test_other_levels():
+    root = article_root(make_soup(HTML))
+    lead = split_sections(root, levels=(2,))
+    assert [s.title for s in lead.subsections] == ["Lore", "Gallery"]
+    assert lead.find("Flower") is None
+    assert names(lead.find("Lore").elements)[:3] == ["intro", "Flower", "petal"]
+
+    lead = split_sections(root, levels=(2, 3, 4))
+    assert [s.title for s in lead.find("Flower").subsections] == ["Note"]
+
+    # a deeper heading right under the lead, then a shallower one closing it
+    soup = BeautifulSoup("<h3>Deep</h3><p>a</p><h2>Top</h2><p>b</p>", "html.parser")
+    lead = split_sections(soup)
+    assert [(s.level, s.title) for s in lead.subsections] == [(3, "Deep"), (2, "Top")]
+    assert lead.subsections[0].id is None
+
+
+def test_body_only_parse_drops_the_skin():
+    page = f"<html><nav><h2>Menu</h2></nav><main>{HTML}</main><footer>x</footer></html>"
+    assert "Menu" not in make_soup(page).get_text()
+    assert "Menu" in make_soup(page, body_only=False).get_text()
+    lead = split_sections(article_root(make_soup(page)))
+    assert [s.title for s in lead.subsections] == ["Lore", "Gallery"]
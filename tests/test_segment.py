@@ -0,0 +1,101 @@
+import pytest
+
+from src.util.blob_store import BlobStore
+from src.util.manifest import Manifest
+from src.util.segment import SegmentFile
+
+
+def test_writer_drops_torn_tail(tmp_path):
+    path = tmp_path / "segment.jsonl"
+    segment = SegmentFile(path)
+    segment.append({"n": 1})
+    segment.close()
+    # a crash in the middle of the second record
+    with open(path, "ab") as f:
+        f.write(b'{"n": 2')
+
+    segment = SegmentFile(path)
+    assert [record for _, record in segment.scan()] == [{"n": 1}]
+    segment.append({"n": 3})
+    segment.close()
+    assert [record for _, record in SegmentFile(path, readonly=True).scan()] == [
+        {"n": 1},
+        {"n": 3},
+    ]
+
+
+def test_reader_leaves_incomplete_line(tmp_path):
+    path = tmp_path / "segment.jsonl"
+    writer = SegmentFile(path)
+    writer.append({"n": 1})
+    writer.checkpoint()
+    # the writer is half way through appending a record
+    writer._writer.write(b'{"n": ')
+    writer._writer.flush()
+    size = path.stat().st_size
+
+    reader = SegmentFile(path, readonly=True)
+    assert [record for _, record in reader.scan()] == [{"n": 1}]
+    assert path.stat().st_size == size
+
+    writer._writer.write(b"2}\n")
+    writer.close()
+    assert [record for _, record in reader.scan(reader.end)] == [{"n": 2}]
+    reader.close()
+
+
+def test_readonly_missing_file(tmp_path):
+    reader = SegmentFile(tmp_path / "missing.jsonl", readonly=True)
+    assert list(reader.scan()) == []
+    reader.close()
+    assert not (tmp_path / "missing.jsonl").exists()
+
+
+def test_manifest_resumes_after_crash(tmp_path):
+    blobs = BlobStore(tmp_path / "blobs.jsonl", checkpoint_every=1)
+    manifest = Manifest("part", tmp_path, checkpoint_every=1, blobs=blobs)
+    text = "lore " * 20
+    manifest.update("a", "v1", "A", {"text": text})
+    manifest.update("b", "v1", "B", {"text": "short"})
+    # dies without closing, half way through the next record
+    manifest.segment.checkpoint()
+    with open(tmp_path / "part.jsonl", "ab") as f:
+        f.write(b'{"link": "c", "vers')
+    manifest.segment._writer.close()
+    manifest.segment._reader.close()
+
+    reader = Manifest("part", tmp_path, blobs=blobs, readonly=True)
+    assert sorted(reader.entries) == ["a", "b"]
+    assert reader.result("a") == {"text": text}
+    reader.close()
+
+    manifest = Manifest("part", tmp_path, blobs=blobs)
+    assert manifest.is_current("a", "v1") and manifest.is_current("b", "v1")
+    assert not manifest.is_current("c", "v1")
+    manifest.update("c", "v1", "C", {"text": "again"})
+    manifest.save()
+    assert [key for key, _ in manifest.iter_results()] == ["A", "B", "C"]
+    manifest.close()
+    blobs.close()
+
+
+def test_readonly_blob_store_sees_new_blobs(tmp_path):
+    path = tmp_path / "blobs.jsonl"
+    writer = BlobStore(path, checkpoint_every=1)
+    reader = BlobStore(path, readonly=True)
+    digest = writer.put("text " * 20)
+    assert reader.has_refs({"$blob": digest})
+    assert reader.get(digest) == "text " * 20
+    reader.close()
+    writer.close()
+
+
+def test_writer_holds_lock(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    path = tmp_path / "segment.jsonl"
+    writer = SegmentFile(path)
+    with open(path, "ab") as other:
+        with pytest.raises(BlockingIOError):
+            fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        writer.close()
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
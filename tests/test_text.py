@@ -0,0 +1,16 @@
+from src.export import text
+from src.util.archive import ARCHIVE_PARTS
+
+
+def test_colliding_file_names(tmp_path, monkeypatch):
+    archive = {"weapon": {"A/B": "slash", "A?B": "question", "A_B": "underscore"}}
+    monkeypatch.setattr(
+        text, "iter_archive", lambda part: iter(archive.get(part, {}).items())
+    )
+    text.export_text(tmp_path, workers=2)
+    files = {path.read_text() for path in (tmp_path / "weapon").glob("*.txt")}
+    assert files == {f"{key}\n\n{lore}\n" for key, lore in archive["weapon"].items()}
+
+    # the same names are picked again, nothing to write
+    assert text.export_text(tmp_path, workers=2) == 0
+    assert all((tmp_path / part).is_dir() for part in ARCHIVE_PARTS)
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.bench.mock_wiki import MockWiki, weapon_page
+from src.common.archives import DATA_DIR_ENV
+from src.common.links import BASE_LINK
+
+REPO_DIR = Path(__file__).parent.parent
+BROKEN = '<div class="mw-parser-output"><p>no lore yet</p></div>'
+
+# the watcher runs in its own process, so every path is under the data directory
+RUN_ONCE = """
+import json, sys
+from src.bench.mock_wiki import route_to
+from src.scraper.fetcher import get_fetcher
+from src.scraper.watch import Watcher
+
+route_to(get_fetcher(), sys.argv[1])
+watcher = Watcher(parse_workers=0, export=False)
+print(json.dumps({"scraped": watcher.run_once(), "state": watcher.state}))
+"""
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    links = tmp_path / "links"
+    links.mkdir()
+    names = ["Rust", "Slingshot"]
+    (links / "weapon.json").write_text(
+        json.dumps([f"{BASE_LINK}/wiki/{name}" for name in names])
+    )
+    (links / "artifact.json").write_text("[]")
+    (links / "book.json").write_text(json.dumps({"collection": [], "quest": []}))
+    (tmp_path / "archive" / "json").mkdir(parents=True)
+    state = {"timestamp": "2000-01-01T00:00:00Z", "rcid": 0}
+    (tmp_path / "archive" / "watch_state.json").write_text(json.dumps(state))
+    return tmp_path
+
+
+def run_once(wiki: MockWiki, data_dir: Path) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", RUN_ONCE, wiki.url],
+        cwd=REPO_DIR,
+        env={**os.environ, DATA_DIR_ENV: str(data_dir)},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def archived(data_dir: Path) -> list[str]:
+    return sorted(json.loads((data_dir / "archive/json/weapon.json").read_text()))
+
+
+def test_edits_are_scraped_and_quarantined_pages_retried(data_dir):
+    with MockWiki(pages={}) as wiki:
+        wiki.edit_page("/wiki/Rust", weapon_page("Rust"))
+        wiki.edit_page("/wiki/Slingshot", BROKEN)
+        wiki.edit_page("/wiki/Not_Listed", weapon_page("Not Listed"))
+
+        first = run_once(wiki, data_dir)
+        assert first["scraped"] == 2
+        assert first["state"]["rcid"] == 3
+        assert first["state"]["pending"] == ["Slingshot"]
+        assert archived(data_dir) == ["Rust"]
+
+        # fixed without a new edit, the quarantined page is scraped again anyway
+        wiki.set_page("/wiki/Slingshot", weapon_page("Slingshot"))
+        second = run_once(wiki, data_dir)
+        assert second["scraped"] == 1
+        assert second["state"] == {**first["state"], "pending": []}
+        assert archived(data_dir) == ["Rust", "Slingshot"]
+
+        wiki.reset_stats()
+        assert run_once(wiki, data_dir)["scraped"] == 0
+        # only the recent changes were asked for
+        assert wiki.stats["requests"] == 1
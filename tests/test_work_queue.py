@@ -0,0 +1,33 @@
+import pytest
+
+from src.util.work_queue import WorkQueue
+
+
+def test_rate_limit_is_shared(tmp_path):
+    first, second = WorkQueue(tmp_path / "q.db"), WorkQueue(tmp_path / "q.db")
+    waits = [
+        queue.reserve("wiki", rate=10, burst=1)
+        for queue in (first, second, first, second)
+    ]
+    assert waits[0] == 0
+    # every token taken by one worker delays the others
+    for previous, wait in zip(waits, waits[1:]):
+        assert wait == pytest.approx(previous + 0.1, abs=0.02)
+    assert second.reserve("other", rate=10, burst=1) == 0
+    first.close()
+    second.close()
+
+
+def test_results_are_collected(tmp_path):
+    queue = WorkQueue(tmp_path / "q.db")
+    links = [f"https://x/wiki/{i}" for i in range(5)]
+    queue.enqueue("weapon", links)
+    for link in queue.claim("weapon", "me", count=5):
+        assert queue.complete("weapon", "me", link, "v1", link[-1], {"n": link[-1]})
+    results = queue.results("weapon")
+    collected = [link for link, _, _, _ in results]
+    assert sorted(collected) == links
+    queue.mark_collected("weapon", collected)
+    assert list(queue.results("weapon")) == []
+    assert queue.counts("weapon") == {"collected": 5}
+    queue.close()